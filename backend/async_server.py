@@ -0,0 +1,493 @@
+# async_server.py - asyncio entry point for the ham shack server (run: python async_server.py)
+#
+# Serves the same routes as kevin.py. The long-lived ones (/stream.wav, /events,
+# /spectrum/stream) are coroutines on one event loop, so an open listener costs
+# a socket and a small buffer instead of an OS thread. The PTT deadline runs on
+# the loop too, and so does CI-V reading where the loop can watch the port
+# (CivTransport.attach, PttTimer.attach). The routes that wait on the radio
+# (/frequency, /mode, /ptt, /band, /batch) or poll (/spectrum?wait=) await it
+# with the async CI-V API, so a slow radio or a long poll never ties up a
+# worker thread. Every other route is the unchanged Flask view, run on a fixed
+# pool of WSGI_WORKERS threads: the thread count stays flat however many
+# clients connect.
+# Needs aiohttp (pip install -r requirements.txt).
+import asyncio
+import io
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from aiohttp import web
+
+import kevin
+
+HOST = "0.0.0.0"
+PORT = 5000
+WSGI_WORKERS = 8                   # threads running the plain Flask views
+UPLOAD_MAX_BYTES = 200 * 1024 * 1024
+LISTENER_QUEUE_BLOCKS = 64         # per-listener backlog (~1.5 s) before the oldest blocks are dropped
+
+# Connection-level headers are the server's business, not the WSGI app's
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "upgrade", "proxy-connection", "te", "trailer"}
+
+
+# ---------------------- AUDIO FAN-OUT ----------------------
+class AsyncAudioFanout:
+    """
+    RX audio for any number of coroutine listeners. One bridge thread reads the
+    shared AudioCapture and hands every block to the loop; each listener is a
+    bounded deque plus an asyncio.Event, so a slow client drops its oldest
+    blocks (counted as lag) without holding anyone else up. The bridge runs
+    while there are listeners, like the capture itself.
+    """
+
+    def __init__(self, loop, depth: int = LISTENER_QUEUE_BLOCKS):
+        self._loop = loop
+        self.depth = depth
+        self._listeners = set()
+        self._thread = None
+        self.blocks = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def listen(self, name: str = ""):
+        listener = AsyncAudioListener(self, name)
+        self._listeners.add(listener)
+        if self._thread is None:
+            self._start()
+        return listener
+
+    def listeners(self):
+        return [l.stats() for l in self._listeners]
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._bridge, name="audio-async", daemon=True)
+        self._thread.start()
+
+    def _bridge(self):
+        ended = False
+        try:
+            with kevin.audio_capture.listen("async") as source:
+                while self._listeners:
+                    block = source.read()
+                    if block is None:
+                        if not kevin.audio_capture.running:
+                            ended = True
+                            break
+                        continue
+                    self._loop.call_soon_threadsafe(self._publish, block)
+        except Exception as e:
+            print(f"❌ Error in async audio bridge: {e}")
+            ended = True
+        finally:
+            self._loop.call_soon_threadsafe(self._bridge_done, ended)
+
+    def _publish(self, block):
+        self.blocks += 1
+        for listener in self._listeners:
+            listener._push(block)
+
+    def _bridge_done(self, ended: bool):
+        self._thread = None
+        if ended:
+            # Capture stopped (no device): end the streams, as gen_audio does
+            for listener in self._listeners:
+                listener.closed = True
+                listener._ready.set()
+        elif self._listeners:
+            self._start()         # someone joined while the bridge was winding down
+
+
+class AsyncAudioListener:
+    """A coroutine's view of AsyncAudioFanout. Use as a context manager."""
+
+    def __init__(self, fanout: AsyncAudioFanout, name: str = ""):
+        self.fanout = fanout
+        self.name = name
+        self.closed = False
+        self.lag_blocks = 0
+        self.started = time.time()
+        self._blocks = deque()
+        self._ready = asyncio.Event()
+
+    async def read(self):
+        """Next (BLOCK_SIZE, CHANNELS) int16 block, or None once the capture has stopped."""
+        while not self._blocks:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._blocks.popleft()
+
+    def _push(self, block):
+        if len(self._blocks) >= self.fanout.depth:
+            self._blocks.popleft()
+            self.lag_blocks += 1
+        self._blocks.append(block)
+        self._ready.set()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "behind_blocks": len(self._blocks),
+            "lag_blocks": self.lag_blocks,
+            "connected_sec": round(time.time() - self.started, 1),
+        }
+
+    def close(self):
+        self.fanout._listeners.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------- NATIVE ROUTES ----------------------
+async def stream_audio(request):
+    """/stream.wav, same formats as kevin.stream_audio."""
+    encoder, error = kevin.stream_encoder(request.query)
+    if error:
+        return web.json_response(error, status=400, headers=kevin.CORS_HEADERS)
+    resp = web.StreamResponse(headers={**kevin.CORS_HEADERS, "Content-Type": "audio/wav"})
+    await resp.prepare(request)
+    await resp.write(encoder.header())
+    with request.app["audio"].listen(request.remote or "") as listener:
+        try:
+            while True:
+                block = await listener.read()
+                if block is None:
+                    break
+                data = encoder.encode(block)
+                if data:
+                    await resp.write(data)
+        except ConnectionResetError:
+            pass
+    return resp
+
+
+async def events_stream(request):
+    """/events, same feed as kevin.events_stream."""
+    resume = request.headers.get("Last-Event-ID") or request.query.get("since")
+    resp = web.StreamResponse(headers={
+        **kevin.CORS_HEADERS,
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    await resp.prepare(request)
+    hub = kevin.events_hub
+    changed = request.app["events_changed"]
+    backlog, last = kevin.event_backlog(resume)
+    try:
+        await resp.write(b"retry: 2000\n\n")
+        for event in backlog:
+            await resp.write(kevin._format_event(*event).encode())
+        while True:
+            try:
+                async with changed:
+                    await asyncio.wait_for(changed.wait_for(lambda: hub.version > last),
+                                           kevin.EVENT_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                await resp.write(b": keepalive\n\n")
+                continue
+            events = hub.since(last)
+            if events is None:
+                # Fell behind the history window: resync from the latest values
+                events = hub.snapshot()
+            if not events:
+                continue
+            await resp.write("".join(kevin._format_event(*event) for event in events).encode())
+            last = max(last, events[-1][0])
+    except ConnectionResetError:
+        pass
+    return resp
+
+
+async def stream_spectrum(request):
+    """/spectrum/stream: new waterfall rows picked up once per frame interval."""
+    spectrum = kevin.spectrum
+    seq, _ = spectrum.rows_since(None)
+    resp = web.StreamResponse(headers={**kevin.CORS_HEADERS, **kevin._spectrum_headers(seq),
+                                       "Content-Type": "application/octet-stream"})
+    await resp.prepare(request)
+    try:
+        while True:
+            await asyncio.sleep(1.0 / spectrum.fps)
+            seq, rows = spectrum.rows_since(seq)      # timeout 0: never blocks the loop
+            if len(rows):
+                await resp.write(rows.tobytes())
+    except ConnectionResetError:
+        pass
+    return resp
+
+
+async def audio_listeners(request):
+    capture = kevin.audio_capture
+    fanout = request.app["audio"]
+    return web.json_response({
+        "capturing": capture.running,
+        "blocks_captured": capture.seq,
+        "ring_blocks": capture.capacity,
+        "listeners": capture.listeners(),
+        "async_listeners": fanout.listeners(),
+        "threads": threading.active_count(),
+    }, headers=kevin.CORS_HEADERS)
+
+
+# ---------------------- RADIO ROUTES ----------------------
+# Same requests and replies as the kevin.py views, with the async CI-V API
+def _json(body, status=200):
+    return web.json_response(body, status=status, headers=kevin.CORS_HEADERS)
+
+
+async def _json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def get_frequency(request):
+    if not kevin.radio_ser:
+        return _json({"error": "Radio not open"}, 500)
+    freq = await kevin.aget_frequency_state(refresh=request.query.get("refresh") == "1")
+    if freq is None:
+        return _json({"error": "No freq response"}, 500)
+    return _json({"frequency_hz": freq})
+
+
+async def set_frequency(request):
+    data = await _json_body(request)
+    try:
+        freq = int(data.get("frequency_hz"))
+    except (TypeError, ValueError):
+        return _json({"error": "frequency_hz must be an integer"}, 400)
+    if not kevin.FREQ_MIN_HZ <= freq <= kevin.FREQ_MAX_HZ:
+        return _json({"error": f"frequency out of range: {freq}"}, 400)
+    result = await kevin.freq_coalescer.aset(freq)
+    if not result["ok"]:
+        return _json({"error": "Radio did not accept the frequency", **result}, 500)
+    return _json({"status": "OK", "set_frequency_hz": result["applied_hz"], **result})
+
+
+async def get_mode(request):
+    if not kevin.radio_ser:
+        return _json({"error": "Radio not open"}, 500)
+    state = await kevin.aget_mode_state(refresh=request.query.get("refresh") == "1")
+    if not state:
+        return _json({"error": "No mode response"}, 500)
+    return _json(state)
+
+
+async def set_mode(request):
+    if not kevin.radio_ser:
+        return _json({"error": "Radio not open"}, 500)
+    state = await kevin.aget_mode_state()
+    if not state:
+        return _json({"error": "Unable to read current mode"}, 500)
+    target, reply = kevin.mode_request(await _json_body(request), state)
+    return _json(*kevin.mode_reply(await kevin.mode_engine.aapply(*target), reply))
+
+
+async def get_ptt(request):
+    return _json(kevin.ptt_status(await kevin.civ.aquery(kevin.build_read_ptt_command())))
+
+
+async def ptt_on(request):
+    secs = kevin._seconds_arg(kevin.PTT_DEFAULT_SECONDS, request.query)
+    if secs is None:
+        return _json({"error": f"seconds must be between 0 and {kevin.PTT_MAX_SECONDS}"}, 400)
+    return _json(*kevin.ptt_on_reply(await kevin.ptt_timer.akey(secs), secs))
+
+
+async def ptt_off(request):
+    await kevin.ptt_timer.arelease(reason="ptt_off")
+    return _json({"status": "PTT OFF", "timer": kevin.ptt_timer.status()})
+
+
+async def set_band(request):
+    band = str((await _json_body(request)).get("band", "")).strip()
+    if band not in kevin.BAND_TO_FREQ:
+        return _json({"error": f"Invalid band: {band}"}, 400)
+    freq = kevin.BAND_TO_FREQ[band]
+    if await kevin.civ.acommand(kevin.build_set_freq_command(freq)):
+        kevin.radio_state.update(frequency_hz=freq)
+    return _json({"status": "OK", "band": band, "frequency_hz": freq})
+
+
+async def run_batch(request):
+    if not kevin.radio_ser:
+        return _json({"error": "Radio not open"}, 500)
+    data = await _json_body(request)
+    ops, error = kevin.parse_batch(data)
+    if error:
+        return _json(error, 400)
+    stop_on_error = bool(data.get("stop_on_error", False))
+    civ = kevin.civ
+    results = []
+    failed = False
+    t0 = time.perf_counter()
+    async with civ.ahold():
+        for op, p in ops:
+            if failed and stop_on_error:
+                results.append({"op": op["op"], "status": "skipped"})
+                continue
+            t1 = time.perf_counter()
+            reply = await (civ.aquery(p["frame"]) if "read" in p else civ.acommand(p["frame"]))
+            result = kevin.batch_result(op, p, reply, t1)
+            failed = failed or result["status"] != "OK"
+            results.append(result)
+    return _json(kevin.batch_reply(results, failed, t0))
+
+
+async def get_spectrum(request):
+    """/spectrum long-poll: checks for new rows once per frame interval until ?wait= runs out."""
+    spectrum = kevin.spectrum
+    try:
+        since, wait = kevin.spectrum_args(request.query)
+    except ValueError:
+        return _json({"error": "since must be an integer and wait a number"}, 400)
+    deadline = time.monotonic() + wait
+    seq, rows = spectrum.rows_since(since)
+    while not len(rows) and spectrum.running and time.monotonic() < deadline:
+        await asyncio.sleep(min(1.0 / spectrum.fps, max(0.0, deadline - time.monotonic())))
+        seq, rows = spectrum.rows_since(since)
+    if request.query.get("format") == "json":
+        return _json({"seq": seq, "rows": rows.tolist(), **spectrum.stats()})
+    return web.Response(body=rows.tobytes(), content_type="application/octet-stream",
+                        headers={**kevin.CORS_HEADERS, **kevin._spectrum_headers(seq)})
+
+
+# ---------------------- FLASK ROUTES ----------------------
+def _wsgi_environ(request, body: bytes):
+    path, _, query = request.raw_path.partition("?")
+    host, _, port = (request.host or "").partition(":")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": unquote(path, encoding="latin-1"),
+        "QUERY_STRING": query,
+        "SERVER_NAME": host or HOST,
+        "SERVER_PORT": port or str(PORT),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if "Content-Type" in request.headers:
+        environ["CONTENT_TYPE"] = request.headers["Content-Type"]
+    for name, value in request.headers.items():
+        key = "HTTP_" + name.upper().replace("-", "_")
+        if key in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_wsgi(environ):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+        return lambda data: None    # Flask never uses the legacy write()
+
+    body = kevin.app(environ, start_response)
+    return started[0], started[1], iter(body), body
+
+
+async def flask_route(request):
+    """Any other route: the Flask view on the WSGI pool, body pulled chunk by chunk."""
+    loop = asyncio.get_running_loop()
+    pool = request.app["wsgi_pool"]
+    environ = _wsgi_environ(request, await request.read())
+    status, headers, chunks, body = await loop.run_in_executor(pool, _run_wsgi, environ)
+    try:
+        code, _, reason = status.partition(" ")
+        resp = web.StreamResponse(status=int(code), reason=reason or None)
+        for name, value in headers:
+            if name.lower() not in HOP_BY_HOP:
+                resp.headers.add(name, value)
+        await resp.prepare(request)
+        # One pool job per chunk, so a long download does not keep a worker between chunks
+        while True:
+            chunk = await loop.run_in_executor(pool, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await resp.write(chunk)
+        await resp.write_eof()
+        return resp
+    finally:
+        if hasattr(body, "close"):
+            await loop.run_in_executor(pool, body.close)
+
+
+# ---------------------- APP ----------------------
+async def _on_startup(app):
+    loop = asyncio.get_running_loop()
+    kevin.civ.attach(loop)
+    kevin.ptt_timer.attach(loop)
+    app["audio"] = AsyncAudioFanout(loop)
+    changed = app["events_changed"] = asyncio.Condition()
+
+    async def notify():
+        async with changed:
+            changed.notify_all()
+
+    def on_publish():
+        if not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(notify(), loop)
+
+    kevin.events_hub.watch(on_publish)
+
+
+async def _on_cleanup(app):
+    # Back to threads so kevin's atexit cleanup can still unkey and close the ports
+    kevin.ptt_timer.detach()
+    kevin.civ.detach()
+    app["wsgi_pool"].shutdown(wait=False)
+
+
+def make_app():
+    app = web.Application(client_max_size=UPLOAD_MAX_BYTES)
+    app["wsgi_pool"] = ThreadPoolExecutor(WSGI_WORKERS, thread_name_prefix="wsgi")
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    app.router.add_get("/stream.wav", stream_audio)
+    app.router.add_get("/events", events_stream)
+    app.router.add_get("/spectrum/stream", stream_spectrum)
+    app.router.add_get("/audio/listeners", audio_listeners)
+    app.router.add_get("/frequency", get_frequency)
+    app.router.add_post("/frequency", set_frequency)
+    app.router.add_get("/mode", get_mode)
+    app.router.add_post("/mode", set_mode)
+    app.router.add_get("/ptt", get_ptt)
+    app.router.add_post("/ptt/on", ptt_on)
+    app.router.add_post("/ptt/off", ptt_off)
+    app.router.add_post("/band", set_band)
+    app.router.add_post("/batch", run_batch)
+    app.router.add_get("/spectrum", get_spectrum)
+    app.router.add_route("*", "/{tail:.*}", flask_route)
+    return app
+
+
+if __name__ == "__main__":
+    print(f"Radio + Rotator Server (asyncio) ready: {WSGI_WORKERS} WSGI workers, streams on the event loop")
+    if kevin.RX_RECORD_ON_START:
+        kevin.rx_recorder.start()
+    kevin.recordings_catalog.refresh_if_stale()
+    web.run_app(make_app(), host=HOST, port=PORT)
@@ -0,0 +1,354 @@
+# audio_dsp.py - Streaming audio helpers (resampling, codecs, WAV headers)
+#
+# Everything here works block by block and keeps its own state, so it can sit
+# in a generator that feeds an HTTP response without ever seeing the whole signal.
+import struct
+from math import gcd
+
+import numpy as np
+
+
+# ---------------------- RESAMPLING ----------------------
+class PolyphaseResampler:
+    """
+    Stateful rational resampler (in_rate -> out_rate) for (frames, channels) blocks.
+
+    The up-by-L / low-pass / down-by-M chain is evaluated in polyphase form:
+    every output sample is one dot product of a window of input frames with one
+    row of the filter bank. The tail of the previous block and the output phase
+    are carried between calls, so block boundaries are seamless.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, channels: int = 1, taps_per_phase: int = 24):
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.channels = channels
+        # When decimating, the filter must span proportionally more input frames
+        taps = taps_per_phase * -(-self.down // self.up)
+        self.taps = taps
+
+        # Windowed-sinc low-pass at the upsampled rate, cut off below the lower Nyquist
+        n = self.up * taps
+        fc = 0.45 / max(self.up, self.down)
+        t = np.arange(n) - (n - 1) / 2
+        h = 2 * fc * np.sinc(2 * fc * t) * np.kaiser(n, 8.0) * self.up
+        # bank[p, j] = h[p + j*up]; columns reversed so row . window is the convolution
+        self._bank = h.reshape(taps, self.up).T[:, ::-1].astype(np.float32)
+        self._offsets = np.arange(taps)
+
+        self._history = np.zeros((taps - 1, channels), dtype=np.float32)
+        self._phase = 0     # position of the next output, in upsampled samples, from block start
+
+    @property
+    def ratio(self):
+        return self.up / self.down
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Resample a (frames, channels) block; returns float32 (frames', channels)."""
+        block = np.asarray(block, dtype=np.float32).reshape(-1, self.channels)
+        frames = len(block)
+        span = frames * self.up
+        if self._phase >= span:
+            self._phase -= span
+            self._history = np.concatenate([self._history, block])[-(self.taps - 1):]
+            return np.zeros((0, self.channels), dtype=np.float32)
+
+        pos = np.arange(self._phase, span, self.down)
+        src = pos // self.up                      # newest input frame used by each output
+        phase = pos - src * self.up
+        x = np.concatenate([self._history, block])
+        # Window of taps input frames ending at src (history shifts indices by taps-1)
+        windows = x[src[:, None] + self._offsets[None, :]]          # (out, taps, channels)
+        out = np.einsum("ot,otc->oc", self._bank[phase], windows)
+
+        self._phase = int(pos[-1]) + self.down - span
+        self._history = x[-(self.taps - 1):]
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Drain the filter tail at the end of a finite signal."""
+        return self.process(np.zeros((self.taps - 1, self.channels), dtype=np.float32))
+
+
+# ---------------------- LIMITER ----------------------
+class LookaheadLimiter:
+    """
+    Peak limiter that sees one hop ahead, so gain reduction is already in place
+    when a peak arrives and output never exceeds the ceiling.
+
+    Peaks are measured per hop (vectorized); the gain recursion runs once per hop
+    (attack to the lower of this hop's and the next hop's requirement, exponential
+    release otherwise) and is ramped linearly across the samples of each hop.
+    Output is delayed by up to two hops; pass final=True on the last call to drain it.
+    """
+
+    def __init__(self, rate: int, channels: int = 1, ceiling: float = 0.95,
+                 release: float = 0.08, hop: int = 64):
+        self.channels = channels
+        self.ceiling = ceiling
+        self.hop = hop
+        self._recover = 1.0 - np.exp(-hop / (release * rate))
+        self._ramp = np.arange(hop, dtype=np.float32) / hop
+        self._pending = np.zeros((0, channels), dtype=np.float32)
+        self._gain = 1.0
+        self.min_gain = 1.0      # deepest gain reduction seen, for logging
+
+    def process(self, block: np.ndarray, final: bool = False) -> np.ndarray:
+        hop = self.hop
+        buf = np.concatenate([self._pending, np.asarray(block, dtype=np.float32).reshape(-1, self.channels)])
+        valid = len(buf)
+        if final and valid % hop:
+            buf = np.concatenate([buf, np.zeros((hop - valid % hop, self.channels), dtype=np.float32)])
+        hops = len(buf) // hop
+        emit = hops if final else hops - 1
+        if emit <= 0:
+            self._pending = buf[:valid]
+            return np.zeros((0, self.channels), dtype=np.float32)
+
+        peaks = np.abs(buf[:hops * hop]).reshape(hops, -1).max(axis=1)
+        need = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-9)).tolist()
+
+        gains = np.empty(emit + 1, dtype=np.float32)
+        g = min(self._gain, need[0])
+        gains[0] = g
+        for k in range(emit):
+            ahead = need[k + 1] if k + 1 < hops else 1.0
+            g = min(need[k], ahead, g + (1.0 - g) * self._recover)
+            gains[k + 1] = g
+        self._gain = g
+        self.min_gain = min(self.min_gain, float(gains.min()))
+
+        ramp = gains[:-1, None] + (gains[1:] - gains[:-1])[:, None] * self._ramp
+        out = buf[:emit * hop] * ramp.reshape(-1, 1)
+        self._pending = buf[emit * hop:valid] if not final else buf[:0]
+        return out[:valid] if final else out
+
+
+# ---------------------- G.711 μ-LAW ----------------------
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+_MULAW_EXP = np.array([0] + [v.bit_length() - 1 for v in range(1, 256)], dtype=np.int32)
+
+
+def _mulaw_decode_table():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + MULAW_BIAS) << exponent) - MULAW_BIAS
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+MULAW_DECODE = _mulaw_decode_table()
+
+
+def mulaw_encode(pcm: np.ndarray) -> np.ndarray:
+    """int16 PCM -> uint8 μ-law (any shape)."""
+    x = pcm.astype(np.int32)
+    sign = (x < 0).astype(np.int32) << 7
+    x = np.minimum(np.abs(x), MULAW_CLIP) + MULAW_BIAS
+    exponent = _MULAW_EXP[x >> 7]
+    mantissa = (x >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+def mulaw_decode(codes: np.ndarray) -> np.ndarray:
+    """uint8 μ-law -> int16 PCM (any shape)."""
+    return MULAW_DECODE[codes]
+
+
+# ---------------------- IMA ADPCM ----------------------
+IMA_INDEX_TABLE = (-1, -1, -1, -1, 2, 4, 6, 8) * 2
+IMA_STEP_TABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+)
+IMA_BLOCK_ALIGN = 256     # bytes per channel per block (505 samples)
+
+
+def ima_samples_per_block(block_align: int, channels: int) -> int:
+    return (block_align - 4 * channels) * 2 // channels + 1
+
+
+class ImaAdpcmEncoder:
+    """
+    Stateful WAV (format 0x11) IMA ADPCM encoder for int16 (frames, channels) input.
+    Input is buffered until a whole block is available. The quantiser is inherently
+    sequential (every code depends on the previous prediction), so it runs as a
+    tight scalar loop per channel; nibble packing and interleaving are vectorized.
+    """
+
+    def __init__(self, channels: int, block_align: int = None):
+        self.channels = channels
+        self.block_align = block_align or IMA_BLOCK_ALIGN * channels
+        self.samples_per_block = ima_samples_per_block(self.block_align, channels)
+        self._pending = np.zeros((0, channels), dtype=np.int16)
+        self._index = [0] * channels
+
+    def encode(self, pcm: np.ndarray) -> bytes:
+        buf = np.concatenate([self._pending, pcm.reshape(-1, self.channels)])
+        spb = self.samples_per_block
+        nblocks = len(buf) // spb
+        out = b"".join(self._encode_block(buf[b * spb:(b + 1) * spb]) for b in range(nblocks))
+        self._pending = buf[nblocks * spb:]
+        return out
+
+    def _encode_block(self, block: np.ndarray) -> bytes:
+        header = bytearray()
+        codes = np.empty((self.channels, self.samples_per_block - 1), dtype=np.uint8)
+        for c in range(self.channels):
+            samples = block[:, c].tolist()
+            predictor, index = samples[0], self._index[c]
+            header += struct.pack("<hBB", predictor, index, 0)
+            row = codes[c]
+            for k, sample in enumerate(samples[1:]):
+                step = IMA_STEP_TABLE[index]
+                diff = sample - predictor
+                code = 0
+                if diff < 0:
+                    code, diff = 8, -diff
+                if diff >= step:
+                    code |= 4
+                    diff -= step
+                if diff >= step >> 1:
+                    code |= 2
+                    diff -= step >> 1
+                if diff >= step >> 2:
+                    code |= 1
+                delta = step >> 3
+                if code & 4:
+                    delta += step
+                if code & 2:
+                    delta += step >> 1
+                if code & 1:
+                    delta += step >> 2
+                predictor = predictor - delta if code & 8 else predictor + delta
+                predictor = -32768 if predictor < -32768 else 32767 if predictor > 32767 else predictor
+                index += IMA_INDEX_TABLE[code]
+                index = 0 if index < 0 else 88 if index > 88 else index
+                row[k] = code
+            self._index[c] = index
+
+        # Two codes per byte (low nibble first), 4-byte words interleaved by channel
+        pairs = codes.reshape(self.channels, -1, 2)
+        packed = (pairs[:, :, 0] | (pairs[:, :, 1] << 4)).astype(np.uint8)
+        words = packed.reshape(self.channels, -1, 4).transpose(1, 0, 2)
+        return bytes(header) + words.tobytes()
+
+
+class ImaAdpcmDecoder:
+    """
+    WAV (format 0x11) IMA ADPCM blocks -> int16 (frames, channels), the inverse of
+    ImaAdpcmEncoder. Every block header carries the predictor and step index, so
+    blocks decode independently; the per-sample loop is scalar for the same
+    reason the encoder's is.
+    """
+
+    def __init__(self, channels: int, block_align: int = None):
+        self.channels = channels
+        self.block_align = block_align or IMA_BLOCK_ALIGN * channels
+        self.samples_per_block = ima_samples_per_block(self.block_align, channels)
+
+    def decode_block(self, block: bytes) -> np.ndarray:
+        ch = self.channels
+        out = np.empty((self.samples_per_block, ch), dtype=np.int16)
+        words = np.frombuffer(block, dtype=np.uint8, count=self.block_align - 4 * ch, offset=4 * ch)
+        words = words.reshape(-1, ch, 4)
+        for c in range(ch):
+            predictor, index, _ = struct.unpack_from("<hBB", block, 4 * c)
+            packed = words[:, c, :].ravel()
+            codes = np.empty(2 * len(packed), dtype=np.uint8)
+            codes[0::2] = packed & 0x0F
+            codes[1::2] = packed >> 4
+            samples = [predictor]
+            for code in codes.tolist():
+                step = IMA_STEP_TABLE[index]
+                delta = step >> 3
+                if code & 4:
+                    delta += step
+                if code & 2:
+                    delta += step >> 1
+                if code & 1:
+                    delta += step >> 2
+                predictor = predictor - delta if code & 8 else predictor + delta
+                predictor = -32768 if predictor < -32768 else 32767 if predictor > 32767 else predictor
+                index += IMA_INDEX_TABLE[code]
+                index = 0 if index < 0 else 88 if index > 88 else index
+                samples.append(predictor)
+            out[:, c] = samples
+        return out
+
+
+# ---------------------- WAV HEADERS ----------------------
+WAV_FORMAT_TAGS = {"pcm16": 0x0001, "ulaw": 0x0007, "adpcm": 0x0011}
+
+
+def wav_header(rate: int, channels: int, codec: str = "pcm16", data_size: int = 0xFFFFFFFF,
+               block_align: int = None) -> bytes:
+    """RIFF/WAVE header. The default data_size marks an open-ended live stream."""
+    tag = WAV_FORMAT_TAGS[codec]
+    if codec == "pcm16":
+        bits, align = 16, 2 * channels
+        byte_rate = rate * align
+        extra = b""
+    elif codec == "ulaw":
+        bits, align = 8, channels
+        byte_rate = rate * align
+        extra = struct.pack("<H", 0)
+    else:
+        bits, align = 4, block_align or IMA_BLOCK_ALIGN * channels
+        spb = ima_samples_per_block(align, channels)
+        byte_rate = rate * align // spb
+        extra = struct.pack("<HH", 2, spb)
+    fmt = struct.pack("<HHIIHH", tag, channels, rate, byte_rate, align, bits) + extra
+    riff_size = 0xFFFFFFFF if data_size == 0xFFFFFFFF else 4 + 8 + len(fmt) + 8 + data_size
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+# ---------------------- STREAM ENCODER ----------------------
+class StreamEncoder:
+    """
+    int16 capture blocks -> bytes in the negotiated format: optional mono downmix,
+    optional resampling, then pcm16 / μ-law / IMA ADPCM.
+    """
+    CODECS = tuple(WAV_FORMAT_TAGS)
+
+    def __init__(self, in_rate: int, in_channels: int, rate: int, channels: int, codec: str = "pcm16"):
+        self.in_rate, self.in_channels = in_rate, in_channels
+        self.rate, self.channels, self.codec = rate, channels, codec
+        self.passthrough = codec == "pcm16" and rate == in_rate and channels == in_channels
+        self._resampler = PolyphaseResampler(in_rate, rate, channels) if rate != in_rate else None
+        self._adpcm = ImaAdpcmEncoder(channels) if codec == "adpcm" else None
+
+    def header(self) -> bytes:
+        return wav_header(self.rate, self.channels, self.codec)
+
+    @property
+    def bytes_per_second(self):
+        if self.codec == "adpcm":
+            return self.rate * self._adpcm.block_align // self._adpcm.samples_per_block
+        return self.rate * self.channels * (2 if self.codec == "pcm16" else 1)
+
+    def encode(self, block: np.ndarray) -> bytes:
+        if self.passthrough:
+            return block.tobytes()
+        x = block.astype(np.float32)
+        if self.channels == 1 and self.in_channels > 1:
+            x = x.mean(axis=1, keepdims=True)
+        if self._resampler is not None:
+            x = self._resampler.process(x)
+        pcm = np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+        if self.codec == "ulaw":
+            return mulaw_encode(pcm).tobytes()
+        if self.codec == "adpcm":
+            return self._adpcm.encode(pcm)
+        return pcm.tobytes()
@@ -0,0 +1,151 @@
+# bench_civ.py - CI-V codec and parser microbenchmarks (run: python bench_civ.py [size_mb])
+#
+# Correctness checks live in test_civ_codec.py (python -m pytest).
+import random
+import sys
+import time
+
+import civ_codec
+from civ_codec import CivCodec
+from civ_parser import CivFrameParser
+
+RIG, CTRL = 0x98, 0xE0
+
+
+def _frame(to, frm, body):
+    return bytes([0xFE, 0xFE, to, frm] + body + [0xFD])
+
+
+def _bcd_freq(hz):
+    s = str(hz).zfill(10)
+    return [(int(s[i]) << 4) | int(s[i + 1]) for i in range(8, -1, -2)]
+
+
+def synthetic_capture(size_bytes, seed=7300):
+    """
+    Realistic mix of traffic seen on an IC-7300 USB CI-V port: echoed commands,
+    replies, transceive broadcasts, acks, plus the occasional jam code and
+    collision-truncated frame. Returns (capture, number_of_valid_frames).
+    """
+    rnd = random.Random(seed)
+    out = bytearray()
+    valid = 0
+    while len(out) < size_bytes:
+        kind = rnd.random()
+        if kind < 0.30:
+            out += _frame(RIG, CTRL, [0x03]) + _frame(CTRL, RIG, [0x03] + _bcd_freq(rnd.randrange(1800000, 54000000)))
+            valid += 2
+        elif kind < 0.55:
+            out += _frame(0x00, RIG, [0x00] + _bcd_freq(rnd.randrange(1800000, 54000000)))
+            valid += 1
+        elif kind < 0.75:
+            out += _frame(CTRL, RIG, [0x04, rnd.choice([0, 1, 2, 3, 5]), rnd.randint(1, 3)])
+            valid += 1
+        elif kind < 0.90:
+            out += _frame(CTRL, RIG, [0xFB])
+            valid += 1
+        elif kind < 0.95:
+            out += _frame(CTRL, RIG, [0x15, 0x02, 0x01, rnd.randrange(0, 0x99)])
+            valid += 1
+        elif kind < 0.98:
+            out += bytes([0xFE, 0xFE, RIG, CTRL, 0xFC, 0xFC, 0xFD])   # jammed
+        else:
+            out += bytes([0xFE, 0xFE, RIG, CTRL, 0x05, 0x00])         # cut off by a collision
+    return bytes(out), valid
+
+
+def _chunks(data, rnd):
+    i, n = 0, len(data)
+    while i < n:
+        step = rnd.randint(1, 64)
+        yield data[i:i + step]
+        i += step
+
+
+def legacy_extract_all_frames(buf: bytes):
+    """The original one-shot helper from kevin.py, kept for comparison."""
+    frames = []
+    i = 0
+    while i < len(buf) - 4:
+        if buf[i:i+2] == b'\xFE\xFE':
+            try:
+                end = buf.index(b'\xFD', i+4)
+                frames.append(buf[i:end+1])
+                i = end + 1
+            except ValueError:
+                break
+        else:
+            i += 1
+    return frames
+
+
+def bench_parser(size_mb=4.0):
+    capture, expected = synthetic_capture(int(size_mb * 1024 * 1024))
+    chunks = list(_chunks(capture, random.Random(1)))
+    print(f"Capture: {len(capture) / 1e6:.1f} MB, {expected} valid frames, {len(chunks)} reads")
+
+    parser = CivFrameParser()
+    t0 = time.perf_counter()
+    got = 0
+    for chunk in chunks:
+        got += len(parser.feed(chunk))
+    dt = time.perf_counter() - t0
+    if got != expected:
+        print(f"  ⚠️ parser returned {got} frames, expected {expected} (see test_civ_parser.py)")
+    print(f"  CivFrameParser (chunked): {got / dt:12,.0f} frames/s  {len(capture) / dt / 1e6:6.1f} MB/s  {parser.stats()}")
+
+    parser = CivFrameParser()
+    t0 = time.perf_counter()
+    got = len(parser.feed(capture))
+    dt = time.perf_counter() - t0
+    print(f"  CivFrameParser (one buffer): {got / dt:12,.0f} frames/s  {len(capture) / dt / 1e6:6.1f} MB/s")
+
+    t0 = time.perf_counter()
+    got = sum(len(legacy_extract_all_frames(chunk)) for chunk in chunks)
+    dt = time.perf_counter() - t0
+    print(f"  extract_all_frames (chunked):   {got / dt:12,.0f} frames/s  {len(capture) / dt / 1e6:6.1f} MB/s  ({got} frames, straddling ones lost)")
+
+    t0 = time.perf_counter()
+    got = len(legacy_extract_all_frames(capture))
+    dt = time.perf_counter() - t0
+    print(f"  extract_all_frames (one buffer): {got / dt:12,.0f} frames/s  {len(capture) / dt / 1e6:6.1f} MB/s  ({got} frames incl. damaged)")
+
+
+def legacy_set_freq_command(freq_hz):
+    """The original string-based builder from kevin.py, kept for comparison."""
+    s = str(freq_hz).zfill(10)
+    pairs = [s[i:i+2] for i in range(0, 10, 2)]
+    le_pairs = pairs[::-1]
+    return bytes([0xFE, 0xFE, RIG, CTRL, 0x05] + [(int(p[0]) << 4) | int(p[1]) for p in le_pairs] + [0xFD])
+
+
+def legacy_decode_freq(frame):
+    if len(frame) < 11 or frame[4] not in (0x00, 0x03): return None
+    digits = ''.join(f"{(b>>4)&0xF}{b&0xF}" for b in reversed(frame[5:10]))
+    return int(digits)
+
+
+def _rate(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - t0)
+
+
+def bench_codec(n=200000, seed=1):
+    rnd = random.Random(seed)
+    codec = CivCodec(RIG, CTRL)
+    freqs = [rnd.randrange(30_000, 74_800_000) for _ in range(n)]
+    frames = [bytes(_frame(CTRL, RIG, [0x03] + _bcd_freq(hz))) for hz in freqs]
+    buf = bytearray(32)
+    print(f"Codec ({n} frequency frames):")
+    print(f"  legacy set_freq (str):     {_rate(legacy_set_freq_command, freqs):12,.0f} frames/s")
+    print(f"  codec.encode:              {_rate(lambda hz: codec.encode('set_frequency', hz), freqs):12,.0f} frames/s")
+    print(f"  codec.encode_into:         {_rate(lambda hz: codec.encode_into(buf, 'set_frequency', hz), freqs):12,.0f} frames/s")
+    print(f"  legacy decode_freq (str):  {_rate(legacy_decode_freq, frames):12,.0f} frames/s")
+    print(f"  civ_codec.decode:          {_rate(civ_codec.decode, frames):12,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    bench_codec()
+    bench_parser(float(sys.argv[1]) if len(sys.argv) > 1 else 4.0)
@@ -0,0 +1,139 @@
+# bench_serving.py - threaded (kevin.py) vs asyncio (async_server.py) serving under listener load
+#
+#   python bench_serving.py [threaded|async|both] [--listeners 0,10,50,100,200] [--url URL --pid PID]
+#
+# Starts the server in the given mode (or measures a running one with --url), then
+# ramps up /stream.wav listeners. At every step it reports the server's thread
+# count and resident memory (needs psutil), the p50/p99 latency of GET /state
+# probes made while the listeners stream, and the slowest listener's byte rate.
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVERS = {"threaded": "kevin.py", "async": "async_server.py"}
+DEFAULT_URL = "http://127.0.0.1:5000"
+STREAM_PATH = "/stream.wav?rate=8000&channels=1&codec=ulaw"   # 8 kB/s: measures serving, not bandwidth
+PROBE_PATH = "/state"
+SETTLE_SEC = 2.0
+
+
+async def _request(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+async def _listener(host, port, counts, index):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET {STREAM_PATH} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            counts[index] += len(chunk)
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+
+
+async def _probe(host, port, n):
+    latencies = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await _request(host, port, PROBE_PATH)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.01)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+def _process_stats(pid):
+    if psutil is None or pid is None:
+        return None, None
+    proc = psutil.Process(pid)
+    return proc.num_threads(), proc.memory_info().rss / 1e6
+
+
+async def run_steps(url, pid, steps, probes):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    tasks, counts, rows = [], [], []
+    for target in steps:
+        while len(tasks) < target:
+            counts.append(0)
+            tasks.append(asyncio.create_task(_listener(host, port, counts, len(counts) - 1)))
+        await asyncio.sleep(SETTLE_SEC)
+        before = list(counts)
+        t0 = time.perf_counter()
+        p50, p99 = await _probe(host, port, probes)
+        dt = time.perf_counter() - t0
+        rates = [(c - b) / dt / 1000 for c, b in zip(counts, before)]
+        threads, rss = _process_stats(pid)
+        rows.append((target, threads, rss, p50, p99, min(rates) if rates else None))
+        print(f"  {target:5d} listeners  threads {threads if threads is not None else '-':>5}  "
+              f"rss {f'{rss:7.1f} MB' if rss is not None else '      -'}  "
+              f"/state p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  "
+              f"slowest listener {f'{min(rates):5.1f} kB/s' if rates else '    -'}")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return rows
+
+
+def _wait_for_port(url, timeout=30.0):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((parts.hostname, parts.port or 80), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def bench_mode(mode, steps, probes):
+    print(f"{mode} ({SERVERS[mode]}):")
+    server = subprocess.Popen([sys.executable, SERVERS[mode]], cwd=HERE,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_for_port(DEFAULT_URL):
+            print("  server did not come up")
+            return None
+        return asyncio.run(run_steps(DEFAULT_URL, server.pid, steps, probes))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", nargs="?", default="both", choices=["threaded", "async", "both"])
+    parser.add_argument("--listeners", default="0,10,50,100,200")
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--url", help="measure an already running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="pid of the --url server, for threads/memory")
+    args = parser.parse_args()
+    steps = [int(n) for n in args.listeners.split(",")]
+    if psutil is None:
+        print("⚠️ psutil not installed: thread count and memory are not reported (pip install psutil)")
+    if args.url:
+        asyncio.run(run_steps(args.url, args.pid, steps, args.probes))
+    else:
+        for mode in (["threaded", "async"] if args.mode == "both" else [args.mode]):
+            bench_mode(mode, steps, args.probes)
@@ -0,0 +1,242 @@
+# civ_codec.py - Table-driven CI-V encoding/decoding (IC-7300)
+#
+# Every command the backend sends is one row in COMMANDS: the command and
+# sub-command bytes plus the layout of its payload. CivCodec turns the table
+# into ready-made frame templates once, so encoding is a template copy with
+# the payload written in place (or, with encode_into, no allocation at all).
+# decode() maps a received frame to a small typed message instead of callers
+# poking at frame[4], frame[5], ...
+#
+# BCD conversions go through 256-entry lookup tables rather than str/int
+# round trips.
+from typing import NamedTuple
+
+PREAMBLE = b"\xFE\xFE"
+END = 0xFD
+ACK = 0xFB
+NG = 0xFA
+BROADCAST = 0x00
+
+# 0..99 -> packed BCD byte, packed BCD byte -> 0..99 (None for non-BCD bytes)
+BCD_ENCODE = bytes(((i // 10) << 4) | (i % 10) for i in range(100))
+BCD_DECODE = tuple((b >> 4) * 10 + (b & 0x0F) if (b >> 4) < 10 and (b & 0x0F) < 10 else None
+                   for b in range(256))
+_FREQ_SCALE = (1, 100, 10_000, 1_000_000, 100_000_000)   # weight of each little-endian BCD byte
+
+
+# ---------------------- PAYLOAD LAYOUTS ----------------------
+# Each layout knows its byte length and how to write/read its value.
+def _put_freq(buf, off, hz):
+    if not 0 <= hz < 10_000_000_000:
+        raise ValueError(f"frequency out of range: {hz}")
+    for i in range(5):                  # least significant pair first
+        hz, pair = divmod(hz, 100)
+        buf[off + i] = BCD_ENCODE[pair]
+
+
+def _get_freq(data, off):
+    hz = 0
+    for i in range(5):
+        v = BCD_DECODE[data[off + i]]
+        if v is None:
+            return None
+        hz += v * _FREQ_SCALE[i]
+    return hz
+
+
+def _put_bcd2(buf, off, value):
+    """0..9999 as two big-endian BCD bytes (meters, memory channels)."""
+    if not 0 <= value <= 9999:
+        raise ValueError(f"BCD value out of range: {value}")
+    buf[off] = BCD_ENCODE[value // 100]
+    buf[off + 1] = BCD_ENCODE[value % 100]
+
+
+def _get_bcd2(data, off):
+    hi, lo = BCD_DECODE[data[off]], BCD_DECODE[data[off + 1]]
+    return None if hi is None or lo is None else hi * 100 + lo
+
+
+def _put_byte(buf, off, value):
+    buf[off] = value
+
+
+def _put_mode(buf, off, value):
+    mode, filt = value
+    buf[off] = mode
+    buf[off + 1] = filt
+
+
+class Layout(NamedTuple):
+    size: int
+    put: object
+
+
+FREQ = Layout(5, _put_freq)
+BCD2 = Layout(2, _put_bcd2)
+BYTE = Layout(1, _put_byte)
+MODE = Layout(2, _put_mode)           # (mode byte, filter 1-3)
+
+
+class Command(NamedTuple):
+    prefix: bytes                       # command + sub-command bytes
+    payload: Layout = None              # None = no data
+
+
+COMMANDS = {
+    "read_frequency": Command(b"\x03"),
+    "set_frequency": Command(b"\x05", FREQ),
+    "read_mode": Command(b"\x04"),
+    "set_mode": Command(b"\x06", MODE),
+    "read_data_mode": Command(b"\x1A\x06"),
+    "set_data_mode": Command(b"\x1A\x06", BYTE),
+    "read_ptt": Command(b"\x1C\x00"),
+    "set_ptt": Command(b"\x1C\x00", BYTE),
+    "read_s_meter": Command(b"\x15\x02"),
+    "read_po_meter": Command(b"\x15\x11"),
+    "read_swr_meter": Command(b"\x15\x12"),
+    "read_alc_meter": Command(b"\x15\x13"),
+    "vfo_mode": Command(b"\x07"),
+    "memory_mode": Command(b"\x08"),
+    "select_memory": Command(b"\x08", BCD2),      # channel 1-99, 100/101 = P1/P2
+    "memory_write": Command(b"\x09"),
+    "memory_to_vfo": Command(b"\x0A"),
+    "memory_clear": Command(b"\x0B"),
+    "set_transceive": Command(b"\x1A\x05\x00\x71", BYTE),
+}
+
+METERS = {0x02: "s", 0x11: "po", 0x12: "swr", 0x13: "alc", 0x14: "comp", 0x15: "vd", 0x16: "id"}
+
+
+# ---------------------- DECODED MESSAGES ----------------------
+class Ack(NamedTuple):
+    ok: bool
+
+
+class Frequency(NamedTuple):
+    hz: int
+    broadcast: bool = False           # transceive notification rather than a reply
+
+
+class Mode(NamedTuple):
+    mode: int
+    filter: int = None
+    broadcast: bool = False
+
+
+class DataMode(NamedTuple):
+    value: int                        # 0 = off, 1-3 = D1-D3
+    filter: int = None
+
+
+class Ptt(NamedTuple):
+    on: bool
+
+
+class Meter(NamedTuple):
+    meter: str                        # "s", "po", "swr", "alc", ...
+    raw: int                          # 0-255
+
+
+class Transceive(NamedTuple):
+    on: bool
+
+
+class Unknown(NamedTuple):
+    cmd: int
+    data: bytes
+
+
+def _dec_freq(cmd, data):
+    hz = _get_freq(data, 0) if len(data) >= 5 else None
+    return None if hz is None else Frequency(hz, cmd == 0x00)
+
+
+def _dec_mode(cmd, data):
+    if not data:
+        return None
+    return Mode(data[0], data[1] if len(data) > 1 else None, cmd == 0x01)
+
+
+def _dec_1a(cmd, data):
+    if len(data) >= 2 and data[0] == 0x06:
+        return DataMode(data[1], data[2] if len(data) > 2 else None)
+    if len(data) >= 4 and data[:3] == b"\x05\x00\x71":
+        return Transceive(bool(data[3]))
+    return Unknown(cmd, bytes(data))
+
+
+def _dec_1c(cmd, data):
+    if len(data) >= 2 and data[0] == 0x00:
+        return Ptt(data[1] == 0x01)
+    return Unknown(cmd, bytes(data))
+
+
+def _dec_15(cmd, data):
+    if len(data) >= 3 and data[0] in METERS:
+        raw = _get_bcd2(data, 1)
+        if raw is not None:
+            return Meter(METERS[data[0]], raw)
+    return Unknown(cmd, bytes(data))
+
+
+_ACK = Ack(True)
+_NG = Ack(False)
+DECODERS = {
+    0x00: _dec_freq, 0x03: _dec_freq,    # broadcast / read reply
+    0x01: _dec_mode, 0x04: _dec_mode,
+    0x1A: _dec_1a,
+    0x1C: _dec_1c,
+    0x15: _dec_15,
+    ACK: lambda cmd, data: _ACK,
+    NG: lambda cmd, data: _NG,
+}
+
+
+def decode(frame):
+    """
+    Typed message for a complete frame (FE FE to from cmd ... FD), or None if
+    the frame is too short or its payload is malformed.
+    """
+    if frame is None or len(frame) < 6:
+        return None
+    cmd = frame[4]
+    data = memoryview(frame)[5:-1]
+    decoder = DECODERS.get(cmd)
+    return decoder(cmd, data) if decoder else Unknown(cmd, bytes(data))
+
+
+class CivCodec:
+    """
+    Frame builder for one controller/radio address pair. Each command in
+    COMMANDS is compiled once into a bytes template.
+    """
+
+    def __init__(self, to: int, frm: int):
+        self.to = to
+        self.frm = frm
+        self._templates = {}
+        for name, command in COMMANDS.items():
+            size = command.payload.size if command.payload else 0
+            head = PREAMBLE + bytes([to, frm]) + command.prefix
+            self._templates[name] = (head + bytes(size) + bytes([END]), len(head), command.payload)
+
+    def frame_size(self, name: str) -> int:
+        return len(self._templates[name][0])
+
+    def encode(self, name: str, value=None) -> bytearray:
+        """New frame for command `name` (value as the command's payload expects)."""
+        template, off, payload = self._templates[name]
+        frame = bytearray(template)
+        if payload is not None:
+            payload.put(frame, off, value)
+        return frame
+
+    def encode_into(self, buf, name: str, value=None) -> int:
+        """Write the frame into an existing buffer (e.g. a reused bytearray); returns its length."""
+        template, off, payload = self._templates[name]
+        n = len(template)
+        buf[:n] = template
+        if payload is not None:
+            payload.put(buf, off, value)
+        return n
@@ -0,0 +1,65 @@
+# civ_parser.py - Incremental CI-V frame parser
+#
+# A CI-V frame on the wire looks like:  FE FE <to> <from> <cmd> [data...] FD
+# Bytes arrive from the serial port in arbitrary chunks, so a frame can straddle
+# two reads. The parser keeps the unfinished tail between calls and lets the
+# regex engine do the scanning in C instead of slicing byte by byte.
+import re
+
+PREAMBLE = b'\xFE\xFE'
+END = 0xFD
+MAX_FRAME_LEN = 64         # an unterminated "frame" longer than this is line noise
+
+# Exactly two preamble bytes, at least <to> <from> <cmd>, terminator.
+# The body may not contain FE (a new preamble means the frame was cut off by a
+# collision), FD (terminator) or FC (the jam code sent after a collision), so
+# damaged frames simply never match and extra leading FEs are skipped.
+FRAME_RE = re.compile(rb'\xFE\xFE[^\xFC-\xFE]{3,}?\xFD')
+# Frame starts, for the dropped count: a run of FEs is one preamble however long
+PREAMBLE_RUN_RE = re.compile(rb'\xFE{2,}')
+
+
+class CivFrameParser:
+    """
+    Stateful CI-V frame splitter.
+
+    feed() takes any chunk of bytes and returns the list of complete frames
+    (as bytes, always starting with exactly FE FE). A partial frame at the end
+    of a chunk is kept for the next call. Frames damaged by a collision or
+    carrying the 0xFC jam code are dropped and counted.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.frames = 0
+        self.dropped = 0
+
+    def reset(self):
+        self._buf.clear()
+
+    def feed(self, data) -> list:
+        buf = self._buf
+        buf += data
+        frames = FRAME_RE.findall(buf)
+
+        # Keep the last preamble onward if it has not been terminated yet
+        n = len(buf)
+        keep = buf.rfind(PREAMBLE)
+        if keep < 0 or buf.find(END, keep) >= 0 or n - keep > MAX_FRAME_LEN:
+            keep = n - 1 if n and buf[n - 1] == 0xFE else n
+
+        started = buf.count(PREAMBLE, 0, keep)
+        if buf.find(b'\xFE\xFE\xFE', 0, keep) >= 0:     # rare: longer preambles count once
+            started = len(PREAMBLE_RUN_RE.findall(buf, 0, keep))
+        if started > len(frames):
+            self.dropped += started - len(frames)
+        self.frames += len(frames)
+        del buf[:keep]
+        return frames
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "buffered": len(self._buf),
+        }
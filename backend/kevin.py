@@ -1,10 +1,22 @@
 # server.py - Combined Icom CI-V + Green Heron Rotator Control (with USB-D1 toggle!)
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file
+import asyncio
 import os
 import serial
+import struct
 import time
 import atexit
+import contextlib
+import hashlib
+import io
+import json
+import heapq
+import math
+import re
+import itertools
 import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from datetime import datetime
 
 import numpy as np
@@ -17,16 +29,26 @@ except ImportError:
     print("⚠️ sounddevice not available, falling back to soundcard")
 from pydub import AudioSegment
 from scipy.io import wavfile
-from scipy.signal import resample
+
+from audio_dsp import LookaheadLimiter, PolyphaseResampler, StreamEncoder, wav_header
+from civ_codec import CivCodec, DataMode, Frequency, Meter, Mode, Ptt, decode as civ_decode
+from civ_parser import CivFrameParser
+from peaks import PeakPyramid
+from recordings_catalog import RecordingsCatalog, open_samples, read_wav_info
 
 app = Flask(__name__)
 
 # Enable CORS manually (works without flask-cors package)
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization,ngrok-skip-browser-warning',
+    'Access-Control-Allow-Methods': 'GET,PUT,POST,DELETE,OPTIONS',
+}
+
 @app.after_request
 def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,ngrok-skip-browser-warning')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    for name, value in CORS_HEADERS.items():
+        response.headers.add(name, value)
     # Handle ngrok warning bypass
     if request.headers.get('ngrok-skip-browser-warning'):
         response.headers.add('ngrok-skip-browser-warning', 'true')
@@ -46,16 +68,69 @@ CI_V_FROM = 0xE0
 
 ROTATOR_PORT = "COM5"
 ROTATOR_BAUD = 4800
+ROTATOR_POLL_INTERVAL = 0.25      # seconds between position reads by the tracker
+ROTATOR_REPLY_TIMEOUT = 0.2       # wait this long for the controller's C2 reply
+ROTATOR_STALE_SEC = 2.0           # a cached azimuth older than this is flagged stale
+ROTATOR_MAX_AZ = 360              # go-to targets are 0 .. this
+ROTATOR_GOTO_TOLERANCE = 2        # degrees: a go-to closer than this is done
+ROTATOR_GOTO_TRIES = 3            # turn-and-stop attempts per go-to (the first plus corrections)
+ROTATOR_GOTO_TIMEOUT = 120.0      # give up (and stop) after this long
+ROTATOR_STALL_SEC = 3.0           # turning with no change in azimuth this long = stalled
+ROTATOR_COAST_DEG = 2.0           # starting guess for how far the rotator coasts after STOP (learned)
+ROTATOR_SETTLE_SEC = 2.0          # max wait for the coast to end before judging a stop
 
 # Audio capture/output
 SAMPLE_RATE = 44100
 BLOCK_SIZE = 1024
 CHANNELS = 2
+STREAM_RATES = (8000, 12000, 16000, 24000, SAMPLE_RATE)   # selectable /stream.wav rates
+
+# Spectrum / waterfall of the RX audio
+SPECTRUM_FFT = 4096               # FFT length (10.8 Hz resolution at 44.1 kHz)
+SPECTRUM_FPS = 30                 # waterfall rows per second
+SPECTRUM_BINS = 256               # columns per row
+SPECTRUM_SPAN_HZ = 6000           # rows cover 0 .. this (SSB/data audio lives below ~3 kHz)
+SPECTRUM_DB_RANGE = (-110.0, -10.0)   # dBFS mapped to uint8 0..255
+SPECTRUM_HISTORY = 512            # rows kept for polling clients (~17 s at 30 fps)
+SPECTRUM_IDLE_SEC = 10.0          # stop the engine this long after the last client request
+
+# Telemetry (audio levels + radio meters)
+TELEMETRY_INTERVAL = 0.1          # seconds per history sample
+TELEMETRY_HISTORY = 600           # samples kept (60 s at 0.1 s)
+TELEMETRY_METER_INTERVAL = 0.2    # one CI-V meter read per this many seconds
+TELEMETRY_METER_TIMEOUT = 0.2
+TELEMETRY_IDLE_SEC = 30.0         # stop polling this long after the last client request
+CLIP_LEVEL = 0.999                # |sample| at or above this counts as clipped
+
+# Continuous RX recording (rec_YYYYMMDD_HHMMSS.wav segments in RECORDINGS_DIR)
+RX_RECORD_ON_START = False        # start the recorder with the server
+RX_SEGMENT_SECONDS = 600          # rotate segments after this long...
+RX_SEGMENT_MAX_BYTES = 256 * 1024 * 1024   # ...or this many bytes, whichever comes first
+RX_SPLIT_ON_SILENCE = False       # close segments on silence and skip recording it
+RX_SILENCE_DBFS = -50.0           # blocks below this peak level count as silence
+RX_SILENCE_HANG = 5.0             # seconds of silence before a segment is closed
+RX_MIN_SEGMENT = 2.0              # never split off segments shorter than this
+RX_FLUSH_SECONDS = 5.0            # write dirty pages back this often
+CATALOG_WORKERS = 2               # threads computing peak/RMS for newly indexed recordings
+CATALOG_REFRESH_SEC = 10.0        # rescan RECORDINGS_DIR at most this often
+RECORDING_MAX_AGE = 3600          # Cache-Control max-age for finished recordings
+RECORDING_READ_CHUNK = 256 * 1024 # file chunk size when streaming a ?t= seek
 
 # Radio transmission settings
 RADIO_SAMPLE_RATE = 48000  # Target sample rate for radio (FS in the example)
 RADIO_DEVICE_INDEX = 26    # Radio USB output device index (update this to match your setup)
 RADIO_VOLUME_SCALE = 0.8   # Volume scaling for transmission (increased from 0.3)
+TX_CHAIN_GAP = 0.0         # seconds to hold PTT waiting for the next message (0 = chain only ones already queued)
+PTT_DEFAULT_SECONDS = 5    # /ptt/on without ?seconds=
+PTT_MAX_SECONDS = 180      # transmit time-out: PTT is forced off after this long keyed, whoever keyed it
+PTT_RELEASE_RETRY = 0.5    # seconds between PTT-off attempts when the radio does not ack
+PTT_RELEASE_TRIES = 10     # PTT-off retries before giving up (and logging it)
+TX_SAVE_UPLOADS = False    # also write each decoded upload to RECORDINGS_DIR (off the hot path)
+TX_BLOCK = 1024            # frames per block written to the radio output stream
+TX_LIMITER_CEILING = 0.95  # peak ceiling before RADIO_VOLUME_SCALE (5% headroom)
+TX_CACHE_MAX_BYTES = 256 * 1024 * 1024   # prepared TX buffers kept in RAM (~11 min of 48 kHz stereo)
+TX_CACHE_DIR = None        # e.g. os.path.join(PROJECT_ROOT, "tx_cache") to spill evicted buffers to disk
+TX_CACHE_DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024
 
 # Storage locations (project root level)
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -72,7 +147,6 @@ ADMIN_PASSWORD = os.getenv("ET3AA_PASSWORD", "et3aa123")
 # ---------------------- SERIAL CONNECTIONS ----------------------
 radio_ser = None
 rotator_ser = None
-serial_lock = threading.Lock()
 
 def init_serial_ports():
     global radio_ser, rotator_ser
@@ -96,72 +170,792 @@ except Exception as e:
 
 @atexit.register
 def cleanup():
+    rx_recorder.stop()
+    rotator_tracker.cancel("shutdown")
+    if ptt_timer.keyed_at is not None:
+        ptt_timer.release(reason="shutdown")
+    civ.stop()
     for s, name in [(radio_ser, "Radio"), (rotator_ser, "Rotator")]:
         if s and s.is_open:
             s.close()
             print(f"{name} port closed.")
 
 
-# ---------------------- AUDIO STREAMING ----------------------
-def gen_audio():
+# ---------------------- LIVE EVENTS ----------------------
+EVENT_HISTORY = 256          # events kept for clients resuming with Last-Event-ID
+EVENT_KEEPALIVE_SEC = 15
+
+
+class EventHub:
     """
-    Generator that finds the system loopback/monitor and streams raw PCM bytes.
+    Versioned change feed for radio/rotator/TX state. publish() drops values that
+    did not change, so clients only ever receive real changes; every event gets
+    the next version number.
     """
+
+    def __init__(self, history: int = EVENT_HISTORY):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)   # (version, kind, data)
+        self._latest = {}                      # kind -> (version, data)
+        self._watchers = []
+        self.version = 0
+
+    def watch(self, callback):
+        """Also call callback() (from the publishing thread) after every new event."""
+        self._watchers.append(callback)
+
+    def publish(self, kind: str, data: dict):
+        with self._cond:
+            if kind in self._latest and self._latest[kind][1] == data:
+                return
+            self.version += 1
+            self._events.append((self.version, kind, data))
+            self._latest[kind] = (self.version, data)
+            self._cond.notify_all()
+        for callback in self._watchers:
+            callback()
+
+    def snapshot(self):
+        """Latest event of every kind, oldest first."""
+        with self._cond:
+            return sorted((v, kind, data) for kind, (v, data) in self._latest.items())
+
+    def since(self, version: int):
+        """Events newer than version, or None if they already fell out of the history."""
+        with self._cond:
+            if version < self.version - len(self._events) or version > self.version:
+                return None
+            return [e for e in self._events if e[0] > version]
+
+    def wait(self, version: int, timeout: float):
+        """Block until something newer than version is published (or timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > version, timeout=timeout)
+        return self.since(version)
+
+
+events_hub = EventHub()
+
+
+# ---------------------- AUDIO STREAMING ----------------------
+AUDIO_RING_BLOCKS = 64   # ~1.5 s at 44.1 kHz / 1024-frame blocks
+
+
+def find_loopback_mic():
+    """Find the system loopback/monitor device, or None."""
     default_speaker = sc.default_speaker()
     print(f"🔊 Default Speaker identified as: {default_speaker.name}")
 
     loopback_mic = None
-    try:
-        all_mics = sc.all_microphones(include_loopback=True)
-        for mic in all_mics:
-            if mic.name == default_speaker.name:
-                loopback_mic = mic
-                break
-            if "loopback" in mic.name.lower() or "monitor" in mic.name.lower():
-                loopback_mic = mic
-                break
-
-        if loopback_mic is None and len(all_mics) > 0:
-            print("⚠️ Could not match speaker name exactly. Using the first available device.")
-            loopback_mic = all_mics[0]
-        if loopback_mic is None:
-            print("❌ No loopback device found. Is your audio driver compatible?")
-            return
+    all_mics = sc.all_microphones(include_loopback=True)
+    for mic in all_mics:
+        if mic.name == default_speaker.name:
+            loopback_mic = mic
+            break
+        if "loopback" in mic.name.lower() or "monitor" in mic.name.lower():
+            loopback_mic = mic
+            break
+
+    if loopback_mic is None and len(all_mics) > 0:
+        print("⚠️ Could not match speaker name exactly. Using the first available device.")
+        loopback_mic = all_mics[0]
+    if loopback_mic is None:
+        print("❌ No loopback device found. Is your audio driver compatible?")
+    return loopback_mic
+
+
+class AudioCapture:
+    """
+    One loopback capture shared by every consumer. The capture thread writes
+    int16 PCM blocks into a fixed ring buffer; each listener keeps its own read
+    cursor. A listener that falls a full ring behind is skipped forward (and its
+    lag counter bumped) instead of holding anyone else up. The device is opened
+    when the first listener arrives and released after the last one leaves.
+    """
 
-        print(f"🎤 Recording from Loopback Device: {loopback_mic.name}")
-        with loopback_mic.recorder(samplerate=SAMPLE_RATE, channels=CHANNELS, blocksize=BLOCK_SIZE) as mic:
-            while True:
-                data = mic.record(numframes=BLOCK_SIZE)
-                audio_bytes = (data * 32767).astype(np.int16).tobytes()
-                yield audio_bytes
-    except Exception as e:
-        print(f"❌ Error in audio capture: {e}")
+    def __init__(self, blocks: int = AUDIO_RING_BLOCKS):
+        self.capacity = blocks
+        self._ring = np.zeros((blocks, BLOCK_SIZE, CHANNELS), dtype=np.int16)
+        self._scratch = np.empty((BLOCK_SIZE, CHANNELS), dtype=np.float32)
+        self._cond = threading.Condition()
+        self._listeners = set()
+        self._thread = None
+        self.seq = 0          # total blocks captured so far
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def listen(self, name: str = ""):
+        listener = AudioListener(self, name)
+        with self._cond:
+            listener.cursor = self.seq
+            self._listeners.add(listener)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+                self._thread.start()
+        return listener
+
+    def _remove(self, listener):
+        with self._cond:
+            self._listeners.discard(listener)
+
+    def listeners(self):
+        with self._cond:
+            return [l.stats() for l in self._listeners]
+
+    def _run(self):
+        try:
+            mic = find_loopback_mic()
+            if mic is None:
+                return
+            print(f"🎤 Recording from Loopback Device: {mic.name}")
+            with mic.recorder(samplerate=SAMPLE_RATE, channels=CHANNELS, blocksize=BLOCK_SIZE) as rec:
+                while True:
+                    with self._cond:
+                        if not self._listeners:
+                            break
+                    data = rec.record(numframes=BLOCK_SIZE)
+                    np.multiply(data, 32767, out=self._scratch, casting="unsafe")
+                    self._ring[self.seq % self.capacity] = self._scratch
+                    with self._cond:
+                        self.seq += 1
+                        self._cond.notify_all()
+            print("🎤 Loopback capture stopped (no listeners)")
+        except Exception as e:
+            print(f"❌ Error in audio capture: {e}")
+        finally:
+            with self._cond:
+                self._thread = None
+                self._cond.notify_all()
+
+    def _read(self, listener, timeout):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > listener.cursor or self._thread is None, timeout):
+                return None
+            if self.seq <= listener.cursor:
+                return None
+            behind = self.seq - listener.cursor
+            # Never read the slot the capture thread may be overwriting next
+            if behind > self.capacity - 2:
+                listener.lag_blocks += behind - 1
+                listener.cursor = self.seq - 1
+            block = self._ring[listener.cursor % self.capacity].copy()
+            listener.cursor += 1
+            return block
+
+
+class AudioListener:
+    """Read cursor into AudioCapture. Use as a context manager."""
+
+    def __init__(self, capture: AudioCapture, name: str = ""):
+        self.capture = capture
+        self.name = name
+        self.cursor = 0
+        self.lag_blocks = 0     # blocks skipped because this listener was too slow
+        self.started = time.time()
+
+    def read(self, timeout: float = 1.0):
+        """Next (BLOCK_SIZE, CHANNELS) int16 block, or None if capture stopped/timed out."""
+        return self.capture._read(self, timeout)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "behind_blocks": self.capture.seq - self.cursor,
+            "lag_blocks": self.lag_blocks,
+            "connected_sec": round(time.time() - self.started, 1),
+        }
+
+    def close(self):
+        self.capture._remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+audio_capture = AudioCapture()
+
+
+def gen_audio(name: str = "", encoder: StreamEncoder = None):
+    """
+    Generator that streams PCM bytes from the shared loopback capture,
+    optionally converted by a StreamEncoder.
+    """
+    with audio_capture.listen(name) as listener:
+        while True:
+            block = listener.read()
+            if block is None:
+                if not audio_capture.running:
+                    return
+                continue
+            data = encoder.encode(block) if encoder else block.tobytes()
+            if data:
+                yield data
+
+
+def stream_encoder(args):
+    """(StreamEncoder, None) for the /stream.wav query args, or (None, error body)."""
+    try:
+        rate = int(args.get("rate", SAMPLE_RATE))
+        channels = int(args.get("channels", CHANNELS))
+    except ValueError:
+        return None, {"error": "rate and channels must be integers"}
+    codec = args.get("codec", "pcm16").lower()
+    if rate not in STREAM_RATES or channels not in (1, CHANNELS) or codec not in StreamEncoder.CODECS:
+        return None, {
+            "error": "Unsupported stream format",
+            "rates": STREAM_RATES,
+            "channels": [1, CHANNELS],
+            "codecs": StreamEncoder.CODECS,
+        }
+    return StreamEncoder(SAMPLE_RATE, CHANNELS, rate, channels, codec), None
 
 
 @app.route("/stream.wav")
 def stream_audio():
+    """
+    Live RX audio as an open-ended WAV stream. Defaults to the raw capture format
+    (44.1 kHz 16-bit stereo); ?rate=8000|12000|16000|24000, ?channels=1 and
+    ?codec=ulaw|adpcm trade fidelity for bandwidth (8 kHz mono μ-law is ~22x smaller).
+    """
+    encoder, error = stream_encoder(request.args)
+    if error:
+        return jsonify(error), 400
+    name = request.remote_addr or ""
+
     def generate():
-        # WAV header for 44.1kHz, 16-bit stereo PCM
-        yield (
-            b"RIFF"
-            + b"\xff\xff\xff\xff"
-            + b"WAVEfmt "
-            + b"\x10\x00\x00\x00"
-            + b"\x01\x00"
-            + b"\x02\x00"
-            + b"\x44\xac\x00\x00"
-            + b"\x10\xb1\x02\x00"
-            + b"\x04\x00"
-            + b"\x10\x00"
-            + b"data"
-            + b"\xff\xff\xff\xff"
-        )
-        yield from gen_audio()
+        yield encoder.header()
+        yield from gen_audio(name, encoder)
 
     return Response(generate(), mimetype="audio/wav")
 
 
-playback_lock = threading.Lock()
+# ---------------------- SPECTRUM ----------------------
+class SpectrumEngine:
+    """
+    Waterfall rows from the shared loopback capture. Capture blocks are downmixed
+    into a preallocated mono buffer; every hop (SAMPLE_RATE / fps frames) that is
+    ready is taken as one overlapped, Hann-windowed frame, and all ready frames
+    are transformed together in one batched rfft. Each spectrum is reduced to
+    `bins` columns (max power per column), converted to dBFS and quantised to
+    uint8 over SPECTRUM_DB_RANGE, then stored in a ring of recent rows. The
+    engine runs only while clients keep asking for rows.
+    """
+
+    def __init__(self, fft_size: int = SPECTRUM_FFT, fps: float = SPECTRUM_FPS, bins: int = SPECTRUM_BINS,
+                 span_hz: float = SPECTRUM_SPAN_HZ, history: int = SPECTRUM_HISTORY):
+        self.fft_size = fft_size
+        self.fps = fps
+        self.hop = max(1, int(round(SAMPLE_RATE / fps)))
+        top = min(fft_size // 2, int(span_hz * fft_size / SAMPLE_RATE))
+        self.bins = min(bins, top)
+        self.span_hz = top * SAMPLE_RATE / fft_size
+        self._edges = np.linspace(0, top, self.bins + 1).astype(np.int64)[:-1]
+        self._top = top
+        window = np.hanning(fft_size).astype(np.float32)
+        self._window = window
+        # Full-scale sine -> 0 dBFS
+        self._ref = (2.0 / window.sum()) ** 2
+        lo, hi = SPECTRUM_DB_RANGE
+        self._db_lo = lo
+        self._db_scale = 255.0 / (hi - lo)
+        self._buf = np.zeros(fft_size + self.hop + BLOCK_SIZE, dtype=np.float32)
+        self._fill = 0
+        self._next = 0                 # buffer index where the next frame starts
+        self._rows = np.zeros((history, self.bins), dtype=np.uint8)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_request = 0.0
+        self.seq = 0                   # total rows produced
+        self.compute_sec = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def touch(self):
+        """Note client interest; starts the engine if it is idle."""
+        with self._cond:
+            self._last_request = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="spectrum", daemon=True)
+                self._thread.start()
+
+    def rows_since(self, seq: int = None, timeout: float = 0.0):
+        """(next_seq, rows) with the rows produced after seq (just the newest if seq is None)."""
+        self.touch()
+        with self._cond:
+            start = max(self.seq - 1, 0) if seq is None else seq
+            self._cond.wait_for(lambda: self.seq > start or self._thread is None, timeout)
+            start = max(start, self.seq - len(self._rows), 0)
+            idx = np.arange(start, self.seq) % len(self._rows)
+            return self.seq, self._rows[idx]
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "rows": self.seq,
+            "fps": self.fps,
+            "bins": self.bins,
+            "fft_size": self.fft_size,
+            "span_hz": round(self.span_hz, 1),
+            "db_range": SPECTRUM_DB_RANGE,
+            "cpu_per_row_ms": round(self.compute_sec / self.seq * 1000, 3) if self.seq else 0.0,
+        }
+
+    def _run(self):
+        try:
+            with audio_capture.listen("spectrum") as listener:
+                while time.monotonic() - self._last_request < SPECTRUM_IDLE_SEC:
+                    block = listener.read()
+                    if block is None:
+                        if not audio_capture.running:
+                            break
+                        continue
+                    self._feed(block)
+        except Exception as e:
+            print(f"❌ Error in spectrum engine: {e}")
+        finally:
+            with self._cond:
+                self._thread = None
+                self._fill = self._next = 0
+                self._cond.notify_all()
+
+    def _feed(self, block: np.ndarray):
+        buf = self._buf
+        n = len(block)
+        chunk = buf[self._fill:self._fill + n]
+        np.sum(block, axis=1, dtype=np.float32, out=chunk)
+        chunk *= 1.0 / (32768.0 * block.shape[1])
+        self._fill += n
+
+        ready = self._fill - self._next - self.fft_size
+        if ready >= 0:
+            t0 = time.perf_counter()
+            count = ready // self.hop + 1
+            frames = np.lib.stride_tricks.sliding_window_view(buf[:self._fill], self.fft_size)
+            frames = frames[self._next:self._next + count * self.hop:self.hop]
+            spec = np.fft.rfft(frames * self._window, axis=1)[:, :self._top]
+            power = spec.real ** 2 + spec.imag ** 2
+            cols = np.maximum.reduceat(power, self._edges, axis=1)
+            db = np.log10(cols * self._ref + 1e-12)
+            db *= 10.0
+            db -= self._db_lo
+            db *= self._db_scale
+            rows = np.clip(db, 0, 255).astype(np.uint8)
+            self._next += count * self.hop
+            with self._cond:
+                for row in rows:
+                    self._rows[self.seq % len(self._rows)] = row
+                    self.seq += 1
+                self.compute_sec += time.perf_counter() - t0
+                self._cond.notify_all()
+
+        # Drop what no future frame needs
+        shift = min(self._next, self._fill)
+        if shift:
+            buf[:self._fill - shift] = buf[shift:self._fill]
+            self._fill -= shift
+            self._next -= shift
+
+
+spectrum = SpectrumEngine()
+
+
+def _spectrum_headers(seq: int):
+    return {
+        "X-Spectrum-Seq": str(seq),
+        "X-Spectrum-Bins": str(spectrum.bins),
+        "X-Spectrum-Fps": str(spectrum.fps),
+        "X-Spectrum-Span-Hz": f"{spectrum.span_hz:.1f}",
+        "X-Spectrum-Db-Range": f"{SPECTRUM_DB_RANGE[0]:g},{SPECTRUM_DB_RANGE[1]:g}",
+        "Cache-Control": "no-cache",
+    }
+
+@app.route("/spectrum", methods=["GET"])
+def get_spectrum():
+    """
+    Waterfall rows produced after ?since=<seq> (only the newest row without it),
+    waiting up to ?wait= seconds for a new one. The body is rows x bins uint8
+    (0 = SPECTRUM_DB_RANGE low end, 255 = high end); pass X-Spectrum-Seq back as
+    since on the next poll. ?format=json returns the same as lists.
+    """
+    try:
+        since, wait = spectrum_args(request.args)
+    except ValueError:
+        return jsonify({"error": "since must be an integer and wait a number"}), 400
+    seq, rows = spectrum.rows_since(since, timeout=wait)
+    if request.args.get("format") == "json":
+        return jsonify({"seq": seq, "rows": rows.tolist(), **spectrum.stats()})
+    return Response(rows.tobytes(), mimetype="application/octet-stream", headers=_spectrum_headers(seq))
+
+def spectrum_args(args):
+    """(since, wait) for GET /spectrum. Raises ValueError."""
+    since = int(args["since"]) if "since" in args else None
+    return since, min(float(args.get("wait", 1.0)), 10.0)
+
+@app.route("/spectrum/stream", methods=["GET"])
+def stream_spectrum():
+    """Continuous waterfall: an endless body of fixed-size rows (X-Spectrum-Bins bytes each)."""
+    seq, _ = spectrum.rows_since(None)
+
+    def generate():
+        next_seq = seq
+        while True:
+            next_seq, rows = spectrum.rows_since(next_seq, timeout=1.0)
+            if len(rows):
+                yield rows.tobytes()
+
+    return Response(generate(), mimetype="application/octet-stream", headers=_spectrum_headers(seq))
+
+
+# ---------------------- RX RECORDER ----------------------
+class MmapWavWriter:
+    """
+    16-bit PCM WAV written through a memory map. The file is preallocated for
+    max_frames up front, so writing a block is a plain array copy with no
+    syscalls or reallocation. close() patches the RIFF/data sizes to the frames
+    actually written, truncates the unused tail and renames path.part -> path.
+    """
+
+    def __init__(self, path: str, rate: int, channels: int, max_frames: int):
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.max_frames = max_frames
+        self.frames = 0
+        self._part = path + ".part"
+        header = wav_header(rate, channels, "pcm16", data_size=max_frames * channels * 2)
+        self._offset = len(header)
+        with open(self._part, "wb") as f:
+            f.write(header)
+            f.truncate(self._offset + max_frames * channels * 2)
+        self._data = np.memmap(self._part, dtype="<i2", mode="r+", offset=self._offset,
+                               shape=(max_frames, channels))
+
+    @property
+    def full(self):
+        return self.frames >= self.max_frames
+
+    @property
+    def seconds(self):
+        return self.frames / self.rate
+
+    def write(self, block: np.ndarray) -> int:
+        n = min(len(block), self.max_frames - self.frames)
+        self._data[self.frames:self.frames + n] = block[:n]
+        self.frames += n
+        return n
+
+    def flush(self):
+        self._data.flush()
+
+    def close(self):
+        self._data.flush()
+        del self._data                    # unmap before truncating (required on Windows)
+        data_size = self.frames * self.channels * 2
+        with open(self._part, "r+b") as f:
+            f.write(wav_header(self.rate, self.channels, "pcm16", data_size=data_size))
+            f.truncate(self._offset + data_size)
+        os.replace(self._part, self.path)
+
+
+class RxRecorder:
+    """
+    Records the receiver around the clock from the shared loopback capture. It is
+    just another AudioCapture listener, so live streams are not affected; if the
+    disk stalls, the recorder falls behind and skips blocks on its own cursor.
+    Segments rotate every RX_SEGMENT_SECONDS / RX_SEGMENT_MAX_BYTES, or, with
+    RX_SPLIT_ON_SILENCE, after RX_SILENCE_HANG seconds of silence (which is not
+    recorded). Memory use is constant: one capture block at a time.
+    """
+
+    def __init__(self, directory: str = RECORDINGS_DIR):
+        self.directory = directory
+        self._thread = None
+        self._stop = threading.Event()
+        self._writer = None
+        self._silent_frames = 0
+        self.segments = 0
+        self.frames_written = 0
+        self.lag_blocks = 0
+        self.last_segment = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rx-recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=5)
+
+    def status(self):
+        writer = self._writer
+        return {
+            "recording": self.running,
+            "segment": os.path.basename(writer.path) if writer else None,
+            "segment_sec": round(writer.seconds, 1) if writer else 0.0,
+            "segments": self.segments,
+            "last_segment": self.last_segment,
+            "hours_recorded": round(self.frames_written / SAMPLE_RATE / 3600, 3),
+            "lag_blocks": self.lag_blocks,
+            "split_on_silence": RX_SPLIT_ON_SILENCE,
+        }
+
+    def _run(self):
+        print("⏺️ RX recorder started")
+        silence_level = 32767 * 10 ** (RX_SILENCE_DBFS / 20)
+        try:
+            while not self._stop.is_set():
+                with audio_capture.listen("recorder") as listener:
+                    last_flush = time.monotonic()
+                    while not self._stop.is_set():
+                        block = listener.read()
+                        if block is None:
+                            if not audio_capture.running:
+                                break
+                            continue
+                        self._record(block, np.abs(block).max() < silence_level)
+                        if self._writer and time.monotonic() - last_flush > RX_FLUSH_SECONDS:
+                            self._writer.flush()
+                            last_flush = time.monotonic()
+                    self.lag_blocks += listener.lag_blocks
+                self._close_segment()
+                if not self._stop.is_set():
+                    time.sleep(1.0)      # capture device went away; try again
+        except Exception as e:
+            print(f"❌ Error in RX recorder: {e}")
+        finally:
+            self._close_segment()
+            self._thread = None
+            print("⏺️ RX recorder stopped")
+
+    def _record(self, block: np.ndarray, silent: bool):
+        if RX_SPLIT_ON_SILENCE:
+            self._silent_frames = self._silent_frames + len(block) if silent else 0
+            if self._silent_frames >= RX_SILENCE_HANG * SAMPLE_RATE:
+                if self._writer and self._writer.seconds >= RX_MIN_SEGMENT:
+                    self._close_segment()
+                if self._writer is None:
+                    return
+        while len(block):
+            if self._writer is None:
+                self._open_segment()
+            n = self._writer.write(block)
+            self.frames_written += n
+            block = block[n:]          # the rest of a block straddling a rotation starts the next segment
+            if self._writer.full:
+                self._close_segment()
+
+    def _open_segment(self):
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory, f"rec_{stamp}.wav")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"rec_{stamp}_{n}.wav")
+            n += 1
+        max_frames = min(int(RX_SEGMENT_SECONDS * SAMPLE_RATE), RX_SEGMENT_MAX_BYTES // (2 * CHANNELS))
+        self._writer = MmapWavWriter(path, SAMPLE_RATE, CHANNELS, max_frames)
+        events_hub.publish("recorder", {"recording": True, "segment": os.path.basename(path)})
+
+    def _close_segment(self):
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        try:
+            writer.close()
+            self.segments += 1
+            self.last_segment = os.path.basename(writer.path)
+            print(f"💾 RX segment {self.last_segment}: {writer.seconds:.1f} s")
+        except Exception as e:
+            print(f"⚠️ Could not finish RX segment {writer.path}: {e}")
+        events_hub.publish("recorder", {"recording": self.running and not self._stop.is_set(),
+                                        "segment": None})
+
+
+rx_recorder = RxRecorder()
+
+
+@app.route("/recorder", methods=["GET"])
+def recorder_status():
+    return jsonify(rx_recorder.status())
+
+@app.route("/recorder/start", methods=["POST"])
+def recorder_start():
+    rx_recorder.start()
+    return jsonify({"status": "OK", **rx_recorder.status()})
+
+@app.route("/recorder/stop", methods=["POST"])
+def recorder_stop():
+    rx_recorder.stop()
+    return jsonify({"status": "OK", **rx_recorder.status()})
+
+
+# ---------------------- RECORDINGS ----------------------
+recordings_catalog = RecordingsCatalog(RECORDINGS_DIR, workers=CATALOG_WORKERS,
+                                       refresh_interval=CATALOG_REFRESH_SEC)
+
+
+def _parse_time_arg(value: str):
+    """Unix seconds, YYYYMMDD, YYYYMMDD_HHMMSS or ISO 8601 -> unix seconds (None if empty)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y%m%d_%H%M%S", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value).timestamp()
+
+
+@app.route("/recordings", methods=["GET"])
+def list_recordings():
+    """
+    Paginated recordings index: ?page=&per_page=&since=&until=&kind=rec|recording|tx
+    &min_duration=&max_duration=&q=&order=started|duration|name|size|peak&desc=1.
+    Served from the SQLite catalog; peak/rms are null until analysed.
+    """
+    args = request.args
+    try:
+        result = recordings_catalog.list(
+            page=int(args.get("page", 1)),
+            per_page=int(args.get("per_page", 50)),
+            since=_parse_time_arg(args.get("since")),
+            until=_parse_time_arg(args.get("until")),
+            kind=args.get("kind"),
+            min_duration=float(args["min_duration"]) if args.get("min_duration") else None,
+            max_duration=float(args["max_duration"]) if args.get("max_duration") else None,
+            q=args.get("q"),
+            order=args.get("order", "started"),
+            descending=args.get("desc", "1") not in ("0", "false"),
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Bad query parameter: {e}"}), 400
+    recordings_catalog.refresh_if_stale()
+    return jsonify({**result, "catalog": recordings_catalog.stats()})
+
+@app.route("/recordings/<name>/info", methods=["GET"])
+def recording_info(name):
+    item = recordings_catalog.get(name)
+    if item is None:
+        return jsonify({"error": f"Unknown recording {name}"}), 404
+    return jsonify(item)
+
+def _recording_path(name: str):
+    """Absolute path of a WAV directly inside RECORDINGS_DIR, or None."""
+    if os.path.basename(name) != name or not name.lower().endswith(".wav"):
+        return None
+    path = os.path.join(RECORDINGS_DIR, name)
+    return path if os.path.isfile(path) else None
+
+@app.route("/recordings/<name>", methods=["GET"])
+def get_recording(name):
+    """
+    Download/stream a recording. Range requests, ETag and Last-Modified are
+    handled by send_file, which hands the open file to the WSGI server
+    (sendfile where supported), so memory stays flat for any file size.
+    ?t=seconds returns a WAV that starts at that time: the original header with
+    patched sizes, followed by the file from the matching byte offset.
+    """
+    path = _recording_path(name)
+    if path is None:
+        return jsonify({"error": f"Unknown recording {name}"}), 404
+    if "t" not in request.args:
+        return send_file(path, mimetype="audio/wav", conditional=True, etag=True,
+                         max_age=RECORDING_MAX_AGE)
+
+    try:
+        t = float(request.args["t"])
+        if not math.isfinite(t):
+            raise ValueError("t must be a finite number of seconds")
+        info = read_wav_info(path)
+        frame = max(0, min(int(t * info["rate"]), info["frames"]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    offset = info["data_offset"] + frame * info["block_align"]
+    remaining = info["data_size"] - frame * info["block_align"]
+
+    f = open(path, "rb")
+    header = bytearray(f.read(info["data_offset"]))
+    struct.pack_into("<I", header, 4, len(header) - 8 + remaining)
+    struct.pack_into("<I", header, info["data_offset"] - 4, remaining)
+    f.seek(offset)
+
+    def generate():
+        with f:
+            yield bytes(header)
+            left = remaining
+            while left > 0:
+                chunk = f.read(min(RECORDING_READ_CHUNK, left))
+                if not chunk:
+                    break
+                left -= len(chunk)
+                yield chunk
+
+    st = os.stat(path)
+    response = Response(generate(), mimetype="audio/wav", direct_passthrough=True)
+    response.content_length = len(header) + remaining
+    response.last_modified = st.st_mtime
+    response.set_etag(f"{st.st_mtime_ns:x}-{st.st_size:x}-{frame:x}")
+    response.cache_control.max_age = RECORDING_MAX_AGE
+    response.headers["X-Start-Seconds"] = f"{frame / info['rate']:.3f}"
+    response.call_on_close(f.close)     # also when the body is never sent (304, client gone)
+    return response.make_conditional(request)
+
+@app.route("/recordings/<name>/peaks", methods=["GET"])
+def recording_peaks(name):
+    """
+    Waveform min/max/rms columns for drawing: ?start=&end= (seconds, default the
+    whole file), ?width= (columns wanted, picks the zoom level) or ?zoom=256|4096|65536.
+    Values are int16 with full scale = "scale". Served from the .peaks sidecar;
+    while that is missing or stale it is built on the catalog workers and the
+    answer is 202 (retry shortly).
+    """
+    path = _recording_path(name)
+    if path is None:
+        return jsonify({"error": f"Unknown recording {name}"}), 404
+    try:
+        start = float(request.args.get("start", 0))
+        end = float(request.args["end"]) if "end" in request.args else None
+        if not math.isfinite(start) or (end is not None and not math.isfinite(end)):
+            raise ValueError("start and end must be finite numbers of seconds")
+        width = int(request.args["width"]) if "width" in request.args else None
+        if width is not None and width < 1:
+            raise ValueError("width must be at least 1")
+        zoom = int(request.args["zoom"]) if "zoom" in request.args else None
+        info = read_wav_info(path)
+        open_samples(path, info)            # rejects layouts the peaks builder cannot read; maps only
+        pyramid = PeakPyramid.load(path)
+        if pyramid is None:
+            recordings_catalog.queue_analysis(name)
+            return jsonify({"name": name, "status": "building"}), 202, {"Retry-After": "1"}
+        if end is None:
+            end = pyramid.frames / pyramid.rate
+        result = pyramid.range(int(start * pyramid.rate), int(end * pyramid.rate), width=width, level=zoom)
+    except (ValueError, OverflowError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"name": name, "duration": round(pyramid.frames / pyramid.rate, 3), **result})
+
+@app.route("/recordings/refresh", methods=["POST"])
+def refresh_recordings():
+    """Rescan RECORDINGS_DIR now instead of waiting for the next stale listing."""
+    return jsonify({**recordings_catalog.refresh(), **recordings_catalog.stats()})
 
 
 def list_audio_devices():
@@ -180,166 +974,537 @@ def list_audio_devices():
         print("⚠️ sounddevice not available, cannot list devices")
 
 
-def _play_wav_to_output(wav_path: str):
-    """Play the given WAV file to the radio device for transmission."""
-    try:
-        print(f"📢 Loading audio file: {wav_path}")
-        
-        # Load WAV file using scipy (like the working example)
-        fs_wav, samples = wavfile.read(wav_path)
-        print(f"   Original: {fs_wav} Hz, shape: {samples.shape}, dtype: {samples.dtype}")
-        
-        # Convert to float32 and normalize
-        if samples.dtype == np.int16:
-            samples = samples.astype(np.float32) / 32768.0
-        elif samples.dtype == np.int32:
-            samples = samples.astype(np.float32) / 2147483648.0
-        else:
-            samples = samples.astype(np.float32)
-        
-        # Take first channel if stereo (convert to mono)
-        if samples.ndim > 1:
-            samples = samples[:, 0]
-            print(f"   Converted stereo to mono")
-        
-        # Resample to RADIO_SAMPLE_RATE if needed
-        if fs_wav != RADIO_SAMPLE_RATE:
-            num_samples = int(len(samples) * RADIO_SAMPLE_RATE / fs_wav)
-            samples = resample(samples, num_samples)
-            print(f"   Resampled from {fs_wav} Hz to {RADIO_SAMPLE_RATE} Hz")
-        
-        # Normalize and boost volume: find peak and scale up if needed
-        peak = np.max(np.abs(samples))
-        if peak > 0:
-            # Normalize to use more of the available range, then apply volume scale
-            # This boosts quiet files while preventing clipping
-            normalization_factor = 0.95 / peak  # Leave 5% headroom
-            samples = samples * normalization_factor * RADIO_VOLUME_SCALE
-            print(f"   Normalized peak: {peak:.4f}, applied volume scale: {RADIO_VOLUME_SCALE}")
-        else:
-            print(f"   Warning: Audio is silent (peak = 0)")
-        
-        # Use sounddevice to play to specific radio device
+def _to_float_mono(samples: np.ndarray) -> np.ndarray:
+    """Convert a slice of WAV samples (any PCM dtype) to float32 mono (first channel)."""
+    if samples.ndim > 1:
+        samples = samples[:, 0]
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    if samples.dtype == np.int32:
+        return samples.astype(np.float32) / 2147483648.0
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128.0) / 128.0
+    return samples.astype(np.float32)
+
+
+def _tx_blocks(samples: np.ndarray, fs_in: int, gain: float):
+    """
+    Yield float32 mono blocks at RADIO_SAMPLE_RATE: read TX_BLOCK-sized slices,
+    apply gain, resample statefully and run them through the look-ahead limiter.
+    Works the same on a memory-mapped file or an in-memory array.
+    """
+    resampler = PolyphaseResampler(fs_in, RADIO_SAMPLE_RATE) if fs_in != RADIO_SAMPLE_RATE else None
+    limiter = LookaheadLimiter(RADIO_SAMPLE_RATE, ceiling=TX_LIMITER_CEILING * RADIO_VOLUME_SCALE)
+    step = max(1, TX_BLOCK * fs_in // RADIO_SAMPLE_RATE)
+    for start in range(0, len(samples), step):
+        x = _to_float_mono(samples[start:start + step])
+        x *= gain
+        if resampler is not None:
+            x = resampler.process(x)
+        out = limiter.process(x)
+        if len(out):
+            yield out
+    tail = resampler.flush() if resampler is not None else np.zeros((0, 1), dtype=np.float32)
+    yield limiter.process(tail, final=True)
+    if limiter.min_gain < 0.99:
+        print(f"   Limiter: max gain reduction {20 * np.log10(max(limiter.min_gain, 1e-6)):.1f} dB")
+
+
+_radio_channels = None
+
+
+def _radio_output_channels() -> int:
+    """Channel count the radio output is driven with (mono TX audio goes to all of them)."""
+    global _radio_channels
+    if _radio_channels is None:
+        _radio_channels = 1
         if SOUNDDEVICE_AVAILABLE:
-            # Get device info to determine output channels
             try:
-                info = sd.query_devices(RADIO_DEVICE_INDEX)
-                out_channels = info['max_output_channels']
-                print(f"   Radio device: {info['name']}, Output channels: {out_channels}")
-                
-                # Ensure samples match output channels
-                if samples.ndim == 1 and out_channels > 1:
-                    # Mono to multi-channel: duplicate the channel
-                    samples = np.column_stack([samples] * out_channels)
-                elif samples.ndim > 1 and samples.shape[1] != out_channels:
-                    if out_channels == 1:
-                        samples = samples[:, 0]
-                    else:
-                        # Use first channel and duplicate
-                        samples = np.column_stack([samples[:, 0]] * out_channels)
-                
-                print(f"   Final audio shape: {samples.shape}, playing to radio device {RADIO_DEVICE_INDEX}...")
-                
-                # Play to radio device (this blocks until playback completes)
-                sd.play(samples, samplerate=RADIO_SAMPLE_RATE, device=RADIO_DEVICE_INDEX)
-                sd.wait()  # Wait until finished
-                print(f"✅ Playback completed successfully")
-            except Exception as sd_err:
-                print(f"⚠️ Error with sounddevice, falling back to soundcard: {sd_err}")
-                # Fallback to soundcard
-                if samples.ndim == 1:
-                    samples = samples.reshape((-1, 1))
-                speaker = sc.default_speaker()
-                print(f"   Using default speaker: {speaker.name}")
-                speaker.play(samples, samplerate=RADIO_SAMPLE_RATE)
-        else:
-            # Fallback to soundcard if sounddevice not available
-            if samples.ndim == 1:
-                samples = samples.reshape((-1, 1))
-            speaker = sc.default_speaker()
-            print(f"   Using default speaker: {speaker.name}")
-            speaker.play(samples, samplerate=RADIO_SAMPLE_RATE)
+                _radio_channels = max(1, sd.query_devices(RADIO_DEVICE_INDEX)['max_output_channels'])
+            except Exception:
+                pass
+    return _radio_channels
+
+
+def _play_samples_to_output(samples: np.ndarray, fs_in: int, gain: float, on_first_block=None,
+                            stop=None, prepared: bool = False, keep: list = None):
+    """
+    Stream samples to the radio device block by block through sd.OutputStream,
+    so audio starts within one block however long the message is. gain is applied
+    before the limiter, which keeps peaks under the ceiling.
+    on_first_block() is called once the first block has been handed to the device;
+    playback ends early as soon as stop() returns True.
+
+    prepared=True means samples is already a finished (frames, channels) buffer at
+    RADIO_SAMPLE_RATE (from tx_cache) and is written as is. If keep is a list, the
+    blocks actually sent to the device are appended to it for caching.
+    """
+    def make_blocks():
+        if prepared:
+            return (samples[i:i + TX_BLOCK] for i in range(0, len(samples), TX_BLOCK))
+        return _tx_blocks(samples, fs_in, gain)
+
+    blocks = make_blocks()
+
+    def started():
+        nonlocal on_first_block
+        if on_first_block:
+            on_first_block()
+            on_first_block = None
+
+    if SOUNDDEVICE_AVAILABLE:
+        try:
+            info = sd.query_devices(RADIO_DEVICE_INDEX)
+            out_channels = max(1, info['max_output_channels'])
+            print(f"   Radio device: {info['name']}, Output channels: {out_channels}")
+            out_buf = np.zeros((4 * TX_BLOCK, out_channels), dtype=np.float32)
+            with sd.OutputStream(samplerate=RADIO_SAMPLE_RATE, device=RADIO_DEVICE_INDEX,
+                                 channels=out_channels, dtype='float32', blocksize=TX_BLOCK) as stream:
+                for block in blocks:
+                    if stop and stop():
+                        print("⏭️ Playback stopped early")
+                        break
+                    if prepared and block.shape[1] == out_channels:
+                        stream.write(block)
+                        telemetry.tx.add(block[:, :1])
+                        started()
+                        continue
+                    for start in range(0, len(block), len(out_buf)):
+                        part = block[start:start + len(out_buf)]
+                        n = len(part)
+                        out_buf[:n] = part[:, :1]   # mono -> all output channels
+                        stream.write(out_buf[:n])
+                        telemetry.tx.add(part[:, :1])
+                        if keep is not None:
+                            keep.append(out_buf[:n].copy())
+                        started()
             print(f"✅ Playback completed successfully")
-            
+            return
+        except Exception as sd_err:
+            print(f"⚠️ Error with sounddevice, falling back to soundcard: {sd_err}")
+            blocks = make_blocks()
+            if keep is not None:
+                keep.clear()
+
+    # Fallback to soundcard if sounddevice is not available or failed
+    speaker = sc.default_speaker()
+    print(f"   Using default speaker: {speaker.name}")
+    with speaker.player(samplerate=RADIO_SAMPLE_RATE, channels=1, blocksize=TX_BLOCK) as player:
+        for block in blocks:
+            if stop and stop():
+                print("⏭️ Playback stopped early")
+                break
+            block = block[:, :1]
+            player.play(block)
+            telemetry.tx.add(block)
+            if keep is not None and not prepared:
+                keep.append(block.copy())
+            started()
+    print(f"✅ Playback completed successfully")
+
+
+class TxMessage:
+    """A decoded upload held in memory, ready to transmit, with per-stage timings."""
+
+    def __init__(self, samples: np.ndarray, rate: int, name: str = "", prepared: bool = False):
+        self.samples = samples              # float32 mono, or a finished output buffer if prepared
+        self.rate = rate
+        self.name = name
+        self.prepared = prepared
+        self.digest = None                  # content hash of the upload, for tx_cache
+        self.duration = len(samples) / rate if rate else 0.0
+        if prepared:
+            self.peak = TX_LIMITER_CEILING * RADIO_VOLUME_SCALE
+        else:
+            self.peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+        self.created = time.monotonic()
+        self.timings = {}                   # stage -> seconds
+        self.id = None                      # assigned by TxScheduler.submit()
+        self.priority = 0
+        self.state = "new"                  # queued / playing / done / cancelled / failed
+        self.cancelled = threading.Event()
+
+    def info(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "priority": self.priority,
+            "state": self.state,
+            "duration_sec": round(self.duration, 3),
+            "waiting_sec": round(self.timings.get("queue_wait", time.monotonic() - self.created), 3),
+        }
+
+    def gain(self):
+        """Peak-normalising gain (what the old whole-file normalisation applied)."""
+        if self.prepared:
+            return 1.0
+        if self.peak <= 0:
+            return RADIO_VOLUME_SCALE
+        return TX_LIMITER_CEILING / self.peak * RADIO_VOLUME_SCALE
+
+    def log_timings(self):
+        stages = " | ".join(f"{stage} {secs * 1000:.0f} ms" for stage, secs in self.timings.items())
+        print(f"⏱️ TX timings ({self.name}): {stages}")
+
+
+def decode_upload(data: bytes, name: str = "") -> TxMessage:
+    """Decode an uploaded recording (WebM/Opus, WAV, ...) exactly once, straight from memory."""
+    t0 = time.perf_counter()
+    sound = AudioSegment.from_file(io.BytesIO(data))
+    t1 = time.perf_counter()
+    width = sound.sample_width
+    raw = np.frombuffer(sound.raw_data, dtype={1: np.int8, 2: np.int16, 4: np.int32}[width])
+    samples = raw.reshape(-1, sound.channels)[:, 0].astype(np.float32)
+    samples *= 1.0 / (1 << (8 * width - 1))
+    msg = TxMessage(samples, sound.frame_rate, name)
+    msg.timings["decode"] = t1 - t0
+    msg.timings["analyse"] = time.perf_counter() - t1
+    return msg
+
+
+def _save_tx_message(msg: TxMessage, path: str):
+    """Optional side output: persist a decoded message as 16-bit WAV."""
+    try:
+        pcm = np.clip(msg.samples * 32767.0, -32768, 32767).astype(np.int16)
+        wavfile.write(path, msg.rate, pcm)
+        print(f"💾 Saved TX message to {path}")
     except Exception as e:
-        print(f"❌ Error during playback: {e}")
-        import traceback
-        traceback.print_exc()
-        raise
+        print(f"⚠️ Could not save TX message: {e}")
 
 
-def _play_and_cleanup(msg_path: str):
-    """Background thread function to play audio with PTT control and clean up."""
-    try:
-        with playback_lock:
-            if not os.path.exists(msg_path):
-                print(f"⚠️ MSG.wav not found at {msg_path}, skipping playback")
+class TxCache:
+    """
+    Prepared TX audio, keyed by the upload's content hash plus everything the
+    preparation depends on (output rate, volume scale, limiter ceiling, output
+    channel count). Values are the exact float32 blocks that went to the radio,
+    so a repeated CQ or exchange recording skips decoding, resampling and
+    limiting entirely. RAM use is capped at max_bytes with LRU eviction; with a
+    disk_dir, evicted buffers are written as .npy files and reloaded
+    memory-mapped on the next hit.
+    """
+
+    def __init__(self, max_bytes: int = TX_CACHE_MAX_BYTES, disk_dir: str = None,
+                 disk_max_bytes: int = TX_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()     # key -> ndarray, least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    @staticmethod
+    def key(digest: str, channels: int) -> str:
+        return f"{digest}_{RADIO_SAMPLE_RATE}_{RADIO_VOLUME_SCALE:g}_{TX_LIMITER_CEILING:g}_{channels}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + ".npy")
+
+    def get(self, key: str):
+        with self._lock:
+            buf = self._entries.get(key)
+            if buf is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return buf
+        if self.disk_dir:
+            try:
+                buf = np.load(self._path(key), mmap_mode="r")
+                os.utime(self._path(key))
+                with self._lock:
+                    self.disk_hits += 1
+                return buf
+            except (OSError, ValueError):
+                pass
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def fits(self, frames: int, channels: int) -> bool:
+        return frames * channels * 4 <= self.max_bytes
+
+    def put(self, key: str, buf: np.ndarray):
+        evicted = []
+        with self._lock:
+            if key in self._entries or buf.nbytes > self.max_bytes:
                 return
-            
-            # Get audio duration for logging
+            self._entries[key] = buf
+            self.bytes += buf.nbytes
+            while self.bytes > self.max_bytes:
+                old_key, old = self._entries.popitem(last=False)
+                self.bytes -= old.nbytes
+                self.evictions += 1
+                evicted.append((old_key, old))
+        if self.disk_dir:
+            for old_key, old in evicted:
+                self._spill(old_key, old)
+
+    def _spill(self, key: str, buf: np.ndarray):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        try:
+            np.save(path + ".tmp.npy", buf)
+            os.replace(path + ".tmp.npy", path)
+        except OSError as e:
+            print(f"⚠️ Could not spill TX cache entry: {e}")
+            return
+        # Keep the disk tier bounded too, dropping the least recently used files
+        files = [os.path.join(self.disk_dir, f) for f in os.listdir(self.disk_dir) if f.endswith(".npy")]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(f) for f in files)
+        while files and total > self.disk_max_bytes:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_dir": self.disk_dir,
+            }
+
+
+tx_cache = TxCache(disk_dir=TX_CACHE_DIR)
+
+
+class TxScheduler:
+    """
+    Transmit queue. Uploads become TxMessages with an id and a priority (higher
+    goes first, FIFO within a priority). One worker thread owns PTT and the
+    radio audio output. Messages that are queued while one is playing (or, with
+    a non-zero TX_CHAIN_GAP, arrive within that long of it ending) go out in the
+    same PTT session instead of cycling PTT for each one. Queued messages can be cancelled;
+    the playing one can be skipped.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []                   # (-priority, seq, msg)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._thread = None
+        self.current = None
+        self.history = deque(maxlen=100)  # finished messages, newest last
+        self.sessions = 0
+        self.sent = 0
+        self.cancelled = 0
+
+    def submit(self, msg: TxMessage, priority: int = 0) -> TxMessage:
+        with self._cond:
+            msg.id = next(self._ids)
+            msg.priority = priority
+            msg.state = "queued"
+            heapq.heappush(self._heap, (-priority, next(self._seq), msg))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tx-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        self._publish()
+        return msg
+
+    def cancel(self, msg_id: int) -> str:
+        """Cancel a queued message or skip the playing one. Returns its new state, or None."""
+        with self._cond:
+            if self.current is not None and self.current.id == msg_id:
+                self.current.cancelled.set()
+                return "skipping"
+            for i, (_, _, msg) in enumerate(self._heap):
+                if msg.id == msg_id:
+                    self._heap.pop(i)
+                    heapq.heapify(self._heap)
+                    msg.state = "cancelled"
+                    self.cancelled += 1
+                    self.history.append(msg.info())
+                    break
+            else:
+                return None
+        self._publish()
+        return "cancelled"
+
+    def skip(self):
+        with self._cond:
+            current = self.current
+        if current is None:
+            return None
+        current.cancelled.set()
+        return current.id
+
+    def queued(self):
+        with self._cond:
+            return [msg.info() for _, _, msg in sorted(self._heap)]
+
+    def position(self, msg_id: int):
+        """0 if the message is playing, 1 if it plays next, and so on; None if it is not queued."""
+        with self._cond:
+            if self.current is not None and self.current.id == msg_id:
+                return 0
+            for i, (_, _, msg) in enumerate(sorted(self._heap)):
+                if msg.id == msg_id:
+                    return i + 1
+        return None
+
+    def status(self):
+        with self._cond:
+            depth = len(self._heap)
+            current = self.current.info() if self.current else None
+            oldest = min((m.created for _, _, m in self._heap), default=None)
+            waits = [h["waiting_sec"] for h in self.history if h["state"] == "done"]
+            now = time.monotonic()
+            per_minute = sum(1 for h in self.history if h["state"] == "done" and now - h["finished"] < 60)
+        return {
+            "pending": depth,
+            "transmitting": current is not None,
+            "current": current,
+            "oldest_wait_sec": round(now - oldest, 3) if oldest else 0.0,
+            "avg_wait_sec": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "max_wait_sec": round(max(waits), 3) if waits else 0.0,
+            "messages_per_minute": per_minute,
+            "sent": self.sent,
+            "cancelled": self.cancelled,
+            "ptt_sessions": self.sessions,
+            "ptt": ptt_timer.status(),
+        }
+
+    def _publish(self):
+        with self._cond:
+            event = {
+                "pending": len(self._heap),
+                "transmitting": self.current is not None,
+                "current": self.current.id if self.current else None,
+            }
+        events_hub.publish("tx_queue", event)
+
+    def _next(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._heap, timeout):
+                return None
+            msg = heapq.heappop(self._heap)[2]
+            msg.state = "playing"
+            msg.timings["queue_wait"] = time.monotonic() - msg.created
+            self.current = msg
+        self._publish()
+        return msg
+
+    def _finish(self, msg: TxMessage, state: str):
+        with self._cond:
+            msg.state = state
+            if state == "done":
+                self.sent += 1
+            elif state == "cancelled":
+                self.cancelled += 1
+            info = msg.info()
+            info["finished"] = time.monotonic()
+            self.history.append(info)
+            self.current = None
+        self._publish()
+
+    def _run(self):
+        while True:
+            msg = self._next()
+            self._session(msg)
+
+    def _session(self, msg: TxMessage):
+        """Key up once and play messages back to back until the queue stays empty."""
+        radio_ok = bool(radio_ser and radio_ser.is_open)
+        session = None
+        keyed = time.monotonic()
+        if radio_ok:
             try:
-                sound = AudioSegment.from_file(msg_path)
-                duration_ms = len(sound)
-                duration_sec = duration_ms / 1000.0
-                print(f"📻 Audio duration: {duration_sec:.2f} seconds")
-            except Exception as e:
-                print(f"⚠️ Could not determine audio duration: {e}")
-                duration_sec = 0
-            
-            # Turn PTT ON before playback
-            if radio_ser and radio_ser.is_open:
-                try:
-                    with serial_lock:
-                        radio_ser.write(build_ptt_on_command())
-                        time.sleep(0.1)  # Small delay to ensure command is processed
+                # Keyed through ptt_timer so its watchdog unkeys us even if playback hangs
+                session = ptt_timer.key(owner="tx_queue", on_abort=self.skip)
+                if session is None:
+                    print("⚠️ Warning: Could not turn PTT ON (radio did not ack or PTT is held)")
+                else:
                     print("📻 PTT ON - Starting transmission...")
-                except Exception as ptt_err:
-                    print(f"⚠️ Warning: Could not turn PTT ON: {ptt_err}")
-            else:
-                print("⚠️ Warning: Radio not connected, skipping PTT control")
-            
-            # Play the audio (this blocks until playback completes)
-            _play_wav_to_output(msg_path)
-            
-            # Turn PTT OFF after playback
-            if radio_ser and radio_ser.is_open:
+            except Exception as ptt_err:
+                print(f"⚠️ Warning: Could not turn PTT ON: {ptt_err}")
+        else:
+            print("⚠️ Warning: Radio not connected, skipping PTT control")
+        ptt_time = time.monotonic() - keyed
+        self.sessions += 1
+        try:
+            while msg is not None:
+                msg.timings["ptt_on"] = ptt_time
+                ptt_time = 0.0          # chained messages do not wait for PTT
+                self._play(msg)
+                if session is not None and not ptt_timer.held(session):
+                    break               # PTT off button or time-out: end the session
+                msg = self._next(timeout=TX_CHAIN_GAP)
+                if msg is not None and session is not None and ptt_timer.remaining_limit() < msg.duration:
+                    # Would run into the transmit time-out: drop PTT briefly and key up again
+                    ptt_timer.release(session)
+                    keyed = time.monotonic()
+                    session = ptt_timer.key(owner="tx_queue", on_abort=self.skip)
+                    ptt_time = time.monotonic() - keyed
+        finally:
+            # Ensure PTT is turned OFF even if there's an error
+            if session is not None:
                 try:
-                    with serial_lock:
-                        radio_ser.write(build_ptt_off_command())
-                        time.sleep(0.1)  # Small delay to ensure command is processed
+                    ptt_timer.release(session)
                     print("📻 PTT OFF - Transmission complete")
                 except Exception as ptt_err:
                     print(f"⚠️ Warning: Could not turn PTT OFF: {ptt_err}")
-            
-            # Clean up MSG.wav after playback
-            if os.path.exists(msg_path):
-                os.remove(msg_path)
-                print("🗑️ MSG.wav deleted after playback.")
-    except Exception as e:
-        print(f"❌ Error in background playback thread: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        # Ensure PTT is turned OFF even if there's an error
-        if radio_ser and radio_ser.is_open:
-            try:
-                with serial_lock:
-                    radio_ser.write(build_ptt_off_command())
-                    print("📻 PTT OFF (error recovery)")
-            except Exception:
-                pass
-        
-        # Best-effort cleanup
+
+    def _play(self, msg: TxMessage):
+        if msg.prepared:
+            print(f"📻 Message #{msg.id}: {msg.duration:.2f} seconds, prepared (cached)")
+        else:
+            print(f"📻 Message #{msg.id}: {msg.duration:.2f} seconds, peak {msg.peak:.4f}")
+        started = time.monotonic()
+        keep = None
+        if msg.digest and not msg.prepared and tx_cache.fits(
+                int(msg.duration * RADIO_SAMPLE_RATE) + TX_BLOCK, _radio_output_channels()):
+            keep = []
+
+        def on_air():
+            msg.timings["first_block"] = time.monotonic() - started
+            msg.timings["upload_to_air"] = time.monotonic() - msg.created + msg.timings["receive"]
+
         try:
-            if os.path.exists(msg_path):
-                os.remove(msg_path)
-        except Exception:
-            pass
+            _play_samples_to_output(msg.samples, msg.rate, msg.gain(), on_first_block=on_air,
+                                    stop=msg.cancelled.is_set, prepared=msg.prepared, keep=keep)
+            msg.timings["playback"] = time.monotonic() - started
+            if keep and not msg.cancelled.is_set():
+                buf = np.concatenate(keep)
+                tx_cache.put(TxCache.key(msg.digest, buf.shape[1]), buf)
+            self._finish(msg, "cancelled" if msg.cancelled.is_set() else "done")
+            msg.log_timings()
+        except Exception as e:
+            print(f"❌ Error playing message #{msg.id}: {e}")
+            import traceback
+            traceback.print_exc()
+            self._finish(msg, "failed")
+
+
+tx_scheduler = TxScheduler()
 
 
 @app.route("/upload_recording", methods=["POST"])
 def upload_recording():
     try:
+        t0 = time.perf_counter()
         if "audio" not in request.files:
             return jsonify({"status": "error", "error": "No audio file"}), 400
 
@@ -347,100 +1512,378 @@ def upload_recording():
         if audio_file.filename == '':
             return jsonify({"status": "error", "error": "Empty file"}), 400
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        temp_path = os.path.join(UPLOADS_DIR, f"temp_{timestamp}.webm")
-        msg_path = os.path.join(RECORDINGS_DIR, "MSG.wav")
-
         print(f"📥 Received audio upload: {audio_file.filename}, size: {request.content_length} bytes")
-        audio_file.save(temp_path)
-        print(f"   Saved temp file: {temp_path}")
-
-        # Remove old MSG if present (before acquiring lock to avoid blocking)
-        if os.path.exists(msg_path):
-            print(f"   Removing old MSG.wav")
+        data = audio_file.read()
+        received = time.perf_counter() - t0
+
+        # Repeat of something already sent: play the prepared buffer directly
+        t1 = time.perf_counter()
+        digest = TxCache.digest(data)
+        cached = tx_cache.get(TxCache.key(digest, _radio_output_channels()))
+        if cached is not None:
+            msg = TxMessage(cached, RADIO_SAMPLE_RATE, audio_file.filename, prepared=True)
+            msg.timings["cache"] = time.perf_counter() - t1
+            print(f"✔️ Cache hit: {msg.duration:.2f} s prepared audio")
+        else:
+            # Decode once, in memory
             try:
-                os.remove(msg_path)
-            except Exception as e:
-                print(f"   Warning: Could not remove old MSG.wav: {e}")
-
-        # Convert WebM to WAV
-        print(f"   Converting WebM to WAV...")
+                msg = decode_upload(data, audio_file.filename)
+            except Exception as conv_err:
+                print(f"❌ Conversion failed: {conv_err}")
+                return jsonify({"status": "error", "error": f"Conversion failed: {str(conv_err)}"}), 500
+            print(f"✔️ Decoded {msg.duration:.2f} s at {msg.rate} Hz in {msg.timings['decode'] * 1000:.0f} ms")
+        msg.digest = digest
+        msg.timings = {"receive": received, **msg.timings}
+
+        if TX_SAVE_UPLOADS and not msg.prepared:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(RECORDINGS_DIR, f"tx_{timestamp}.wav")
+            threading.Thread(target=_save_tx_message, args=(msg, path), daemon=True).start()
+
+        # Queue for transmission - playback happens on the scheduler thread
         try:
-            sound = AudioSegment.from_file(temp_path)
-            sound.export(msg_path, format="wav")
-            print(f"✔️ Saved recording to {msg_path}")
-        except Exception as conv_err:
-            print(f"❌ Conversion failed: {conv_err}")
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return jsonify({"status": "error", "error": f"Conversion failed: {str(conv_err)}"}), 500
-
-        # Clean up temp file immediately
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
-        # Start playback in background thread (non-blocking)
-        print(f"   Starting playback in background thread...")
-        playback_thread = threading.Thread(target=_play_and_cleanup, args=(msg_path,), daemon=True)
-        playback_thread.start()
-
-        # Return immediately - playback happens in background
-        return jsonify({"status": "ok", "message": "Audio received and queued for playback"})
+            priority = int(request.form.get("priority", 0))
+        except ValueError:
+            priority = 0
+        tx_scheduler.submit(msg, priority)
+        print(f"   Queued as message #{msg.id} (priority {priority})")
+
+        # Return immediately
+        return jsonify({
+            "status": "ok",
+            "message": "Audio received and queued for playback",
+            "id": msg.id,
+            "priority": priority,
+            "queue_position": tx_scheduler.position(msg.id),
+            "duration_sec": round(msg.duration, 3),
+            "cached": msg.prepared,
+        })
 
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Error in upload_recording: {error_msg}")
         import traceback
         traceback.print_exc()
-        
-        # Best-effort cleanup
+        return jsonify({"status": "error", "error": error_msg}), 500
+
+@app.route("/tx/queue", methods=["GET"])
+def tx_queue_status():
+    """Transmit queue contents and throughput/wait statistics."""
+    return jsonify({**tx_scheduler.status(), "queued": tx_scheduler.queued()})
+
+@app.route("/tx/queue/<int:msg_id>", methods=["DELETE"])
+def tx_cancel(msg_id):
+    state = tx_scheduler.cancel(msg_id)
+    if state is None:
+        return jsonify({"error": f"No queued or playing message {msg_id}"}), 404
+    return jsonify({"status": "OK", "id": msg_id, "state": state})
+
+@app.route("/tx/cache", methods=["GET"])
+def tx_cache_status():
+    return jsonify(tx_cache.stats())
+
+@app.route("/tx/cache", methods=["DELETE"])
+def tx_cache_clear():
+    tx_cache.clear()
+    return jsonify({"status": "OK", **tx_cache.stats()})
+
+@app.route("/tx/skip", methods=["POST"])
+def tx_skip():
+    msg_id = tx_scheduler.skip()
+    if msg_id is None:
+        return jsonify({"error": "Nothing is transmitting"}), 404
+    return jsonify({"status": "OK", "skipped": msg_id})
+
+# ---------------------- CI-V TRANSPORT ----------------------
+CIV_ACK = 0xFB
+CIV_NG = 0xFA
+CIV_TIMEOUT = 0.5   # seconds to wait for the radio's reply (IC-7300 answers in ~15 ms)
+
+
+class BusLock:
+    """
+    Reentrant lock for the CI-V bus, shared by threads and (under the async
+    server) coroutines. Threads use it like threading.RLock; a coroutine holds
+    it as its task through aacquire(), waiting on a future that release()
+    resolves, so neither side polls for the other.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._owner = None          # thread ident, or the asyncio task holding it
+        self._depth = 0
+        self._async_waiters = []    # (loop, future) of coroutines waiting for release()
+
+    def acquire(self, blocking: bool = True) -> bool:
+        return self._acquire(threading.get_ident(), blocking)
+
+    async def aacquire(self):
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._acquire(task, False):
+                    return
+                fut = loop.create_future()
+                self._async_waiters.append((loop, fut))
+            await fut
+
+    def release(self):
+        with self._cond:
+            self._depth -= 1
+            if self._depth:
+                return
+            self._owner = None
+            self._cond.notify()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, fut in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_settle_future, fut)
+
+    def _acquire(self, owner, blocking):
+        with self._cond:
+            while self._owner not in (None, owner):
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self._owner = owner
+            self._depth += 1
+            return True
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CivTransport:
+    """
+    Owns radio_ser. A single reader thread splits incoming bytes into CI-V frames
+    and resolves pending request futures by matching the command byte, so callers
+    wait for their actual reply instead of sleeping a fixed delay.
+    Frames nobody asked for (transceive broadcasts) go to subscribed listeners.
+    Under the async server the event loop watches the port instead where it can
+    (attach()), and coroutines use aquery()/acommand().
+    """
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.lock = BusLock()                # one transaction on the bus at a time
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []                   # [(expect, future)], oldest first
+        self._listeners = []
+        self.parser = CivFrameParser()
+        self._running = False
+        self._thread = None
+        self._loop = None
+        self._fd = None                      # watched by the loop (add_reader) while attached
+        self._port_timeout = None
+
+    def start(self):
+        if not self.ser or self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, name="civ-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def subscribe(self, callback):
+        """Register callback(frame) for unsolicited frames."""
+        self._listeners.append(callback)
+
+    def send(self, frame: bytes):
+        """Write a frame without waiting for any reply."""
+        if not self.ser:
+            return
+        with self._write_lock:
+            self.ser.write(frame)
+
+    def query(self, frame: bytes, timeout: float = CIV_TIMEOUT):
+        """Send a read command; return the reply frame, or None on NG/timeout."""
+        reply = self._transact(frame, bytes(frame[4:-1]), timeout)
+        if reply is None or reply[4] == CIV_NG:
+            return None
+        return reply
+
+    def command(self, frame: bytes, timeout: float = CIV_TIMEOUT):
+        """Send a set command; return True on OK, False on NG, None on timeout."""
+        reply = self._transact(frame, None, timeout)
+        if reply is None:
+            return None
+        return reply[4] == CIV_ACK
+
+    def _transact(self, frame, expect, timeout):
+        if not self.ser:
+            return None
+        fut = Future()
+        entry = (expect, fut)
+        with self.lock:
+            with self._pending_lock:
+                self._pending.append(entry)
+            self.send(frame)
+            try:
+                return fut.result(timeout=timeout)
+            except FutureTimeout:
+                return None
+            finally:
+                with self._pending_lock:
+                    if entry in self._pending:
+                        self._pending.remove(entry)
+
+    async def aquery(self, frame: bytes, timeout: float = CIV_TIMEOUT):
+        """query() for coroutines on the attached loop."""
+        reply = await self._atransact(frame, bytes(frame[4:-1]), timeout)
+        if reply is None or reply[4] == CIV_NG:
+            return None
+        return reply
+
+    async def acommand(self, frame: bytes, timeout: float = CIV_TIMEOUT):
+        """command() for coroutines on the attached loop."""
+        reply = await self._atransact(frame, None, timeout)
+        if reply is None:
+            return None
+        return reply[4] == CIV_ACK
+
+    @contextlib.asynccontextmanager
+    async def ahold(self):
+        """`with civ.lock` for coroutines: keeps the bus across several aquery()/acommand() calls."""
+        await self.lock.aacquire()
         try:
-            if 'msg_path' in locals() and os.path.exists(msg_path):
-                os.remove(msg_path)
-        except Exception:
-            pass
+            yield
+        finally:
+            self.lock.release()
+
+    async def _atransact(self, frame, expect, timeout):
+        if not self.ser or self._loop is None:
+            return None
+        fut = Future()
+        entry = (expect, fut)
+        async with self.ahold():
+            with self._pending_lock:
+                self._pending.append(entry)
+            self.send(frame)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(fut), timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                with self._pending_lock:
+                    if entry in self._pending:
+                        self._pending.remove(entry)
+
+    def attach(self, loop):
+        """
+        Read the port from an asyncio loop instead of the reader thread, where
+        the loop can watch the port handle (add_reader). Elsewhere (Windows COM
+        ports, the Proactor loop) the reader thread stays: it blocks in read()
+        and resolves the coroutines' futures thread-safely, so nothing polls.
+        Threaded callers keep working either way.
+        """
+        if not self.ser or self._loop is not None:
+            return
+        self._loop = loop
         try:
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.remove(temp_path)
-        except Exception:
-            pass
-        
-        return jsonify({"status": "error", "error": error_msg}), 500
+            fd = self.ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            return                            # Windows ports have no file descriptor
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()               # returns within the port's read timeout
+            self._thread = None
+        self._port_timeout = self.ser.timeout
+        self.ser.timeout = 0
+        try:
+            loop.add_reader(fd, self._on_readable)
+            self._fd = fd
+        except (NotImplementedError, OSError, ValueError):
+            self._unwatch()                   # the Proactor loop cannot watch handles
+
+    def detach(self):
+        """Hand the port back to the reader thread (async server shutdown)."""
+        loop, self._loop = self._loop, None
+        if loop is not None and self._fd is not None:
+            loop.remove_reader(self._fd)
+            self._unwatch()
+
+    def _unwatch(self):
+        self._fd = None
+        self.ser.timeout = self._port_timeout
+        self.start()
+
+    def _on_readable(self):
+        try:
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+        except Exception as e:
+            print(f"❌ CI-V reader error: {e}")
+            self._loop.remove_reader(self._fd)
+            self._unwatch()                   # the reader thread retries the port
+            return
+        self._feed(chunk)
 
-# ---------------------- CI-V HELPERS ----------------------
-def extract_all_frames(buf: bytes):
-    frames = []
-    i = 0
-    while i < len(buf) - 4:
-        if buf[i:i+2] == b'\xFE\xFE':
+    def _reader(self):
+        while self._running:
             try:
-                end = buf.index(b'\xFD', i+4)
-                frames.append(buf[i:end+1])
-                i = end + 1
-            except ValueError:
-                break
-        else:
-            i += 1
-    return frames
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                print(f"❌ CI-V reader error: {e}")
+                time.sleep(0.5)
+                continue
+            self._feed(chunk)
+
+    def _feed(self, chunk: bytes):
+        if not chunk:
+            return
+        for frame in self.parser.feed(chunk):
+            self._dispatch(frame)
+
+    def _dispatch(self, frame: bytes):
+        # Ignore our own commands echoed back on the bus and runt frames
+        if len(frame) < 6 or frame[3] == CI_V_FROM:
+            return
+        body = frame[4:-1]
+        match = None
+        if frame[2] == CI_V_FROM:
+            with self._pending_lock:
+                for entry in self._pending:
+                    expect = entry[0]
+                    if body[0] == CIV_NG or (
+                        body[0] == CIV_ACK if expect is None else body[:len(expect)] == expect
+                    ):
+                        match = entry
+                        self._pending.remove(entry)
+                        break
+        if match:
+            match[1].set_result(frame)
+            return
+        for callback in self._listeners:
+            try:
+                callback(frame)
+            except Exception as e:
+                print(f"⚠️ CI-V listener error: {e}")
+
+
+civ = CivTransport(radio_ser)
+civ.start()
 
 # ---------------------- RADIO COMMANDS ----------------------
-def freq_to_civ_bytes(freq_hz: int):
-    s = str(freq_hz).zfill(10)
-    pairs = [s[i:i+2] for i in range(0, 10, 2)]
-    le_pairs = pairs[::-1]
-    return [(int(p[0]) << 4) | int(p[1]) for p in le_pairs]
+# Frames come from the civ_codec command table; these helpers keep the old names.
+codec = CivCodec(CI_V_TO, CI_V_FROM)
 
 def build_set_freq_command(freq_hz: int):
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x05] + freq_to_civ_bytes(freq_hz) + [0xFD])
+    return codec.encode("set_frequency", freq_hz)
 
 def build_read_freq_command():
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x03, 0xFD])
+    return codec.encode("read_frequency")
 
 def decode_civ_freq(frame: bytes):
-    if len(frame) < 11 or frame[4] != 0x03: return None
-    digits = ''.join(f"{(b>>4)&0xF}{b&0xF}" for b in reversed(frame[5:10]))
-    return int(digits)
+    # 0x03 = reply to a read, 0x00 = transceive broadcast
+    msg = civ_decode(frame)
+    return msg.hz if isinstance(msg, Frequency) else None
 
 # Mode names (without data variants — we build them dynamically)
 MODE_NAMES = {
@@ -449,6 +1892,9 @@ MODE_NAMES = {
 }
 MODE_BYTES = {v: k for k, v in MODE_NAMES.items()}
 
+FREQ_MIN_HZ = 30_000         # IC-7300 tuning range
+FREQ_MAX_HZ = 74_800_000
+
 BAND_TO_FREQ = {
     "160": 1900000, "80": 3750000, "40": 7150000, "30": 10120000,
     "20": 14230000, "17": 18130000, "15": 21300000,
@@ -457,22 +1903,26 @@ BAND_TO_FREQ = {
 
 # Base mode commands
 def build_set_mode_command(mode: int, filt: int = 1):
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x06, mode, filt, 0xFD])
+    return codec.encode("set_mode", (mode, filt))
 
 def build_read_mode_command():
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x04, 0xFD])
+    return codec.encode("read_mode")
+
+def decode_mode(frame: bytes):
+    """(mode byte, filter) from a 04 reply or 01 broadcast, or None."""
+    msg = civ_decode(frame)
+    return (msg.mode, msg.filter) if isinstance(msg, Mode) else None
 
 # Data mode commands (0x1A 06)
 def build_set_data_mode(val: int):
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x1A, 0x06, val, 0xFD])
+    return codec.encode("set_data_mode", val)
 
 def build_read_data_mode():
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x1A, 0x06, 0xFD])
+    return codec.encode("read_data_mode")
 
 def decode_data_mode(frame: bytes):
-    if len(frame) >= 8 and frame[4] == 0x1A and frame[5] == 0x06:
-        return frame[6]  # 0x00 = off, 0x01–0x03 = D1–D3
-    return None
+    msg = civ_decode(frame)
+    return msg.value if isinstance(msg, DataMode) else None  # 0x00 = off, 0x01–0x03 = D1–D3
 
 
 def read_mode_and_data_state():
@@ -482,24 +1932,34 @@ def read_mode_and_data_state():
     """
     if not radio_ser:
         return None
-    radio_ser.reset_input_buffer()
-    radio_ser.write(build_read_mode_command())
-    time.sleep(0.1)
-    radio_ser.write(build_read_data_mode())
-    time.sleep(0.25)
-    resp = radio_ser.read(120)
-    frames = extract_all_frames(resp)
-
-    mode_frame = next((f for f in frames if len(f) >= 8 and f[4] == 0x04), None)
-    data_frame = next((f for f in frames if len(f) >= 8 and f[4] == 0x1A and f[5] == 0x06), None)
-
-    if not mode_frame:
+    return _mode_from_frames(civ.query(build_read_mode_command()), civ.query(build_read_data_mode()))
+
+
+async def aread_mode_and_data_state():
+    """read_mode_and_data_state() for coroutines on the async server's loop."""
+    if not radio_ser:
         return None
+    mode_frame = await civ.aquery(build_read_mode_command())
+    return _mode_from_frames(mode_frame, await civ.aquery(build_read_data_mode()))
+
+
+def _mode_from_frames(mode_frame, data_frame):
+    mode = decode_mode(mode_frame)
+    if not mode or mode[1] is None:
+        return None
+
+    mode_byte, filt = mode
+    data_val = decode_data_mode(data_frame) if data_frame else None
+    # No data-mode reply: leave the cached value (and its age) alone rather than caching a guessed 0
+    radio_state.update(mode_byte=mode_byte, filter=filt, data_mode=data_val)
+    if data_val is None:
+        cached = radio_state.get("data_mode", max_age=float("inf"))
+        data_val = cached[0] if cached else 0
+    return _mode_state(mode_byte, filt, data_val)
 
-    mode_byte, filt = mode_frame[5], mode_frame[6]
-    base_name = MODE_NAMES.get(mode_byte, "Unknown")
-    data_val = decode_data_mode(data_frame) if data_frame else 0
 
+def _mode_state(mode_byte: int, filt: int, data_val: int):
+    base_name = MODE_NAMES.get(mode_byte, "Unknown")
     mode_name = f"{base_name}-D{data_val}" if data_val else base_name
     filt_for_display = data_val if data_val else filt
 
@@ -513,25 +1973,1059 @@ def read_mode_and_data_state():
 
 # PTT
 def build_ptt_on_command():
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x1C, 0x00, 0x01, 0xFD])
+    return codec.encode("set_ptt", 0x01)
 def build_ptt_off_command():
-    return bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x1C, 0x00, 0x00, 0xFD])
+    return codec.encode("set_ptt", 0x00)
+def build_read_ptt_command():
+    return codec.encode("read_ptt")
+
+def set_ptt(on: bool):
+    """Key/unkey the transmitter and publish the change. Returns the radio's ack."""
+    ok = civ.command(build_ptt_on_command() if on else build_ptt_off_command())
+    if ok:
+        _ptt_changed(on)
+    return ok
+
+async def aset_ptt(on: bool):
+    """set_ptt() for coroutines on the async server's loop."""
+    ok = await civ.acommand(build_ptt_on_command() if on else build_ptt_off_command())
+    if ok:
+        _ptt_changed(on)
+    return ok
+
+def _ptt_changed(on: bool):
+    telemetry.transmitting = on
+    events_hub.publish("ptt", {"ptt_status": "TRANSMIT" if on else "RECEIVE"})
+
+# Meters (0x15): 2-byte BCD 0000-0255
+METER_S = "read_s_meter"
+METER_PO = "read_po_meter"
+METER_SWR = "read_swr_meter"
+METER_ALC = "read_alc_meter"
+
+def build_read_meter(meter: str):
+    return codec.encode(meter)
+
+def decode_meter(frame: bytes):
+    """Raw 0-255 reading from a 15 xx reply, or None."""
+    msg = civ_decode(frame)
+    return msg.raw if isinstance(msg, Meter) else None
+
+# IC-7300 meter calibration points (raw reading -> value), from the CI-V reference
+S_METER_CAL = ((0, 0.0), (120, 9.0), (241, 69.0))          # S units; above S9 in dB, so 69 = S9+60
+PO_METER_CAL = ((0, 0.0), (143, 50.0), (213, 100.0))      # percent of rated power
+SWR_METER_CAL = ((0, 1.0), (48, 1.5), (80, 2.0), (120, 3.0), (255, 6.0))
+
+def _meter_value(raw: int, cal) -> float:
+    return float(np.interp(raw, [p[0] for p in cal], [p[1] for p in cal]))
+
+def s_meter_text(s: float) -> str:
+    return f"S{int(s)}" if s <= 9.0 else f"S9+{int(round(s - 9.0))}"
+
+# CI-V transceive (menu 1A 05 00 71): radio broadcasts VFO/mode changes to address 0x00
+def build_set_transceive(on: bool = True):
+    return codec.encode("set_transceive", 0x01 if on else 0x00)
+
+# ---------------------- RADIO STATE CACHE ----------------------
+RADIO_STATE_MAX_AGE = 30.0  # seconds before a cached value is re-read from the radio
+
+
+class RadioState:
+    """
+    In-memory snapshot of frequency, mode, filter and data mode.
+    Kept current by CI-V transceive broadcasts (0x00 frequency, 0x01 mode) and by
+    our own acknowledged set commands. The IC-7300 does not broadcast data mode
+    changes, so that field relies on set commands and periodic re-reads.
+    """
+    FIELDS = ("frequency_hz", "mode_byte", "filter", "data_mode")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self.FIELDS)
+        self._updated = dict.fromkeys(self.FIELDS, 0.0)
+
+    def update(self, **fields):
+        now = time.monotonic()
+        with self._lock:
+            for name, value in fields.items():
+                if value is None:
+                    continue
+                self._values[name] = value
+                self._updated[name] = now
+            values = dict(self._values)
+        if fields.get("frequency_hz") is not None:
+            events_hub.publish("frequency", {"frequency_hz": values["frequency_hz"]})
+        if any(fields.get(name) is not None for name in ("mode_byte", "filter", "data_mode")) \
+                and None not in (values["mode_byte"], values["filter"], values["data_mode"]):
+            events_hub.publish("mode", _mode_state(values["mode_byte"], values["filter"], values["data_mode"]))
+
+    def get(self, *fields, max_age: float = RADIO_STATE_MAX_AGE):
+        """Cached values as a tuple, or None if any is unknown or older than max_age."""
+        now = time.monotonic()
+        with self._lock:
+            for name in fields:
+                if self._values[name] is None or now - self._updated[name] > max_age:
+                    return None
+            return tuple(self._values[name] for name in fields)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            ages = {name: round(now - t, 3) if t else None for name, t in self._updated.items()}
+            return {**self._values, "age_sec": ages}
+
+    def on_frame(self, frame: bytes):
+        """CivTransport listener for unsolicited transceive broadcasts."""
+        msg = civ_decode(frame)
+        if isinstance(msg, Frequency) and msg.broadcast:
+            self.update(frequency_hz=msg.hz)
+        elif isinstance(msg, Mode) and msg.broadcast:
+            self.update(mode_byte=msg.mode, filter=msg.filter)
+
+
+radio_state = RadioState()
+civ.subscribe(radio_state.on_frame)
+
+
+def read_frequency():
+    """Read the VFO frequency from the radio and refresh the cache."""
+    for _ in range(3):
+        frame = civ.query(build_read_freq_command())
+        freq = decode_civ_freq(frame) if frame else None
+        if freq is not None:
+            radio_state.update(frequency_hz=freq)
+            return freq
+    return None
+
+
+async def aread_frequency():
+    """read_frequency() for coroutines on the async server's loop."""
+    for _ in range(3):
+        frame = await civ.aquery(build_read_freq_command())
+        freq = decode_civ_freq(frame) if frame else None
+        if freq is not None:
+            radio_state.update(frequency_hz=freq)
+            return freq
+    return None
+
+
+def get_frequency_state(refresh: bool = False):
+    """Frequency from the cache, falling back to the radio when stale or forced."""
+    cached = None if refresh else radio_state.get("frequency_hz")
+    return cached[0] if cached else read_frequency()
 
-# ---------------------- ROTATOR COMMANDS (unchanged) ----------------------
+
+async def aget_frequency_state(refresh: bool = False):
+    cached = None if refresh else radio_state.get("frequency_hz")
+    return cached[0] if cached else await aread_frequency()
+
+
+def get_mode_state(refresh: bool = False):
+    """Mode dict (same shape as read_mode_and_data_state) served from the cache when fresh."""
+    cached = None if refresh else radio_state.get("mode_byte", "filter", "data_mode")
+    return _mode_state(*cached) if cached else read_mode_and_data_state()
+
+
+async def aget_mode_state(refresh: bool = False):
+    cached = None if refresh else radio_state.get("mode_byte", "filter", "data_mode")
+    return _mode_state(*cached) if cached else await aread_mode_and_data_state()
+
+
+class ModeEngine:
+    """
+    Brings the radio to a (mode byte, filter, data mode) target with as few
+    CI-V commands as possible. The current state comes from radio_state (read
+    from the radio only if it is unknown or stale), and a command is sent only
+    for the part that differs. Each command waits for the radio's FB/FA instead
+    of a fixed delay. The IC-7300 drops data mode when the base mode is set, so
+    a mode change with data on is followed by setting data mode again. aapply()
+    is the same for coroutines on the async server's loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.applies = 0
+        self.commands = 0
+        self.noops = 0
+
+    def apply(self, mode_byte: int, filt: int, data_mode: int) -> dict:
+        """Returns {"ok", "sent": [{"command", "ack", "ms"}], "elapsed_ms", "error"?}."""
+        t0 = time.perf_counter()
+        sent = []
+        with self._lock, civ.lock:
+            self.applies += 1
+            current = radio_state.get("mode_byte", "filter", "data_mode")
+            if current is None and read_mode_and_data_state():
+                current = radio_state.get("mode_byte", "filter", "data_mode", max_age=float("inf"))
+            if current is None:
+                return {"ok": False, "sent": sent, "elapsed_ms": self._ms(t0), "error": "Unable to read current mode"}
+            for name, frame, fields in self._plan(current, mode_byte, filt, data_mode):
+                c0 = time.perf_counter()
+                ack = civ.command(frame)
+                if not self._sent(sent, name, ack, c0):
+                    read_mode_and_data_state()      # resync the cache with what the radio really has
+                    return self._failed(sent, name, ack, t0)
+                radio_state.update(**fields)
+        return {"ok": True, "sent": sent, "elapsed_ms": self._ms(t0)}
+
+    async def aapply(self, mode_byte: int, filt: int, data_mode: int) -> dict:
+        t0 = time.perf_counter()
+        sent = []
+        async with civ.ahold():
+            self.applies += 1
+            current = radio_state.get("mode_byte", "filter", "data_mode")
+            if current is None and await aread_mode_and_data_state():
+                current = radio_state.get("mode_byte", "filter", "data_mode", max_age=float("inf"))
+            if current is None:
+                return {"ok": False, "sent": sent, "elapsed_ms": self._ms(t0), "error": "Unable to read current mode"}
+            for name, frame, fields in self._plan(current, mode_byte, filt, data_mode):
+                c0 = time.perf_counter()
+                ack = await civ.acommand(frame)
+                if not self._sent(sent, name, ack, c0):
+                    await aread_mode_and_data_state()
+                    return self._failed(sent, name, ack, t0)
+                radio_state.update(**fields)
+        return {"ok": True, "sent": sent, "elapsed_ms": self._ms(t0)}
+
+    def _plan(self, current, mode_byte, filt, data_mode):
+        cur_mode, cur_filter, cur_data = current
+        plan = []
+        mode_changes = (cur_mode, cur_filter) != (mode_byte, filt)
+        if mode_changes:
+            plan.append(("set_mode", build_set_mode_command(mode_byte, filt),
+                         {"mode_byte": mode_byte, "filter": filt, **({} if data_mode else {"data_mode": 0})}))
+        # set_mode already turns data mode off, so after one only data on needs sending
+        if data_mode if mode_changes else data_mode != cur_data:
+            plan.append(("set_data_mode", build_set_data_mode(data_mode), {"data_mode": data_mode}))
+        if not plan:
+            self.noops += 1
+        return plan
+
+    def _sent(self, sent, name, ack, c0) -> bool:
+        self.commands += 1
+        sent.append({"command": name, "ack": {True: "OK", False: "NG"}.get(ack, "timeout"), "ms": self._ms(c0)})
+        return bool(ack)
+
+    def _failed(self, sent, name, ack, t0):
+        return {"ok": False, "sent": sent, "elapsed_ms": self._ms(t0),
+                "error": f"Radio rejected {name}" if ack is False else f"No reply to {name}"}
+
+    def stats(self):
+        return {"applies": self.applies, "commands": self.commands, "noops": self.noops}
+
+    @staticmethod
+    def _ms(t0):
+        return round((time.perf_counter() - t0) * 1000, 1)
+
+
+mode_engine = ModeEngine()
+
+
+class FrequencyCoalescer:
+    """
+    Latest-wins tuning. Knob spins produce many set-frequency requests; only the
+    newest pending value is ever sent. One worker sends it, waits for the
+    radio's ack and then picks up whatever arrived meanwhile, so the bus runs
+    back to back at the rate it can sustain and the radio never lags behind
+    the knob. Callers wait at most for the transaction that covers their
+    request and get back the value actually applied; aset() waits the same
+    way without holding a thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None      # (generation, freq_hz) not yet sent
+        self._gen = 0             # generation of the newest request
+        self._done_gen = 0        # newest generation settled by a transaction
+        self._result = None       # ack of that transaction
+        self._thread = None
+        self._waiters = []        # (generation, loop, future) of aset() callers
+        self.applied_hz = None    # last frequency the radio acknowledged
+        self.requests = 0
+        self.sent = 0
+
+    def set(self, freq_hz: int, timeout: float = 2 * CIV_TIMEOUT) -> dict:
+        with self._cond:
+            gen = self._request(freq_hz)
+            settled = self._cond.wait_for(lambda: self._done_gen >= gen, timeout)
+            return self._outcome(gen, freq_hz, settled)
+
+    async def aset(self, freq_hz: int, timeout: float = 2 * CIV_TIMEOUT) -> dict:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._cond:
+            gen = self._request(freq_hz)
+            waiter = (gen, loop, fut)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._cond:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            return self._outcome(gen, freq_hz, self._done_gen >= gen)
+
+    def stats(self):
+        with self._cond:
+            return {"requests": self.requests, "sent": self.sent, "applied_hz": self.applied_hz}
+
+    def _request(self, freq_hz):
+        # Called with self._cond held; returns the request's generation
+        self._gen += 1
+        self._pending = (self._gen, freq_hz)
+        self.requests += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="freq-coalescer", daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+        return self._gen
+
+    def _outcome(self, gen, freq_hz, settled):
+        return {
+            "requested_hz": freq_hz,
+            "applied_hz": self.applied_hz,
+            "ok": settled and bool(self._result),
+            "coalesced": self._done_gen > gen,
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+                gen, freq = self._pending
+                self._pending = None
+            try:
+                ok = civ.command(build_set_freq_command(freq))
+            except Exception as e:
+                print(f"❌ Frequency change to {freq} failed: {e}")
+                ok = False
+            if ok:
+                radio_state.update(frequency_hz=freq)
+            with self._cond:
+                self.sent += 1
+                if ok:
+                    self.applied_hz = freq
+                self._done_gen = gen
+                self._result = ok
+                self._cond.notify_all()
+                settled = [w for w in self._waiters if w[0] <= gen]
+                self._waiters = [w for w in self._waiters if w[0] > gen]
+            for _, loop, fut in settled:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_settle_future, fut)
+
+
+def _settle_future(fut):
+    # The waiter may have timed out (and cancelled it) in the meantime
+    if not fut.done():
+        fut.set_result(None)
+
+
+freq_coalescer = FrequencyCoalescer()
+
+
+class PttTimer:
+    """
+    Owns the transmitter key. key() sends PTT on, arms a deadline and returns
+    at once; a single watchdog thread sends PTT off when the deadline passes,
+    so nothing sits in time.sleep() for the length of a transmission. Every
+    key-up is also capped at PTT_MAX_SECONDS from the moment it was keyed:
+    extend() cannot move the deadline past that, and the TX queue keys through
+    here too, so a hung TX thread still gets unkeyed. If the radio does not ack
+    PTT off, the watchdog keeps retrying. Under the async server the watchdog is
+    a timer task on the event loop instead of a thread (attach()), and routes
+    key and release through akey()/arelease().
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._thread = None
+        self._session = 0
+        self.owner = None         # "manual" / "tx_queue" while keyed, "releasing" while PTT off is retried
+        self.keyed_at = None
+        self.deadline = None
+        self._on_abort = None
+        self._loop = None
+        self._wakeup = None       # asyncio.Event for the loop's timer task
+        self._task = None
+        self._release_retries = 0
+        self.timeouts = 0
+        self.last_release = None
+
+    def attach(self, loop):
+        """Run the deadline as a timer task on loop; a running watchdog thread hands over to it."""
+        with self._cond:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._awatchdog())
+            self._cond.notify_all()
+
+    def detach(self):
+        """Back to the watchdog thread (async server shutdown)."""
+        with self._cond:
+            task, self._task = self._task, None
+            self._loop = self._wakeup = None
+            if task:
+                task.cancel()
+            if self.deadline is not None:
+                self._start_watchdog()
+
+    def key(self, seconds: float = None, owner: str = "manual", on_abort=None):
+        """
+        Key up for `seconds` (None = up to the hard limit). Returns a session
+        number for release(), or None if somebody else holds PTT or the radio
+        did not ack. Keying again by the same owner just moves the deadline.
+        """
+        session, fresh = self._claim(seconds, owner)
+        if not fresh:
+            return session
+        return self._keyed(session, set_ptt(True), seconds, on_abort)
+
+    async def akey(self, seconds: float = None, owner: str = "manual", on_abort=None):
+        session, fresh = self._claim(seconds, owner)
+        if not fresh:
+            return session
+        return self._keyed(session, await aset_ptt(True), seconds, on_abort)
+
+    def extend(self, seconds: float):
+        """Push the deadline out by `seconds`, up to the hard limit. Returns the status, or None if not keyed."""
+        with self._cond:
+            if self.deadline is None or self.owner == "releasing":
+                return None
+            self.deadline = min(self.deadline + seconds, self.keyed_at + PTT_MAX_SECONDS)
+            self._notify()
+        return self.status()
+
+    def release(self, session: int = None, reason: str = "released") -> bool:
+        """
+        Unkey now. With a session number only that key-up is released, so a
+        stale caller cannot unkey a later transmission. Releasing without one
+        (the PTT off button) also aborts the owner through its on_abort callback.
+        """
+        taken, on_abort = self._take(session, reason)
+        return taken and self._unkey(reason, on_abort)
+
+    async def arelease(self, session: int = None, reason: str = "released") -> bool:
+        taken, on_abort = self._take(session, reason)
+        return taken and await self._aunkey(reason, on_abort)
+
+    def held(self, session: int) -> bool:
+        with self._cond:
+            return session == self._session and self.keyed_at is not None
+
+    def remaining_limit(self) -> float:
+        """Seconds left before the hard limit; PTT_MAX_SECONDS when unkeyed."""
+        with self._cond:
+            if self.keyed_at is None:
+                return PTT_MAX_SECONDS
+            return max(0.0, self.keyed_at + PTT_MAX_SECONDS - time.monotonic())
+
+    def status(self):
+        now = time.monotonic()
+        with self._cond:
+            keyed = self.keyed_at is not None
+            return {
+                "keyed": keyed,
+                "owner": self.owner,
+                "elapsed_sec": round(now - self.keyed_at, 2) if keyed else None,
+                "remaining_sec": round(max(0.0, self.deadline - now), 2) if self.deadline else None,
+                "limit_remaining_sec": round(max(0.0, self.keyed_at + PTT_MAX_SECONDS - now), 2) if keyed else None,
+                "max_seconds": PTT_MAX_SECONDS,
+                "timeouts": self.timeouts,
+                "last_release": self.last_release,
+            }
+
+    def _claim(self, seconds, owner):
+        """(session, fresh): fresh if PTT on must be sent now, session None if somebody else holds PTT."""
+        with self._cond:
+            if self.keyed_at is not None:
+                if self.owner != owner or self.deadline is None:
+                    return None, False
+                self.deadline = self._limit(seconds)
+                self._notify()
+                return self._session, False
+            # Claim the key before talking to the radio so concurrent callers back off
+            self._session += 1
+            self.owner = owner
+            self.keyed_at = time.monotonic()
+            return self._session, True
+
+    def _keyed(self, session, acked, seconds, on_abort):
+        with self._cond:
+            if not acked:
+                if self._session == session:
+                    self._clear("not acknowledged")
+                return None
+            self.deadline = self._limit(seconds)
+            self._on_abort = on_abort
+            self._start_watchdog()
+        return session
+
+    def _take(self, session, reason):
+        """(released, on_abort) for release(): clears the key unless session is stale."""
+        with self._cond:
+            if session is not None and (session != self._session or self.keyed_at is None):
+                return False, None
+            on_abort = self._on_abort if session is None else None
+            self._clear(reason)
+        return True, on_abort
+
+    def _limit(self, seconds):
+        hard = self.keyed_at + PTT_MAX_SECONDS
+        return hard if seconds is None else min(time.monotonic() + seconds, hard)
+
+    def _clear(self, reason):
+        self.owner = None
+        self.keyed_at = None
+        self.deadline = None
+        self._on_abort = None
+        self.last_release = reason
+        self._notify()
+
+    def _notify(self):
+        # Called with self._cond held
+        self._cond.notify_all()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _start_watchdog(self):
+        # Called with self._cond held; the loop's timer task is always running once attached
+        if self._loop is None and self._thread is None:
+            self._thread = threading.Thread(target=self._watchdog, name="ptt-watchdog", daemon=True)
+            self._thread.start()
+        self._notify()
+
+    def _unkey(self, reason, on_abort=None) -> bool:
+        if on_abort:
+            on_abort()
+        if set_ptt(False):
+            self._release_retries = 0
+            return True
+        self._retry_release(reason)
+        return False
+
+    async def _aunkey(self, reason, on_abort=None) -> bool:
+        if on_abort:
+            on_abort()
+        if await aset_ptt(False):
+            self._release_retries = 0
+            return True
+        self._retry_release(reason)
+        return False
+
+    def _retry_release(self, reason):
+        # No ack: leave the key marked as held and let the watchdog try again, a limited number of times
+        with self._cond:
+            if self.keyed_at is not None:
+                return
+            if not radio_ser:
+                return                  # no radio, nothing keyed to release
+            self._release_retries += 1
+            if self._release_retries > PTT_RELEASE_TRIES:
+                self._release_retries = 0
+                self.last_release = f"{reason} (not acknowledged)"
+                print(f"❌ Radio did not ack PTT off after {PTT_RELEASE_TRIES} retries, giving up")
+                return
+            self._session += 1
+            self.owner = "releasing"
+            self.keyed_at = time.monotonic()
+            self.deadline = self.keyed_at + PTT_RELEASE_RETRY
+            self.last_release = reason
+            self._start_watchdog()
+
+    def _expire(self):
+        """Clear the key whose deadline passed. Called with self._cond held; returns (reason, on_abort)."""
+        retry = self.owner == "releasing"
+        hard = not retry and self.deadline >= self.keyed_at + PTT_MAX_SECONDS
+        reason = self.last_release if retry else "timeout" if hard else "expired"
+        if hard:
+            self.timeouts += 1
+            print(f"⚠️ PTT held for {PTT_MAX_SECONDS} s, forcing it off")
+        on_abort = self._on_abort
+        self._clear(reason)
+        return reason, on_abort
+
+    def _watchdog(self):
+        while True:
+            with self._cond:
+                while self._loop is None and (self.deadline is None or time.monotonic() < self.deadline):
+                    self._cond.wait(None if self.deadline is None else self.deadline - time.monotonic())
+                if self._loop is not None:
+                    self._thread = None       # the loop's timer task has taken over
+                    return
+                reason, on_abort = self._expire()
+            self._unkey(reason, on_abort)
+
+    async def _awatchdog(self):
+        while True:
+            with self._cond:
+                deadline = self.deadline
+                expired = deadline is not None and time.monotonic() >= deadline
+                if expired:
+                    reason, on_abort = self._expire()
+                else:
+                    self._wakeup.clear()
+            if expired:
+                await self._aunkey(reason, on_abort)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(),
+                                       None if deadline is None else deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+
+
+ptt_timer = PttTimer()
+
+
+def init_radio_state():
+    """Turn on transceive so the cache follows the front panel, then prime it."""
+    if not radio_ser:
+        return
+    if not civ.command(build_set_transceive(True)):
+        print("⚠️ Could not enable CI-V transceive; radio state will be polled instead")
+    read_frequency()
+    read_mode_and_data_state()
+
+
+threading.Thread(target=init_radio_state, name="radio-state-init", daemon=True).start()
+
+# ---------------------- TELEMETRY ----------------------
+def _db(x: float) -> float:
+    return round(20 * np.log10(x), 1) if x > 1e-6 else -120.0
+
+
+class LevelMeter:
+    """Peak/RMS/clip accumulator for one audio path, drained once per history sample."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clips_total = 0
+        self._reset()
+
+    def _reset(self):
+        self._peak = 0.0
+        self._sumsq = 0.0
+        self._count = 0
+        self._clips = 0
+
+    def add(self, block: np.ndarray, full_scale: float = 1.0):
+        """Account one block (any shape/dtype; full_scale maps it to [-1, 1])."""
+        x = block.ravel().astype(np.float32)     # int16 abs() would overflow at -32768
+        x *= 1.0 / full_scale
+        a = np.abs(x)
+        peak = float(a.max()) if a.size else 0.0
+        sumsq = float(np.dot(x, x))
+        clips = int(np.count_nonzero(a >= CLIP_LEVEL)) if peak >= CLIP_LEVEL else 0
+        with self._lock:
+            self._peak = max(self._peak, peak)
+            self._sumsq += sumsq
+            self._count += block.size
+            self._clips += clips
+            self.clips_total += clips
+
+    def drain(self):
+        """(peak_db, rms_db, clips) since the last drain, or None if nothing was added."""
+        with self._lock:
+            if not self._count:
+                return None
+            result = (_db(self._peak), _db((self._sumsq / self._count) ** 0.5), self._clips)
+            self._reset()
+            return result
+
+
+class Telemetry:
+    """
+    Measured levels and radio meters for the dashboard. RX levels come from an
+    own AudioCapture listener, TX levels are pushed by the TX pipeline per block.
+    The S-meter (receive) or Po/SWR/ALC (transmit) are read over CI-V, one
+    reading per TELEMETRY_METER_INTERVAL; a reading is skipped whenever another
+    CI-V transaction holds the bus, so commands never wait behind telemetry.
+    Everything is decimated to one sample per TELEMETRY_INTERVAL in a ring.
+    Runs while clients keep asking, like the spectrum engine.
+    """
+
+    FIELDS = ("time", "rx_peak_db", "rx_rms_db", "rx_clips", "tx_peak_db", "tx_rms_db", "tx_clips",
+              "s_meter", "po_percent", "swr", "alc")
+
+    def __init__(self, history: int = TELEMETRY_HISTORY):
+        self.rx = LevelMeter()
+        self.tx = LevelMeter()
+        self.transmitting = False
+        self.history = deque(maxlen=history)
+        self.meters = {}                 # latest decoded meter readings
+        self.meter_reads = 0
+        self.meter_skips = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_request = 0.0
+        self._meter_turn = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def touch(self):
+        with self._cond:
+            self._last_request = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+                self._thread.start()
+
+    def latest(self):
+        with self._cond:
+            sample = dict(zip(self.FIELDS, self.history[-1])) if self.history else {}
+        sample.update(self.meters)
+        if not self.transmitting:
+            sample.update(po_percent=None, swr=None, alc=None)     # last TX readings are stale
+        sample["transmitting"] = self.transmitting
+        sample["rx_clips_total"] = self.rx.clips_total
+        sample["tx_clips_total"] = self.tx.clips_total
+        return sample
+
+    def series(self, seconds: float):
+        """History of the last `seconds` as {field: [values...]} columns."""
+        cutoff = time.time() - seconds
+        with self._cond:
+            rows = [r for r in self.history if r[0] >= cutoff]
+        return {name: [r[i] for r in rows] for i, name in enumerate(self.FIELDS)}
+
+    def _run(self):
+        listener = audio_capture.listen("telemetry")
+        next_sample = next_meter = time.monotonic()
+        try:
+            while time.monotonic() - self._last_request < TELEMETRY_IDLE_SEC:
+                block = listener.read(timeout=TELEMETRY_INTERVAL)
+                if block is not None:
+                    self.rx.add(block, 32768.0)
+                elif not audio_capture.running:
+                    time.sleep(TELEMETRY_INTERVAL)
+                now = time.monotonic()
+                if radio_ser and now >= next_meter:
+                    next_meter = now + TELEMETRY_METER_INTERVAL
+                    self._read_meter()
+                if now >= next_sample:
+                    next_sample = now + TELEMETRY_INTERVAL
+                    self._sample()
+        except Exception as e:
+            print(f"❌ Error in telemetry: {e}")
+        finally:
+            listener.close()
+            with self._cond:
+                self._thread = None
+
+    def _read_meter(self):
+        if self.transmitting:
+            subs = (METER_PO, METER_SWR, METER_ALC)
+            sub = subs[self._meter_turn % len(subs)]
+        else:
+            sub = METER_S
+        self._meter_turn += 1
+        if not civ.lock.acquire(blocking=False):
+            self.meter_skips += 1
+            return
+        try:
+            raw = decode_meter(civ.query(build_read_meter(sub), timeout=TELEMETRY_METER_TIMEOUT))
+        finally:
+            civ.lock.release()
+        if raw is None:
+            return
+        self.meter_reads += 1
+        if sub == METER_S:
+            s = _meter_value(raw, S_METER_CAL)
+            self.meters.update(s_meter=round(s, 1), s_meter_text=s_meter_text(s), s_meter_raw=raw)
+        elif sub == METER_PO:
+            self.meters.update(po_percent=round(_meter_value(raw, PO_METER_CAL), 1))
+        elif sub == METER_SWR:
+            self.meters.update(swr=round(_meter_value(raw, SWR_METER_CAL), 2))
+        else:
+            self.meters.update(alc=round(raw / 120 * 100, 1))     # percent of the ALC zone
+
+    def _sample(self):
+        rx = self.rx.drain() or (None, None, 0)
+        tx = self.tx.drain() or (None, None, 0)
+        m = self.meters
+        row = (round(time.time(), 2), *rx, *tx, m.get("s_meter"),
+               m.get("po_percent") if self.transmitting else None,
+               m.get("swr") if self.transmitting else None,
+               m.get("alc") if self.transmitting else None)
+        with self._cond:
+            self.history.append(row)
+
+
+telemetry = Telemetry()
+
+# ---------------------- ROTATOR ----------------------
 CMD_CW   = b'AB1;'
 CMD_CCW  = b'AA1;'
 CMD_STOP = b';'
+CMD_POSITION = b'C2\r'
+ROTATOR_DIRECTIONS = {CMD_CW: 1, CMD_CCW: -1, CMD_STOP: 0}
+
+
+def parse_azimuth(resp: str):
+    """Azimuth in degrees from the controller's C2 reply (e.g. "+0180+0000"), or None."""
+    m = re.search(r'\d{1,4}', resp)
+    if not m:
+        return None
+    az = int(m.group())
+    return az if az <= 450 else None
+
+
+class RotatorTracker:
+    """
+    Owns rotator_ser. One thread reads the position (C2) every
+    ROTATOR_POLL_INTERVAL and caches azimuth, rotation speed and the time of the
+    reading, so /rotator/status never touches the port. goto() is a closed loop
+    on the same thread: turn toward the target and send STOP at the reading
+    where stopping lands closest to it, given how far the rotator coasts after
+    STOP and how far it would turn before the next reading. The coast is
+    learned from every full-speed stop; if a stop still misses by more than
+    ROTATOR_GOTO_TOLERANCE, a correction turn follows. The controller has end
+    stops, so the rotator never turns through 0/360.
+    """
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.lock = threading.Lock()       # one write/read exchange on the port at a time
+        self._cond = threading.Condition()
+        self._thread = None
+        self.azimuth = None
+        self.raw = None
+        self.updated = None                # monotonic time of the last good reading
+        self.updated_wall = None
+        self.speed = 0.0                   # deg/s, + = clockwise (smoothed)
+        self.direction = 0                 # last command sent: 1 CW, -1 CCW, 0 stop
+        self.coast_deg = ROTATOR_COAST_DEG
+        self._goto = None
+        self.last_goto = None
+        self.reads = 0
+        self.misses = 0
+
+    def start(self):
+        if not self.ser or self._thread is not None:
+            return
+        self.ser.timeout = ROTATOR_REPLY_TIMEOUT
+        self._thread = threading.Thread(target=self._run, name="rotator-tracker", daemon=True)
+        self._thread.start()
+
+    def command(self, cmd: bytes) -> dict:
+        """Manual CW/CCW/STOP. Cancels a go-to in progress."""
+        with self._cond:
+            if self._goto:
+                self._finish("cancelled")
+            result = self._send(cmd)
+        self._publish()
+        return result
+
+    def goto(self, azimuth: int) -> dict:
+        """Start turning to `azimuth` and return at once; progress is in status()/events."""
+        with self._cond:
+            direction = self.direction
+            if self._goto:
+                self._finish("superseded")
+            elif direction:
+                self._send(CMD_STOP)
+            now = time.monotonic()
+            # If it was turning, let it coast to a halt before judging where it is
+            self._goto = {
+                "target": azimuth,
+                "started": time.time(),
+                "t0": now,
+                "deadline": now + ROTATOR_GOTO_TIMEOUT,
+                "tries": 0,
+                "stopping": bool(direction),
+                "stopped_at": now,
+                "stop_az": self.azimuth,
+                "direction": direction,
+                "full_speed": False,
+                # Overwritten when the first turn starts; set here so a failed STOP above cannot leave them missing
+                "last_az": self.azimuth,
+                "last_move": now,
+                "moved_at": now,
+            }
+            self._cond.notify_all()        # steer on a fresh reading right away
+            info = self._goto_info(self._goto)
+        self._publish()
+        return info
+
+    def cancel(self, reason: str = "cancelled"):
+        """Stop a go-to in progress (and the rotator). Returns the finished go-to, or None."""
+        with self._cond:
+            if not self._goto:
+                return None
+            self._finish(reason)
+            return self.last_goto
+
+    def status(self):
+        now = time.monotonic()
+        with self._cond:
+            age = now - self.updated if self.updated else None
+            return {
+                "position": self.raw or "no response",
+                "azimuth": self.azimuth,
+                "updated": self.updated_wall,
+                "age_sec": round(age, 2) if age is not None else None,
+                "stale": age is None or age > ROTATOR_STALE_SEC,
+                "moving": self.direction != 0,
+                "direction": {1: "cw", -1: "ccw"}.get(self.direction),
+                "speed_dps": round(self.speed, 1),
+                "coast_deg": round(self.coast_deg, 1),
+                "goto": self._goto_info(self._goto) if self._goto else None,
+                "last_goto": self.last_goto,
+                "reads": self.reads,
+                "misses": self.misses,
+            }
+
+    def _run(self):
+        print("🧭 Rotator tracker started")
+        next_poll = time.monotonic()
+        while True:
+            with self._cond:
+                # goto() notifies, so a new target is acted on without waiting out the interval
+                self._cond.wait(max(0.0, next_poll - time.monotonic()))
+            next_poll = time.monotonic() + ROTATOR_POLL_INTERVAL
+            try:
+                self._poll()
+                with self._cond:
+                    if self._goto:
+                        self._steer()
+                self._publish()
+            except Exception as e:
+                print(f"❌ Error in rotator tracker: {e}")
+                self._halt()
+
+    def _halt(self):
+        # After an unexpected error: never leave the rotator turning unattended
+        try:
+            with self._cond:
+                if self._goto:
+                    self._finish("error")
+                elif self.direction:
+                    self._send(CMD_STOP)
+        except Exception as e:
+            print(f"❌ Rotator stop after error failed: {e}")
+
+    def _poll(self):
+        try:
+            with self.lock:
+                self.ser.reset_input_buffer()
+                self.ser.write(CMD_POSITION)
+                resp = self.ser.read_until(b'\r').decode('ascii', errors='ignore').strip()
+        except Exception as e:
+            print(f"❌ Rotator read error: {e}")
+            resp = ""
+        az = parse_azimuth(resp)
+        now = time.monotonic()
+        with self._cond:
+            if az is None:
+                self.misses += 1
+                return
+            if self.updated is not None and now > self.updated:
+                self.speed = 0.5 * self.speed + 0.5 * (az - self.azimuth) / (now - self.updated)
+            self.azimuth, self.raw = az, resp
+            self.updated, self.updated_wall = now, time.time()
+            self.reads += 1
+
+    def _steer(self):
+        # Called on the tracker thread with self._cond held, right after a reading
+        g = self._goto
+        now = time.monotonic()
+        if self.azimuth is None or self.updated < g["t0"]:
+            if now > g["deadline"]:
+                self._finish("no position")
+            return
+        az = self.azimuth
+        if now > g["deadline"]:
+            self._finish("timeout")
+            return
+
+        if self.direction:
+            if az != g["last_az"]:
+                g["last_az"], g["last_move"] = az, now
+            elif now - g["last_move"] > ROTATOR_STALL_SEC:
+                self._finish("stalled")
+                return
+            # Stop now if that ends nearer the target than stopping at the next reading would
+            remaining = (g["target"] - az) * self.direction
+            if remaining - self.coast_deg <= abs(self.speed) * ROTATOR_POLL_INTERVAL / 2:
+                g["stop_az"], g["stopped_at"] = az, now
+                g["full_speed"] = now - g["moved_at"] >= 1.0
+                g["stopping"] = True
+                self._send(CMD_STOP)
+            return
+
+        if g["stopping"]:
+            if abs(self.speed) > 0.5 and now - g["stopped_at"] < ROTATOR_SETTLE_SEC:
+                return                      # still coasting
+            g["stopping"] = False
+            if g["full_speed"]:
+                coast = max(0.0, (az - g["stop_az"]) * g["direction"])
+                self.coast_deg = 0.5 * self.coast_deg + 0.5 * coast
+
+        error = g["target"] - az
+        if abs(error) <= ROTATOR_GOTO_TOLERANCE:
+            self._finish("done")
+        elif g["tries"] >= ROTATOR_GOTO_TRIES:
+            self._finish("missed")
+        else:
+            g["tries"] += 1
+            g["direction"] = 1 if error > 0 else -1
+            g["moved_at"] = g["last_move"] = now
+            g["last_az"] = az
+            self._send(CMD_CW if error > 0 else CMD_CCW)
+
+    def _finish(self, result: str):
+        # Called with self._cond held
+        if self.direction:
+            self._send(CMD_STOP)
+        g, self._goto = self._goto, None
+        info = self._goto_info(g)
+        info["result"] = result
+        info["elapsed_sec"] = round(time.monotonic() - g["t0"], 1)
+        if self.azimuth is not None:
+            info["final_azimuth"] = self.azimuth
+            info["error_deg"] = self.azimuth - g["target"]
+        self.last_goto = info
+
+    @staticmethod
+    def _goto_info(g):
+        return {"target": g["target"], "started": g["started"], "tries": g["tries"]}
+
+    def _send(self, cmd: bytes) -> dict:
+        if not self.ser or not self.ser.is_open:
+            return {"status": "error", "message": "Rotator not available"}
+        with self.lock:
+            try:
+                self.ser.write(cmd)
+                time.sleep(0.05)
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+        self.direction = ROTATOR_DIRECTIONS.get(cmd, self.direction)
+        return {"status": "ok"}
+
+    def _publish(self):
+        with self._cond:
+            if self.azimuth is None:
+                return
+            data = {
+                "azimuth": self.azimuth,
+                "position": self.raw,
+                "moving": self.direction != 0,
+                "target": self._goto["target"] if self._goto else None,
+            }
+        events_hub.publish("rotator", data)
+
+
+rotator_tracker = RotatorTracker(rotator_ser)
+rotator_tracker.start()
+
 
 def send_rotator(cmd):
     if not rotator_ser or not rotator_ser.is_open:
         return {"status": "error", "message": "Rotator not available"}
-    with serial_lock:
-        try:
-            rotator_ser.write(cmd)
-            time.sleep(0.05)
-            return {"status": "ok"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+    return rotator_tracker.command(cmd)
 
 # ---------------------- ENDPOINTS ----------------------
 @app.route('/')
@@ -557,66 +3051,86 @@ def login():
 @app.route("/frequency", methods=["GET"])
 def get_frequency():
     if not radio_ser: return jsonify({"error": "Radio not open"}), 500
-    radio_ser.reset_input_buffer()
-    for _ in range(3):
-        radio_ser.write(build_read_freq_command())
-        time.sleep(0.25)
-        resp = radio_ser.read(100)
-        frames = [f for f in extract_all_frames(resp) if len(f) >= 11 and f[4] == 0x03]
-        if frames:
-            return jsonify({"frequency_hz": decode_civ_freq(frames[-1])})
-    return jsonify({"error": "No freq response"}), 500
+    freq = get_frequency_state(refresh=request.args.get("refresh") == "1")
+    if freq is None:
+        return jsonify({"error": "No freq response"}), 500
+    return jsonify({"frequency_hz": freq})
 
 @app.route("/frequency", methods=["POST"])
 def set_frequency():
-    freq = int(request.get_json(silent=True).get("frequency_hz", 0))
-    radio_ser.write(build_set_freq_command(freq))
-    time.sleep(0.2)
-    return jsonify({"status": "OK", "set_frequency_hz": freq})
+    data = request.get_json(silent=True) or {}
+    try:
+        freq = int(data.get("frequency_hz"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "frequency_hz must be an integer"}), 400
+    if not FREQ_MIN_HZ <= freq <= FREQ_MAX_HZ:
+        return jsonify({"error": f"frequency out of range: {freq}"}), 400
+    result = freq_coalescer.set(freq)
+    if not result["ok"]:
+        return jsonify({"error": "Radio did not accept the frequency", **result}), 500
+    # A newer request may have superseded this one; report what the radio is actually on
+    return jsonify({"status": "OK", "set_frequency_hz": result["applied_hz"], **result})
 
 @app.route("/mode", methods=["GET"])
 def get_mode():
     if not radio_ser: return jsonify({"error": "Radio not open"}), 500
-    state = read_mode_and_data_state()
+    state = get_mode_state(refresh=request.args.get("refresh") == "1")
     if not state:
         return jsonify({"error": "No mode response"}), 500
     return jsonify(state)
 
+
+@app.route("/state", methods=["GET"])
+def get_radio_state():
+    """Full cached radio snapshot with the age of each field."""
+    return jsonify(radio_state.snapshot())
+
+@app.route("/telemetry", methods=["GET"])
+def get_telemetry():
+    """Latest RX/TX audio levels (dBFS, clip counts) and radio meters (S-meter, Po, SWR, ALC)."""
+    telemetry.touch()
+    return jsonify({**telemetry.latest(), "meter_reads": telemetry.meter_reads,
+                    "meter_skips": telemetry.meter_skips})
+
+@app.route("/telemetry/history", methods=["GET"])
+def get_telemetry_history():
+    """Recent telemetry as columns, one sample per TELEMETRY_INTERVAL: ?seconds= (default 30)."""
+    try:
+        seconds = float(request.args.get("seconds", 30))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    telemetry.touch()
+    return jsonify({"interval": TELEMETRY_INTERVAL, **telemetry.series(seconds)})
+
 @app.route("/mode", methods=["POST"])
 def set_mode():
     if not radio_ser: return jsonify({"error": "Radio not open"}), 500
-    data = request.get_json(silent=True) or {}
-    mode_input = data.get("mode")
-
+    # Snapshot current combined state (used for both branches); served from the cache when fresh
+    state = get_mode_state()
+    if not state:
+        return jsonify({"error": "Unable to read current mode"}), 500
+    target, reply = mode_request(request.get_json(silent=True) or {}, state)
+    body, status = mode_reply(mode_engine.apply(*target), reply)
+    return jsonify(body), status
 
-    # Snapshot current combined state (used for both branches)
-    state_snapshot = read_mode_and_data_state()
-    current_data_mode = state_snapshot["data_mode"] if state_snapshot else 0
-    current_filter = state_snapshot["filter"] if state_snapshot else 1
-    current_mode_byte = state_snapshot["mode_byte"] if state_snapshot else None
-    current_base_name = state_snapshot["base_mode"] if state_snapshot else None
+def mode_request(data: dict, state: dict):
+    """
+    POST /mode body + current mode state -> ((mode_byte, filter, data_mode) to
+    apply, reply fields on success). Shared with the async server.
+    """
+    mode_input = data.get("mode")
+    current_data_mode = state["data_mode"]
 
     # Special "data" keyword → toggle data mode
     if isinstance(mode_input, str) and mode_input.strip().lower() == "data":
-        # Read current combined state so the data button can augment the active mode.
-        state = read_mode_and_data_state()
-        if not state:
-            return jsonify({"error": "Unable to read current mode"}), 500
-
         # Toggle data: off -> D1, on -> off
-        new_data_mode = 0x00 if state["data_mode"] else 0x01
+        new_data_mode = 0x00 if current_data_mode else 0x01
 
         # When enabling data, force filter to D1 (value 1); otherwise keep current filter.
         new_filter = new_data_mode if new_data_mode else state["filter"] or 1
 
-        # Re-apply the base mode with the chosen filter, then set data flag.
-        radio_ser.write(build_set_mode_command(state["mode_byte"], new_filter))
-        time.sleep(0.1)
-        radio_ser.write(build_set_data_mode(new_data_mode))
-        time.sleep(0.2)
-
         combined_name = f"{state['base_mode']}-D{new_data_mode}" if new_data_mode else state["base_mode"]
-        return jsonify({
+        return (state["mode_byte"], new_filter, new_data_mode), {
             "status": "OK",
             "action": "data_mode_toggled",
             "mode_name": combined_name,
@@ -625,7 +3139,7 @@ def set_mode():
             "filter": new_filter,
             "data_mode": new_data_mode,
             "note": "Data button now ties to the active mode (e.g., USB-D1)"
-        })
+        }
 
     # Normal mode change (accept string or int)
     if isinstance(mode_input, str):
@@ -641,15 +3155,10 @@ def set_mode():
     else:
         filt = int(requested_filter or 1)
 
-    radio_ser.write(build_set_mode_command(mode_byte, filt))
-    time.sleep(0.2)
-
-    # If data was active, re-assert it so changing base mode keeps D1 on.
+    # Data mode stays as it is, so changing base mode keeps D1 on
     if current_data_mode:
-        radio_ser.write(build_set_data_mode(current_data_mode))
-        time.sleep(0.1)
         combined_name = f"{MODE_NAMES.get(mode_byte, 'Unknown')}-D{current_data_mode}"
-        return jsonify({
+        return (mode_byte, filt, current_data_mode), {
             "status": "OK",
             "mode_name": combined_name,
             "mode_byte": mode_byte,
@@ -657,37 +3166,75 @@ def set_mode():
             "data_mode": current_data_mode,
             "base_mode": MODE_NAMES.get(mode_byte, "Unknown"),
             "note": "Mode changed while data on; kept data mode active"
-        })
+        }
 
-    return jsonify({
+    return (mode_byte, filt, current_data_mode), {
         "status": "OK",
         "mode_name": MODE_NAMES.get(mode_byte, "Unknown"),
         "mode_byte": mode_byte,
-        "filter": filt
-    })
+        "filter": filt,
+    }
+
+def mode_reply(result: dict, reply: dict):
+    """(body, status) for POST /mode once the ModeEngine has run."""
+    if not result["ok"]:
+        return {"error": result["error"], "sent": result["sent"]}, 500
+    return {**reply, "commands": len(result["sent"]), "elapsed_ms": result["elapsed_ms"]}, 200
 
 @app.route("/ptt", methods=["GET"])
 def get_ptt_status():
-    radio_ser.write(bytes([0xFE, 0xFE, CI_V_TO, CI_V_FROM, 0x1C, 0x00, 0xFD]))
-    time.sleep(0.2)
-    resp = radio_ser.read(40)
-    frame = next((f for f in extract_all_frames(resp) if f[4] == 0x1C), None)
-    state = "TRANSMIT" if frame and len(frame) > 6 and frame[6] == 0x01 else "RECEIVE"
-    return jsonify({"ptt_status": state})
+    return jsonify(ptt_status(civ.query(build_read_ptt_command())))
+
+def ptt_status(frame):
+    """GET /ptt body from the radio's reply to build_read_ptt_command()."""
+    msg = civ_decode(frame)
+    state = "TRANSMIT" if isinstance(msg, Ptt) and msg.on else "RECEIVE"
+    events_hub.publish("ptt", {"ptt_status": state})
+    return {"ptt_status": state, "timer": ptt_timer.status()}
+
+def _seconds_arg(default, args=None):
+    try:
+        secs = float((request.args if args is None else args).get("seconds", default))
+    except ValueError:
+        return None
+    return secs if 0 < secs <= PTT_MAX_SECONDS else None
 
 @app.route("/ptt/on", methods=["POST"])
 def ptt_on():
-    secs = int(request.args.get("seconds", 5))
-    radio_ser.write(build_ptt_on_command())
-    time.sleep(secs)
-    radio_ser.write(build_ptt_off_command())
-    return jsonify({"status": "OK", "duration_sec": secs})
+    """
+    Key up for ?seconds= (default PTT_DEFAULT_SECONDS, at most PTT_MAX_SECONDS)
+    and return straight away; the PTT timer unkeys when the time is up.
+    """
+    secs = _seconds_arg(PTT_DEFAULT_SECONDS)
+    if secs is None:
+        return jsonify({"error": f"seconds must be between 0 and {PTT_MAX_SECONDS}"}), 400
+    body, status = ptt_on_reply(ptt_timer.key(secs), secs)
+    return jsonify(body), status
+
+def ptt_on_reply(session, secs):
+    """(body, status) for POST /ptt/on once ptt_timer.key() has returned session."""
+    if session is None:
+        status = ptt_timer.status()
+        if status["keyed"]:
+            return {"error": f"PTT is held by {status['owner']}", "timer": status}, 409
+        return {"error": "Radio did not accept PTT"}, 500
+    return {"status": "OK", "duration_sec": secs, "timer": ptt_timer.status()}, 200
+
+@app.route("/ptt/extend", methods=["POST"])
+def ptt_extend():
+    secs = _seconds_arg(PTT_DEFAULT_SECONDS)
+    if secs is None:
+        return jsonify({"error": f"seconds must be between 0 and {PTT_MAX_SECONDS}"}), 400
+    status = ptt_timer.extend(secs)
+    if status is None:
+        return jsonify({"error": "PTT is not keyed"}), 409
+    return jsonify({"status": "OK", "timer": status})
 
 @app.route("/ptt/off", methods=["POST"])
 def ptt_off():
-    radio_ser.write(build_ptt_off_command())
-    time.sleep(0.1)
-    return jsonify({"status": "PTT OFF"})
+    """Unkey now: cancels a /ptt/on timer and stops the message the TX queue is sending."""
+    ptt_timer.release(reason="ptt_off")     # also unkeys PTT that was keyed elsewhere (e.g. front panel)
+    return jsonify({"status": "PTT OFF", "timer": ptt_timer.status()})
 
 
 @app.route("/band", methods=["POST"])
@@ -696,11 +3243,135 @@ def set_band():
     if band not in BAND_TO_FREQ:
         return jsonify({"error": f"Invalid band: {band}"}), 400
     freq = BAND_TO_FREQ[band]
-    radio_ser.write(build_set_freq_command(freq))
-    time.sleep(0.2)
+    if civ.command(build_set_freq_command(freq)):
+        radio_state.update(frequency_hz=freq)
     return jsonify({"status": "OK", "band": band, "frequency_hz": freq})
 
-# === ROTATOR (completely unchanged) ===
+# === BATCH ===
+BATCH_MAX_OPS = 32
+
+def _parse_batch_op(op) -> dict:
+    """
+    Validate one /batch operation and pre-build its CI-V frame. Raises ValueError.
+      {"op": "band", "band": "20"}            {"op": "frequency", "frequency_hz": 14074000}
+      {"op": "mode", "mode": "USB", "filter": 1}   {"op": "data_mode", "value": 1}
+      {"op": "read_frequency"}  {"op": "read_mode"}  {"op": "read_data_mode"}
+    """
+    if not isinstance(op, dict):
+        raise ValueError("operation must be an object")
+    kind = op.get("op")
+    if kind == "band":
+        band = str(op.get("band", "")).strip()
+        if band not in BAND_TO_FREQ:
+            raise ValueError(f"invalid band: {band}")
+        freq = BAND_TO_FREQ[band]
+        return {"frame": build_set_freq_command(freq), "update": {"frequency_hz": freq}}
+    if kind == "frequency":
+        freq = int(op.get("frequency_hz", 0))
+        if not FREQ_MIN_HZ <= freq <= FREQ_MAX_HZ:
+            raise ValueError(f"frequency out of range: {freq}")
+        return {"frame": build_set_freq_command(freq), "update": {"frequency_hz": freq}}
+    if kind == "mode":
+        mode = op.get("mode")
+        mode_byte = MODE_BYTES.get(mode.upper()) if isinstance(mode, str) else mode
+        if mode_byte not in MODE_NAMES:
+            raise ValueError(f"invalid mode: {mode}")
+        filt = int(op.get("filter", 1))
+        if filt not in (1, 2, 3):
+            raise ValueError(f"invalid filter: {filt}")
+        # The IC-7300 turns data mode off on set-mode; a later data_mode op sets it again
+        return {"frame": build_set_mode_command(mode_byte, filt),
+                "update": {"mode_byte": mode_byte, "filter": filt, "data_mode": 0}}
+    if kind == "data_mode":
+        value = int(op.get("value", 0))
+        if value not in (0, 1, 2, 3):
+            raise ValueError(f"invalid data mode: {value}")
+        return {"frame": build_set_data_mode(value), "update": {"data_mode": value}}
+    if kind == "read_frequency":
+        return {"frame": build_read_freq_command(), "read": decode_civ_freq}
+    if kind == "read_mode":
+        def read_mode(frame):
+            mode = decode_mode(frame)
+            return mode and {"mode_name": MODE_NAMES.get(mode[0], "Unknown"), "mode_byte": mode[0], "filter": mode[1]}
+        return {"frame": build_read_mode_command(), "read": read_mode}
+    if kind == "read_data_mode":
+        return {"frame": build_read_data_mode(), "read": decode_data_mode}
+    raise ValueError(f"unknown op: {kind}")
+
+@app.route("/batch", methods=["POST"])
+def run_batch():
+    """
+    Run an ordered list of radio operations in one request:
+      {"ops": [{"op": "band", "band": "20"}, {"op": "mode", "mode": "USB"}, {"op": "data_mode", "value": 1}],
+       "stop_on_error": false}
+    Everything is validated first (nothing is sent if any op is invalid). The ops
+    then run under one hold of the CI-V transport lock, each frame going out as
+    soon as the previous one is acknowledged. Returns one result per op.
+    """
+    if not radio_ser: return jsonify({"error": "Radio not open"}), 500
+    data = request.get_json(silent=True) or {}
+    ops, error = parse_batch(data)
+    if error:
+        return jsonify(error), 400
+
+    stop_on_error = bool(data.get("stop_on_error", False))
+    results = []
+    failed = False
+    t0 = time.perf_counter()
+    with civ.lock:
+        for op, p in ops:
+            if failed and stop_on_error:
+                results.append({"op": op["op"], "status": "skipped"})
+                continue
+            t1 = time.perf_counter()
+            reply = civ.query(p["frame"]) if "read" in p else civ.command(p["frame"])
+            result = batch_result(op, p, reply, t1)
+            failed = failed or result["status"] != "OK"
+            results.append(result)
+    return jsonify(batch_reply(results, failed, t0))
+
+def parse_batch(data: dict):
+    """([(op, parsed op)], None) for a valid /batch body, else (None, error body)."""
+    ops = data.get("ops")
+    if not isinstance(ops, list) or not ops:
+        return None, {"error": "ops must be a non-empty list"}
+    if len(ops) > BATCH_MAX_OPS:
+        return None, {"error": f"at most {BATCH_MAX_OPS} ops per batch"}
+    parsed, errors = [], []
+    for i, op in enumerate(ops):
+        try:
+            parsed.append((op, _parse_batch_op(op)))
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append({"index": i, "error": str(e)})
+    if errors:
+        return None, {"error": "invalid operations", "details": errors}
+    return parsed, None
+
+def batch_result(op: dict, p: dict, reply, t1: float) -> dict:
+    """Result of one op from its reply: the frame for reads, the ack for commands."""
+    result = {"op": op["op"]}
+    if "read" in p:
+        value = p["read"](reply) if reply else None
+        ok = value is not None
+        if ok:
+            result["value"] = value
+    else:
+        ok = reply
+        if ok:
+            radio_state.update(**p["update"])
+            result.update(p["update"])
+    result["status"] = "OK" if ok else ("NG" if ok is False else "timeout")
+    result["ms"] = round((time.perf_counter() - t1) * 1000, 1)
+    return result
+
+def batch_reply(results: list, failed: bool, t0: float) -> dict:
+    return {
+        "status": "partial" if failed else "OK",
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+# === ROTATOR ===
 @app.route('/rotate_cw', methods=['GET','POST'])
 def rotate_cw():   return jsonify(send_rotator(CMD_CW))
 
@@ -712,15 +3383,88 @@ def stop_rot():    return jsonify(send_rotator(CMD_STOP))
 
 @app.route('/rotator/status', methods=['GET'])
 def rotator_status():
+    """Cached position from the tracker (azimuth, age of the reading, motion, go-to progress)."""
+    if not rotator_ser: return jsonify({"error": "Rotator not open"}), 500
+    return jsonify(rotator_tracker.status())
+
+@app.route('/rotator/goto', methods=['POST'])
+def rotator_goto():
+    """
+    Turn to {"azimuth": deg} (or ?azimuth=) and return at once. The server stops
+    the rotator itself, so accuracy does not depend on the client's latency;
+    follow progress on /rotator/status or the rotator events.
+    """
+    if not rotator_ser: return jsonify({"error": "Rotator not open"}), 500
+    data = request.get_json(silent=True) or {}
+    try:
+        azimuth = int(round(float(data.get("azimuth", request.args.get("azimuth")))))
+    except (TypeError, ValueError):
+        return jsonify({"error": "azimuth must be a number"}), 400
+    if not 0 <= azimuth <= ROTATOR_MAX_AZ:
+        return jsonify({"error": f"azimuth must be between 0 and {ROTATOR_MAX_AZ}"}), 400
+    goto = rotator_tracker.goto(azimuth)
+    return jsonify({"status": "OK", "goto": goto, "rotator": rotator_tracker.status()})
+
+@app.route('/rotator/goto', methods=['DELETE'])
+def rotator_goto_cancel():
+    """Stop a go-to in progress."""
     if not rotator_ser: return jsonify({"error": "Rotator not open"}), 500
-    with serial_lock:
-        rotator_ser.reset_input_buffer()
-        rotator_ser.write(b'C2\r')
-        time.sleep(0.1)
-        resp = rotator_ser.read(100).decode('ascii', errors='ignore').strip()
-        return jsonify({"position": resp or "no response"})
+    finished = rotator_tracker.cancel()
+    if finished is None:
+        return jsonify({"error": "No go-to in progress"}), 409
+    return jsonify({"status": "OK", "goto": finished})
+
+# === LIVE EVENTS ===
+def _format_event(version: int, kind: str, data: dict):
+    return f"id: {version}\nevent: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def event_backlog(resume):
+    """(events to replay, last version sent) for a client resuming at `resume` (None = new client)."""
+    backlog = events_hub.since(int(resume)) if resume and resume.isdigit() else None
+    if backlog is None:
+        backlog = events_hub.snapshot()
+    return backlog, backlog[-1][0] if backlog else events_hub.version
+
+@app.route("/events", methods=["GET"])
+def events_stream():
+    """
+    Server-Sent Events feed of state changes (frequency, mode, ptt, rotator, tx_queue).
+    A new client first gets the latest value of every kind; a reconnecting client
+    (Last-Event-ID header or ?since=) gets just what it missed.
+    """
+    resume = request.headers.get("Last-Event-ID") or request.args.get("since")
+
+    def generate():
+        backlog, last = event_backlog(resume)
+        yield "retry: 2000\n\n"
+        for event in backlog:
+            yield _format_event(*event)
+        while True:
+            events = events_hub.wait(last, timeout=EVENT_KEEPALIVE_SEC)
+            if events is None:
+                # Fell behind the history window: resync from the latest values
+                events = events_hub.snapshot()
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield _format_event(*event)
+            last = max(last, events[-1][0])
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ---------------------- DEBUG/HELPER ROUTES ----------------------
+@app.route("/audio/listeners", methods=["GET"])
+def audio_listeners():
+    """Shared capture status and per-listener lag counters."""
+    return jsonify({
+        "capturing": audio_capture.running,
+        "blocks_captured": audio_capture.seq,
+        "ring_blocks": audio_capture.capacity,
+        "listeners": audio_capture.listeners(),
+    })
+
 @app.route("/list_audio_devices", methods=["GET"])
 def list_devices_endpoint():
     """Endpoint to list available audio devices."""
@@ -752,4 +3496,7 @@ if __name__ == "__main__":
     else:
         print(f"\n⚠️ sounddevice not installed. Install it with: pip install sounddevice scipy")
         print(f"   Falling back to default speaker for audio playback.\n")
+    if RX_RECORD_ON_START:
+        rx_recorder.start()
+    recordings_catalog.refresh_if_stale()
     app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
\ No newline at end of file
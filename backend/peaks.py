@@ -0,0 +1,202 @@
+# peaks.py - Multi-resolution waveform peaks for recordings
+#
+# A pyramid holds min/max/RMS per bin at a few zoom levels (256, 4096 and
+# 65536 frames per bin by default). It is built in one pass over the
+# memory-mapped samples and stored next to the WAV as <name>.wav.peaks, so the
+# dashboard can draw any part of a recording without touching the audio.
+#
+# Sidecar layout (little endian):
+#   header  "PEAK" u16 version, u16 channels, u32 rate, u64 frames, u16 levels
+#   levels  u32 frames_per_bin, u32 bins        (one entry per level)
+#   data    per level: bins x (min, max, rms) int16, full scale = 32767
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"PEAK"
+VERSION = 1
+LEVELS = (256, 4096, 65536)
+SCALE = 32767
+BUILD_CHUNK_FRAMES = LEVELS[-1] * 16          # ~1M frames per step; a multiple of every level
+DEFAULT_WIDTH = 1000                          # columns returned when the caller does not say
+MAX_WIDTH = 8192
+_HEADER = struct.Struct("<4sHHIQH")
+_LEVEL = struct.Struct("<II")
+
+
+def full_scale(dtype) -> float:
+    """Divisor that maps samples of dtype to [-1, 1]."""
+    if dtype.kind == "f":
+        return 1.0
+    if dtype.kind == "u":
+        return 128.0
+    return float(1 << (8 * dtype.itemsize - 1))
+
+
+def to_float(x: np.ndarray) -> np.ndarray:
+    """Samples as float32 in [-1, 1]."""
+    y = x.astype(np.float32)
+    if x.dtype.kind == "u":
+        y -= 128.0
+    if x.dtype.kind != "f":
+        y *= 1.0 / full_scale(x.dtype)
+    return y
+
+
+def sidecar_path(wav_path: str) -> str:
+    return wav_path + ".peaks"
+
+
+def build(wav_path: str, info: dict, samples: np.ndarray, levels=LEVELS) -> dict:
+    """
+    Compute the pyramid for a WAV from its (memory-mapped) samples, as returned
+    by recordings_catalog.open_samples(), and write its sidecar. Channels are
+    folded together (min/max over all of them, RMS over all samples). Returns
+    overall {"peak", "rms"} as fractions of full scale; the sidecar is skipped
+    if it cannot be written.
+    """
+    base = levels[0]
+    channels = max(1, info["channels"])
+    mins, maxs, squares, counts = [], [], [], []
+    for start in range(0, len(samples), BUILD_CHUNK_FRAMES):
+        x = to_float(samples[start:start + BUILD_CHUNK_FRAMES])
+        n = len(x)
+        full = n - n % base
+        if full:
+            b = x[:full].reshape(-1, base * channels)
+            mins.append(b.min(axis=1))
+            maxs.append(b.max(axis=1))
+            squares.append(np.einsum("ij,ij->i", b, b, dtype=np.float64))
+            counts.append(np.full(len(b), base * channels, dtype=np.float64))
+        if full < n:                  # only ever the end of the file
+            tail = x[full:].ravel()
+            mins.append(tail.min(keepdims=True))
+            maxs.append(tail.max(keepdims=True))
+            squares.append(np.array([np.dot(tail, tail)], dtype=np.float64))
+            counts.append(np.array([tail.size], dtype=np.float64))
+
+    if mins:
+        lo, hi = np.concatenate(mins), np.concatenate(maxs)
+        sq, cnt = np.concatenate(squares), np.concatenate(counts)
+    else:
+        lo = hi = np.zeros(0, dtype=np.float32)
+        sq = cnt = np.zeros(0, dtype=np.float64)
+
+    tables = []
+    for spb in levels:
+        if spb == base:
+            l_lo, l_hi, l_sq, l_cnt = lo, hi, sq, cnt
+        else:
+            # Coarser levels are reductions of the base level, not new passes over the audio
+            idx = np.arange(0, len(lo), spb // base)
+            if len(lo):
+                l_lo, l_hi = np.minimum.reduceat(lo, idx), np.maximum.reduceat(hi, idx)
+                l_sq, l_cnt = np.add.reduceat(sq, idx), np.add.reduceat(cnt, idx)
+            else:
+                l_lo = l_hi = lo
+                l_sq = l_cnt = sq
+        rms = np.sqrt(l_sq / np.maximum(l_cnt, 1))
+        table = np.empty((len(l_lo), 3), dtype="<i2")
+        table[:, 0] = np.clip(np.round(l_lo * SCALE), -SCALE, SCALE)
+        table[:, 1] = np.clip(np.round(l_hi * SCALE), -SCALE, SCALE)
+        table[:, 2] = np.clip(np.round(rms * SCALE), 0, SCALE)
+        tables.append((spb, table))
+
+    path = sidecar_path(wav_path)
+    try:
+        with open(path + ".tmp", "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, channels, info["rate"], info["frames"], len(tables)))
+            for spb, table in tables:
+                f.write(_LEVEL.pack(spb, len(table)))
+            for _, table in tables:
+                f.write(table.tobytes())
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"⚠️ Could not write peaks for {os.path.basename(wav_path)}: {e}")
+
+    total = cnt.sum()
+    return {
+        "peak": float(max(-lo.min(), hi.max())) if len(lo) else 0.0,
+        "rms": float(np.sqrt(sq.sum() / total)) if total else 0.0,
+    }
+
+
+class PeakPyramid:
+    """Memory-mapped view of a .peaks sidecar."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+            magic, version, self.channels, self.rate, self.frames, nlevels = _HEADER.unpack(head)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} peaks file")
+            entries = [_LEVEL.unpack(f.read(_LEVEL.size)) for _ in range(nlevels)]
+        self.levels = {}
+        offset = _HEADER.size + _LEVEL.size * nlevels
+        for spb, bins in entries:
+            if bins:
+                self.levels[spb] = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(bins, 3))
+            else:
+                self.levels[spb] = np.zeros((0, 3), dtype="<i2")
+            offset += bins * 6
+
+    @classmethod
+    def load(cls, wav_path: str):
+        """Open the sidecar, or None if it is missing or older than the WAV and has to be built first."""
+        path = sidecar_path(wav_path)
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(wav_path):
+                return cls(path)
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def pick_level(self, frames: int, width: int) -> int:
+        """Coarsest level that still gives at least `width` bins over `frames`."""
+        best = min(self.levels)
+        for spb in sorted(self.levels):
+            if frames / spb >= width:
+                best = spb
+        return best
+
+    def range(self, start: int, end: int, width: int = None, level: int = None) -> dict:
+        """
+        (min, max, rms) columns covering frames [start, end), at most `width`
+        of them (DEFAULT_WIDTH if not given, never more than MAX_WIDTH). An
+        explicit level is the finest level used; a coarser one is taken when it
+        still gives `width` columns, so the cost is bounded by the request size
+        rather than the recording length. Raises ValueError.
+        """
+        if width is None:
+            width = DEFAULT_WIDTH
+        if width < 1:
+            raise ValueError("width must be at least 1")
+        width = min(width, MAX_WIDTH)
+        if level is not None and level not in self.levels:
+            raise ValueError(f"zoom must be one of {sorted(self.levels)}")
+        start = max(0, min(start, self.frames))
+        end = max(start, min(end, self.frames))
+        level = max(level or 0, self.pick_level(end - start, width))
+        table = self.levels[level]
+        first = start // level
+        data = np.asarray(table[first:-(-end // level)])
+        spb = level
+        if len(data) > width:
+            group = -(-len(data) // width)
+            idx = np.arange(0, len(data), group)
+            lo = np.minimum.reduceat(data[:, 0], idx)
+            hi = np.maximum.reduceat(data[:, 1], idx)
+            rms = np.sqrt(np.add.reduceat(data[:, 2].astype(np.float64) ** 2, idx) / np.diff(np.append(idx, len(data))))
+            data = np.stack([lo, hi, np.round(rms)], axis=1).astype("<i2")
+            spb = level * group
+        return {
+            "rate": self.rate,
+            "level": level,
+            "frames_per_bin": spb,
+            "start_frame": first * level,
+            "scale": SCALE,
+            "min": data[:, 0].tolist(),
+            "max": data[:, 1].tolist(),
+            "rms": data[:, 2].tolist(),
+        }
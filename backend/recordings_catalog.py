@@ -0,0 +1,297 @@
+# recordings_catalog.py - SQLite index of the recordings/ directory
+#
+# Listing recordings with their duration and levels should not mean opening
+# every WAV. Fast fields come from the RIFF header alone (a few hundred bytes);
+# peak/RMS need the samples and are filled in later by a small worker pool,
+# in the same memory-mapped pass that builds the waveform peaks sidecar. The
+# index is refreshed incrementally: only files whose mtime or size changed are
+# looked at again.
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import peaks
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+HEADER_READ = 4096                 # enough for fmt/LIST/fact chunks ahead of data
+
+# rec_20251211_120531.wav, recording_20251212_171311.wav, tx_..., rec_..._2.wav
+NAME_RE = re.compile(r"^(rec|recording|tx)_(\d{8}_\d{6})(?:_\d+)?\.wav$", re.IGNORECASE)
+
+
+def read_wav_info(path: str) -> dict:
+    """
+    Parse the RIFF header: format, rate, channels, sample width and where the
+    sample data lives. Only the first HEADER_READ bytes are read. Raises
+    ValueError for anything that is not a WAV file.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        h = f.read(HEADER_READ)
+    if len(h) < 12 or h[:4] != b"RIFF" or h[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(h):
+        chunk_id = h[pos:pos + 4]
+        chunk_size = struct.unpack_from("<I", h, pos + 4)[0]
+        if chunk_id == b"fmt ":
+            tag, channels, rate, _, block_align, bits = struct.unpack_from("<HHIIHH", h, pos + 8)
+            if tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                tag = struct.unpack_from("<H", h, pos + 8 + 24)[0]    # SubFormat GUID starts with the tag
+            fmt = (tag, channels, rate, block_align, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            tag, channels, rate, block_align, bits = fmt
+            offset = pos + 8
+            # Live/unfinished files carry 0xFFFFFFFF or a stale size: trust the file length
+            data_size = min(chunk_size, size - offset)
+            data_size -= data_size % block_align
+            return {
+                "format": tag,
+                "rate": rate,
+                "channels": channels,
+                "bits": bits,
+                "block_align": block_align,
+                "data_offset": offset,
+                "data_size": data_size,
+                "frames": data_size // block_align,
+                "duration": data_size / block_align / rate if rate else 0.0,
+            }
+        pos += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError("no data chunk in header")
+
+
+def sample_dtype(info: dict):
+    """NumPy dtype for the sample data, or None for layouts we cannot map (e.g. 24-bit)."""
+    if info["format"] == WAVE_FORMAT_IEEE_FLOAT:
+        return {32: np.dtype("<f4"), 64: np.dtype("<f8")}.get(info["bits"])
+    if info["format"] == WAVE_FORMAT_PCM and info["block_align"] == info["channels"] * info["bits"] // 8:
+        return {8: np.dtype("u1"), 16: np.dtype("<i2"), 32: np.dtype("<i4")}.get(info["bits"])
+    return None
+
+
+def open_samples(path: str, info: dict) -> np.ndarray:
+    """Memory-mapped (frames, channels) view of the samples, nothing is read yet."""
+    dtype = sample_dtype(info)
+    if dtype is None:
+        raise ValueError(f"unsupported WAV layout (format 0x{info['format']:04x}, {info['bits']} bit)")
+    if info["frames"] == 0:
+        return np.zeros((0, info["channels"]), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=info["data_offset"],
+                     shape=(info["frames"], info["channels"]))
+
+
+def analyse(path: str, info: dict) -> tuple:
+    """(peak, rms) over all channels as fractions of full scale; also writes the peaks sidecar."""
+    levels = peaks.build(path, info, open_samples(path, info))
+    return levels["peak"], levels["rms"]
+
+
+def parse_name(name: str):
+    """(kind, unix timestamp) from a recorder file name, or (None, None)."""
+    m = NAME_RE.match(name)
+    if not m:
+        return None, None
+    try:
+        return m.group(1).lower(), datetime.strptime(m.group(2), "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return None, None
+
+
+class RecordingsCatalog:
+    """
+    Index of WAV files in one directory. refresh() syncs it with the disk and
+    queues changed files for analysis; list() is a plain indexed query and never
+    touches the audio files.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS recordings (
+            name TEXT PRIMARY KEY,
+            kind TEXT,
+            started REAL,
+            mtime REAL,
+            size INTEGER,
+            rate INTEGER,
+            channels INTEGER,
+            bits INTEGER,
+            frames INTEGER,
+            duration REAL,
+            peak REAL,
+            rms REAL,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS recordings_started ON recordings (started);
+    """
+    COLUMNS = ("name", "kind", "started", "mtime", "size", "rate", "channels", "bits",
+               "frames", "duration", "peak", "rms", "error")
+    ORDER = {"started": "started", "duration": "duration", "name": "name", "size": "size", "peak": "peak"}
+
+    def __init__(self, directory: str, db_path: str = None, workers: int = 2, refresh_interval: float = 10.0):
+        self.directory = directory
+        self.db_path = db_path or os.path.join(directory, ".catalog.sqlite3")
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self.SCHEMA)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalog")
+        self._queued = set()
+        self.last_refresh = 0.0
+        self.last_refresh_ms = 0.0
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._db.close()
+
+    # ---- sync with disk ----
+    def refresh(self) -> dict:
+        """Add new/changed files (header only), drop deleted ones, queue analysis."""
+        with self._refresh_lock:
+            t0 = time.perf_counter()
+            with self._lock:
+                known = {name: (mtime, size) for name, mtime, size in
+                         self._db.execute("SELECT name, mtime, size FROM recordings")}
+            rows = []
+            seen = set()
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith(".wav") or not entry.is_file():
+                        continue
+                    seen.add(entry.name)
+                    st = entry.stat()
+                    if known.get(entry.name) == (st.st_mtime, st.st_size):
+                        continue
+                    rows.append(self._header_row(entry.path, entry.name, st))
+            gone = [name for name in known if name not in seen]
+            with self._lock:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO recordings ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+                self._db.executemany("DELETE FROM recordings WHERE name = ?", [(n,) for n in gone])
+                self._db.commit()
+                pending = [name for (name,) in self._db.execute(
+                    "SELECT name FROM recordings WHERE peak IS NULL AND error IS NULL")]
+            for name in pending:
+                self.queue_analysis(name)
+            self.last_refresh = time.monotonic()
+            self.last_refresh_ms = (time.perf_counter() - t0) * 1000
+            return {"added_or_changed": len(rows), "removed": len(gone), "analysing": len(self._queued)}
+
+    def refresh_if_stale(self):
+        """Kick off a background refresh when the index is older than refresh_interval."""
+        if time.monotonic() - self.last_refresh > self.refresh_interval and not self._refresh_lock.locked():
+            self.last_refresh = time.monotonic()
+            threading.Thread(target=self.refresh, name="catalog-refresh", daemon=True).start()
+
+    def _header_row(self, path, name, st):
+        kind, started = parse_name(name)
+        if started is None:
+            started = st.st_mtime
+        try:
+            info = read_wav_info(path)
+            return (name, kind, started, st.st_mtime, st.st_size, info["rate"], info["channels"],
+                    info["bits"], info["frames"], info["duration"], None, None, None)
+        except (OSError, ValueError) as e:
+            return (name, kind, started, st.st_mtime, st.st_size, None, None, None, None, None, None, None, str(e))
+
+    def queue_analysis(self, name):
+        """Analyse `name` (and write its peaks sidecar) on the worker pool; no-op if already queued."""
+        with self._lock:
+            if name in self._queued:
+                return
+            self._queued.add(name)
+        self._pool.submit(self._analyse, name)
+
+    def _analyse(self, name):
+        try:
+            path = os.path.join(self.directory, name)
+            peak, rms = analyse(path, read_wav_info(path))
+            values = (round(peak, 6), round(rms, 6), None)
+        except Exception as e:
+            values = (None, None, f"analysis failed: {e}")
+        with self._lock:
+            self._queued.discard(name)
+            self._db.execute("UPDATE recordings SET peak = ?, rms = ?, error = ? WHERE name = ?", (*values, name))
+            self._db.commit()
+
+    # ---- queries ----
+    def get(self, name: str):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM recordings WHERE name = ?", (name,)).fetchone()
+        return self._item(row) if row else None
+
+    def list(self, page: int = 1, per_page: int = 50, since: float = None, until: float = None,
+             kind: str = None, min_duration: float = None, max_duration: float = None,
+             q: str = None, order: str = "started", descending: bool = True) -> dict:
+        where, args = [], []
+        if since is not None:
+            where.append("started >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("started < ?")
+            args.append(until)
+        if kind:
+            where.append("kind = ?")
+            args.append(kind)
+        if min_duration is not None:
+            where.append("duration >= ?")
+            args.append(min_duration)
+        if max_duration is not None:
+            where.append("duration <= ?")
+            args.append(max_duration)
+        if q:
+            where.append("name LIKE ?")
+            args.append(f"%{q}%")
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        column = self.ORDER.get(order, "started")
+        direction = "DESC" if descending else "ASC"
+        page = max(1, page)
+        per_page = max(1, min(per_page, 500))
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM recordings {clause}", args).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM recordings {clause} "
+                f"ORDER BY {column} {direction}, name {direction} LIMIT ? OFFSET ?",
+                [*args, per_page, (page - 1) * per_page]).fetchall()
+        return {
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "pages": (total + per_page - 1) // per_page,
+            "items": [self._item(r) for r in rows],
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            total, hours, pending = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(duration), 0) / 3600.0, "
+                "SUM(peak IS NULL AND error IS NULL) FROM recordings").fetchone()
+        return {
+            "files": total,
+            "hours": round(hours, 3),
+            "pending_analysis": pending or 0,
+            "last_refresh_ms": round(self.last_refresh_ms, 1),
+        }
+
+    def _item(self, row):
+        item = dict(zip(self.COLUMNS, row))
+        item["started_iso"] = datetime.fromtimestamp(item["started"]).isoformat(timespec="seconds")
+        item["analysed"] = item["peak"] is not None
+        if item["duration"] is not None:
+            item["duration"] = round(item["duration"], 3)
+        return item
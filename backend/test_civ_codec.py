@@ -0,0 +1,81 @@
+# test_civ_codec.py - encode/decode round trips for civ_codec (run: python -m pytest)
+import random
+
+import pytest
+
+import civ_codec
+from bench_civ import CTRL, RIG, legacy_decode_freq, legacy_set_freq_command
+from civ_codec import CivCodec
+
+
+@pytest.fixture
+def codec():
+    return CivCodec(RIG, CTRL)
+
+
+def _reply(frame):
+    """A request frame as the radio would answer it (addresses swapped)."""
+    reply = bytearray(frame)
+    reply[2], reply[3] = reply[3], reply[2]
+    return reply
+
+
+def test_bcd_tables():
+    for i in range(100):
+        assert civ_codec.BCD_DECODE[civ_codec.BCD_ENCODE[i]] == i
+    assert sum(v is not None for v in civ_codec.BCD_DECODE) == 100
+
+
+def test_frequency_round_trip(codec):
+    rnd = random.Random(7300)
+    for hz in [0, 1, 9_999_999_999, 30_000, 74_800_000] + [rnd.randrange(10_000_000_000) for _ in range(20000)]:
+        frame = codec.encode("set_frequency", hz)
+        assert bytes(frame) == legacy_set_freq_command(hz), hz
+        frame[4] = 0x03
+        assert civ_codec.decode(_reply(frame)) == civ_codec.Frequency(hz, False)
+        frame[4] = 0x00
+        assert civ_codec.decode(frame) == civ_codec.Frequency(hz, True)
+        assert legacy_decode_freq(frame) == hz
+
+
+def test_mode_round_trip(codec):
+    for mode in range(256):
+        for filt in (1, 2, 3):
+            frame = codec.encode("set_mode", (mode, filt))
+            frame[4] = 0x04
+            assert civ_codec.decode(frame) == civ_codec.Mode(mode, filt, False)
+
+
+def test_switch_round_trips(codec):
+    for value in range(4):
+        assert civ_codec.decode(codec.encode("set_data_mode", value)) == civ_codec.DataMode(value)
+    for on in (0, 1):
+        assert civ_codec.decode(codec.encode("set_ptt", on)) == civ_codec.Ptt(bool(on))
+        assert civ_codec.decode(codec.encode("set_transceive", on)) == civ_codec.Transceive(bool(on))
+
+
+def test_meter_replies():
+    bcd = civ_codec.BCD_ENCODE
+    for sub, name in civ_codec.METERS.items():
+        for raw in range(256):
+            reply = bytes([0xFE, 0xFE, CTRL, RIG, 0x15, sub, bcd[raw // 100], bcd[raw % 100], 0xFD])
+            assert civ_codec.decode(reply) == civ_codec.Meter(name, raw)
+
+
+def test_memory_channel(codec):
+    for channel in range(1, 102):
+        assert civ_codec._get_bcd2(codec.encode("select_memory", channel), 5) == channel
+
+
+def test_encode_into_matches_encode(codec):
+    buf = bytearray(32)
+    for name in civ_codec.COMMANDS:
+        value = {"set_mode": (1, 1), "select_memory": 1}.get(name, 0 if civ_codec.COMMANDS[name].payload else None)
+        n = codec.encode_into(buf, name, value)
+        assert n == codec.frame_size(name) and buf[:n] == codec.encode(name, value), name
+
+
+def test_acks_and_bad_bcd():
+    assert civ_codec.decode(bytes([0xFE, 0xFE, CTRL, RIG, 0xFB, 0xFD])) == civ_codec.Ack(True)
+    assert civ_codec.decode(bytes([0xFE, 0xFE, CTRL, RIG, 0xFA, 0xFD])) == civ_codec.Ack(False)
+    assert civ_codec.decode(bytes([0xFE, 0xFE, CTRL, RIG, 0x03, 0x0A, 0, 0, 0, 0, 0xFD])) is None
@@ -0,0 +1,33 @@
+# test_civ_parser.py - CivFrameParser framing (run: python -m pytest)
+import random
+
+from bench_civ import _chunks, synthetic_capture
+from civ_parser import CivFrameParser
+
+
+def test_chunked_capture_yields_every_valid_frame():
+    capture, expected = synthetic_capture(256 * 1024)
+    parser = CivFrameParser()
+    got = sum(len(parser.feed(chunk)) for chunk in _chunks(capture, random.Random(1)))
+    assert got == expected
+
+
+def test_extra_preamble_bytes_are_not_drops():
+    parser = CivFrameParser()
+    frames = parser.feed(b"\xFE\xFE\xFE\xFE\xE0\x98\xFB\xFD" + b"\xFE\xFE\xFE\xE0\x98\xFB\xFD")
+    assert frames == [b"\xFE\xFE\xE0\x98\xFB\xFD"] * 2
+    assert parser.stats()["dropped"] == 0
+
+
+def test_extra_preamble_split_across_reads():
+    parser = CivFrameParser()
+    assert parser.feed(b"\xFE\xFE\xFE") == []
+    assert parser.feed(b"\xFE\xE0\x98\xFB\xFD") == [b"\xFE\xFE\xE0\x98\xFB\xFD"]
+    assert parser.stats()["dropped"] == 0
+
+
+def test_damaged_frames_are_counted():
+    parser = CivFrameParser()
+    frames = parser.feed(b"\xFE\xFE\x98\xE0\xFC\xFC\xFD" + b"\xFE\xFE\x98\xE0\x05\x00" + b"\xFE\xFE\xE0\x98\xFB\xFD")
+    assert frames == [b"\xFE\xFE\xE0\x98\xFB\xFD"]
+    assert parser.stats()["dropped"] == 2
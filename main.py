@@ -1,39 +1,294 @@
+import os
+import sys
 import requests
 import sounddevice as sd
 import numpy as np
-import queue
+import struct
 import threading
+import time
 
-url = "http://100.120.209.106:5000/audio"
-fs = 48000
-channels = 1
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from audio_dsp import ImaAdpcmDecoder, PolyphaseResampler
+
+url = "http://100.120.209.106:5000/stream.wav"
+stream_params = {"rate": 16000, "channels": 1, "codec": "ulaw"}  # {} = server default (44.1 kHz stereo PCM)
+fs = 48000       # output device rate; the stream is resampled to this
+channels = 1     # output channels; stereo streams are downmixed
 output_device_index = 3
-chunk_size = 16384  # larger buffer
+chunk_seconds = 0.02   # network read size, in audio time (converted with the stream's byte rate)
+header_bytes = 512     # first read, before the byte rate is known
+blocksize = 1024
 volume_gain = 4.0
-audio_q = queue.Queue(maxsize=20)  # buffer queue
+
+# Jitter buffer tuning
+min_latency = 0.10       # seconds of audio kept queued at minimum
+max_latency = 1.00       # never let the target grow past this
+jitter_factor = 4.0      # target = min_latency + chunk duration + jitter_factor * measured jitter
+max_drift = 0.005        # drift correction may speed up/slow down playback by ±0.5%
+buffer_seconds = 4.0     # ring buffer capacity
+stats_interval = 5.0     # seconds between status lines
+
+
+# ---------------- WAV stream decoder ----------------
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_IMA_ADPCM = 0x0011
+
+
+def _mulaw_table():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    magnitude = ((((u & 0x0F) << 3) + 0x84) << exponent) - 0x84
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.float32) / 32768.0
+
+
+class WavStreamDecoder:
+    """
+    Turns the raw HTTP byte stream from /stream.wav into float32 frames.
+
+    The RIFF header is parsed first to learn the real sample rate, channel count
+    and encoding (16-bit PCM, μ-law or IMA ADPCM). After that every chunk is
+    viewed in place with np.frombuffer; only the few bytes of a frame split
+    across two chunks are carried over (for ADPCM the unit is a whole block).
+    Channels are deinterleaved by reshaping and downmixed when the output has
+    fewer channels than the stream.
+    """
+
+    def __init__(self, out_channels, gain=1.0):
+        self.out_channels = out_channels
+        self.gain = gain
+        self.rate = None
+        self.channels = None
+        self.codec = None
+        self.byte_rate = None
+        self._adpcm = None
+        self._header = bytearray()
+        self._carry = b""
+        self._frame_bytes = 0
+        self._mulaw = _mulaw_table() * gain
+
+    def _parse_header(self):
+        """Returns the offset of the first sample byte, or None if more bytes are needed."""
+        h = self._header
+        if len(h) < 12:
+            return None
+        if h[:4] != b"RIFF" or h[8:12] != b"WAVE":
+            raise ValueError("Stream does not start with a RIFF/WAVE header")
+        pos = 12
+        while pos + 8 <= len(h):
+            chunk_id = bytes(h[pos:pos + 4])
+            size = struct.unpack_from("<I", h, pos + 4)[0]
+            if chunk_id == b"data":
+                if self.rate is None:
+                    raise ValueError("WAV data chunk before fmt chunk")
+                return pos + 8
+            if pos + 8 + size > len(h):
+                return None
+            if chunk_id == b"fmt ":
+                tag, ch, rate, byte_rate, align, bits = struct.unpack_from("<HHIIHH", h, pos + 8)
+                if tag == WAVE_FORMAT_PCM and bits == 16:
+                    self.codec = "pcm16"
+                elif tag == WAVE_FORMAT_MULAW and bits == 8:
+                    self.codec = "ulaw"
+                elif tag == WAVE_FORMAT_IMA_ADPCM and bits == 4:
+                    self.codec = "adpcm"
+                    self._adpcm = ImaAdpcmDecoder(ch, align)
+                else:
+                    raise ValueError(f"Unsupported WAV format tag 0x{tag:04x} ({bits} bit)")
+                self.rate, self.channels, self._frame_bytes = rate, ch, align
+                self.byte_rate = byte_rate
+            pos += 8 + size + (size & 1)
+        return None
+
+    def read_size(self, seconds):
+        """Bytes holding about `seconds` of audio (at least one frame), or None before the header."""
+        if self.byte_rate is None:
+            return None
+        return max(self._frame_bytes, int(self.byte_rate * seconds))
+
+    def feed(self, chunk):
+        """Decode one network chunk; returns a list of (frames, out_channels) float32 arrays."""
+        if self._header is not None:
+            self._header += chunk
+            start = self._parse_header()
+            if start is None:
+                return []
+            chunk = bytes(self._header[start:])
+            self._header = None
+
+        out = []
+        offset = 0
+        if self._carry:
+            # Complete the frame that straddled the previous chunk boundary
+            need = self._frame_bytes - len(self._carry)
+            if len(chunk) < need:
+                self._carry += chunk
+                return out
+            out.append(self._decode(self._carry + chunk[:need], 0, 1))
+            offset = need
+        frames = (len(chunk) - offset) // self._frame_bytes
+        if frames:
+            out.append(self._decode(chunk, offset, frames))
+        self._carry = chunk[offset + frames * self._frame_bytes:]
+        return out
+
+    def _decode(self, buf, offset, frames):
+        count = frames * self.channels
+        if self.codec == "pcm16":
+            x = np.frombuffer(buf, dtype="<i2", count=count, offset=offset).astype(np.float32)
+            x *= self.gain / 32768.0
+        elif self.codec == "adpcm":
+            # "frames" are whole ADPCM blocks here
+            size = self._frame_bytes
+            x = np.concatenate([self._adpcm.decode_block(buf[offset + b * size:offset + (b + 1) * size])
+                                for b in range(frames)]).astype(np.float32)
+            x *= self.gain / 32768.0
+            frames = len(x)
+        else:
+            x = self._mulaw[np.frombuffer(buf, dtype=np.uint8, count=count, offset=offset)]
+        x = x.reshape(frames, self.channels)
+        if self.out_channels < self.channels:
+            x = x.mean(axis=1, keepdims=True)
+        return x
+
+
+# ---------------- Jitter buffer ----------------
+class JitterBuffer:
+    """
+    Ring buffer between the network thread and the audio callback.
+
+    write() takes any number of frames at the stream rate and converts them to
+    the device rate with the stateful polyphase resampler from audio_dsp, so
+    chunk boundaries are seamless. read() fills exactly one callback block,
+    picking up mid-chunk where the last read stopped. The target latency covers
+    the audio that arrives in one network read plus a margin that follows the
+    measured arrival jitter. Clock drift between sender and sound card is
+    absorbed by reading slightly faster/slower (at most max_drift, by
+    interpolating between neighbouring frames), so the fill level settles on
+    the target instead of creeping up or running dry.
+    """
+
+    def __init__(self, rate, channels, out_rate=None, seconds=buffer_seconds):
+        self.in_rate = rate
+        self.rate = out_rate or rate               # the ring holds audio at the device rate
+        self._resampler = PolyphaseResampler(rate, self.rate, channels) if self.rate != rate else None
+        self.capacity = int(self.rate * seconds)
+        self._ring = np.zeros((self.capacity, channels), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._written = 0          # total frames ever written
+        self._read = 0             # total frames ever consumed (integer part)
+        self._frac = 0.0           # fractional read position for the drift correction
+        self._priming = True       # waiting to reach target before (re)starting
+        self._last_arrival = None
+        self._fill_avg = 0.0
+        self.jitter = 0.0          # smoothed arrival jitter, seconds (RFC 3550 style)
+        self.burst = 0.0           # audio per network read, seconds (peak, slowly decaying)
+        self.target = min_latency  # current target latency, seconds
+        self.ratio = 1.0           # drift correction (1.0 = nominal speed)
+        self.underruns = 0
+        self.overruns = 0
+
+    def fill(self):
+        """Queued audio in seconds."""
+        return (self._written - self._read - self._frac) / self.rate
+
+    def write(self, frames):
+        now = time.monotonic()
+        duration = len(frames) / self.in_rate
+        if self._resampler is not None:
+            frames = self._resampler.process(frames)
+        with self._lock:
+            n = len(frames)
+            if n > self.capacity:
+                frames = frames[-self.capacity:]
+                n = self.capacity
+            free = self.capacity - (self._written - self._read)
+            if n > free - 2:
+                # Drop the oldest audio rather than block the network thread
+                self._read += n - free + 2
+                self._frac = 0.0
+                self.overruns += 1
+
+            start = self._written % self.capacity
+            first = min(n, self.capacity - start)
+            self._ring[start:start + first] = frames[:first]
+            self._ring[:n - first] = frames[first:]
+            self._written += n
+
+            if self._last_arrival is not None:
+                deviation = (now - self._last_arrival) - duration
+                self.jitter += (abs(deviation) - self.jitter) / 16
+            # Between reads the buffer drains by a whole read's worth of audio
+            self.burst = max(duration, self.burst + (duration - self.burst) / 64)
+            self.target = min(max_latency, min_latency + self.burst + jitter_factor * self.jitter)
+            self._last_arrival = now
+
+    def read(self, out):
+        frames = len(out)
+        with self._lock:
+            avail = self._written - self._read - self._frac
+            target = self.target * self.rate
+            if self._priming:
+                if avail < target:
+                    out.fill(0)
+                    return
+                self._priming = False
+                self._fill_avg = avail
+
+            # Slow drift control on the smoothed fill level
+            self._fill_avg += (avail - self._fill_avg) * 0.01
+            error = (self._fill_avg - target) / max(target, 1.0)
+            self.ratio = 1.0 + min(max_drift, max(-max_drift, 0.05 * error))
+
+            step = self.ratio
+            if avail < frames * step + 1:
+                out.fill(0)
+                self.underruns += 1
+                self._priming = True
+                return
+
+            pos = self._frac + step * np.arange(frames)
+            idx = pos.astype(np.int64)
+            weight = (pos - idx)[:, None].astype(np.float32)
+            a = self._ring[(self._read + idx) % self.capacity]
+            b = self._ring[(self._read + idx + 1) % self.capacity]
+            out[:] = a + (b - a) * weight
+
+            advance = self._frac + step * frames
+            whole = int(advance)
+            self._read += whole
+            self._frac = advance - whole
+
+
+jitter_buffer = None   # created once the stream header tells us its rate
+
 
 # ---------------- Thread to fetch audio ----------------
 def fetch_audio():
-    with requests.get(url, stream=True) as r:
+    global jitter_buffer
+    decoder = WavStreamDecoder(channels, volume_gain)
+    with requests.get(url, params=stream_params, stream=True) as r:
         r.raise_for_status()
-        for chunk in r.iter_content(chunk_size=chunk_size):
+        read_size = header_bytes
+        while True:
+            # A read returns once read_size bytes are in, so size it to chunk_seconds of this stream
+            chunk = r.raw.read(read_size)
             if not chunk:
-                continue
-            data = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)/32768.0
-            data *= volume_gain
-            audio_q.put(data)
+                break
+            read_size = decoder.read_size(chunk_seconds) or read_size
+            for frames in decoder.feed(chunk):
+                if jitter_buffer is None:
+                    print(f"Stream: {decoder.rate} Hz, {decoder.channels} ch, {decoder.codec} "
+                          f"-> {fs} Hz, {channels} ch")
+                    jitter_buffer = JitterBuffer(decoder.rate, channels, out_rate=fs)
+                jitter_buffer.write(frames)
 
 # ---------------- OutputStream callback ----------------
 def callback(outdata, frames, time, status):
-    try:
-        data = audio_q.get_nowait()
-        if len(data) < frames:
-            outdata[:len(data), 0] = data
-            outdata[len(data):, 0] = 0
-        else:
-            outdata[:, 0] = data[:frames]
-    except queue.Empty:
-        outdata.fill(0)  # silence if no data
+    if jitter_buffer is None:
+        outdata.fill(0)
+        return
+    jitter_buffer.read(outdata)
 
 # ---------------- Start playback ----------------
 threading.Thread(target=fetch_audio, daemon=True).start()
@@ -44,7 +299,14 @@ with sd.OutputStream(
     device=output_device_index,
     dtype='float32',
     callback=callback,
-    blocksize=1024
+    blocksize=blocksize
 ):
     print("Playing audio...")
-    threading.Event().wait()  # keep main thread alive
+    while True:
+        time.sleep(stats_interval)
+        jb = jitter_buffer
+        if jb is None:
+            continue
+        print(f"buffer {jb.fill()*1000:6.0f} ms | target {jb.target*1000:5.0f} ms | "
+              f"jitter {jb.jitter*1000:5.1f} ms | rate x{jb.ratio:.4f} | "
+              f"underruns {jb.underruns} | overruns {jb.overruns}")
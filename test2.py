@@ -1,4 +1,5 @@
 # client.py - Full Remote Shack Client (Radio + Antenna Rotator)
+import json
 import requests
 import time
 
@@ -82,6 +83,25 @@ def get_rotator_status():
     r.raise_for_status()
     return r.json()
 
+# -----------------------------------------------------------------
+# LIVE STATE (Server-Sent Events instead of polling)
+# -----------------------------------------------------------------
+def follow_events(callback, last_event_id=None):
+    """Call callback(version, kind, data) for every state change pushed by /events."""
+    headers = dict(HEADERS)
+    if last_event_id is not None:
+        headers["Last-Event-ID"] = str(last_event_id)
+    with requests.get(f"{BASE_URL}/events", headers=headers, stream=True, timeout=(10, None)) as r:
+        r.raise_for_status()
+        version, kind = None, None
+        for line in r.iter_lines(decode_unicode=True):
+            if line.startswith("id: "):
+                version = int(line[4:])
+            elif line.startswith("event: "):
+                kind = line[7:]
+            elif line.startswith("data: "):
+                callback(version, kind, json.loads(line[6:]))
+
 # -----------------------------------------------------------------
 # ANTENNA MOVEMENT TEST (CW 1 sec → CCW 1 sec)
 # -----------------------------------------------------------------